@@ -11,7 +11,7 @@ from telegram.ext import (
 from config import TELEGRAM_BOT_TOKEN, LOG_FILE
 
 # Import handlers
-from src.bot.Bot import TelegramBotHandler
+from src.bot.Bot_Manager import TelegramBotHandler
 
 # Import utility for logging
 from src.utils import setup_logger
@@ -42,18 +42,34 @@ def setup_application() -> Application:
         Application: Configured Telegram application
     """
     # Create application
-    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
     bot_handler = TelegramBotHandler()
+    application = (
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(bot_handler.on_startup)
+        .post_shutdown(bot_handler.on_shutdown)
+        .build()
+    )
 
     # Add command handlers
     application.add_handler(CommandHandler("start", bot_handler.start_command))
     application.add_handler(CommandHandler("help", bot_handler.help_command))
     application.add_handler(CommandHandler("history", bot_handler.history_command))
+    application.add_handler(CommandHandler("status", bot_handler.status_command))
+
+    # Admin commands for document lifecycle
+    application.add_handler(CommandHandler("sources", bot_handler.sources_command))
+    application.add_handler(CommandHandler("delete", bot_handler.delete_command))
+    application.add_handler(CommandHandler("expire", bot_handler.expire_command))
+    application.add_handler(CommandHandler("health", bot_handler.health_command))
 
     # Add message handlers
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_handler.handle_text_message))
     application.add_handler(MessageHandler(filters.VOICE, bot_handler.handle_voice_message))
-    application.add_handler(MessageHandler(filters.Document.PDF, bot_handler.handle_pdf_document))
+    application.add_handler(MessageHandler(
+        filters.Document.PDF | filters.Document.FileExtension("csv") | filters.Document.FileExtension("txt"),
+        bot_handler.handle_document
+    ))
 
     # Add error handler
     application.add_error_handler(bot_handler.error_handler)
@@ -0,0 +1,374 @@
+"""
+Benchmark tốc độ ingest qua các entry point thật của ứng dụng.
+
+Sinh dữ liệu PDF, Markdown, TXT và CSV tổng hợp với kích thước tùy chỉnh rồi đo:
+- ChromaDBManager.ingest_documents (pipeline của ingest_pdf, ingest_pdf_bytes, ingest_file), từng giai đoạn
+  parse, split, embed, add được đo qua stage_hook;
+- Process_manager.process_document;
+- create_chromaDB.bulk_load với Checkpoint, gồm cả lần chạy lại bỏ qua file đã xong.
+Kết quả (pages/s, chunks/s, peak RSS, dung lượng index tăng thêm) được ghi ra file JSON để so sánh giữa các bản.
+
+    python -m benchmarks.ingest_benchmark --pages 200 --md-kb 2048 --csv-rows 100000 -o bench.json
+"""
+import os
+import sys
+import csv
+import asyncio
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import resource
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import fitz
+
+from src.manager.Chroma_Manager import ChromaDBManager, ORIGIN_CATALOG
+from src.manager.Process_manager import load_document_pages, process_document, PyMuPDFBytesLoader
+from src.db.create_chromaDB import EMBEDDINGS_MODEL, Checkpoint, bulk_load, init_collection
+
+WORDS = (
+    "sản phẩm chất lượng cao giá tốt giao hàng nhanh đặc sản miền Trung thực phẩm khô "
+    "đồ uống gia vị chế biến chăm sóc sức khỏe hướng dẫn sử dụng bảo quản nơi khô ráo "
+    "thành phần xuất xứ Việt Nam hạn sử dụng khuyến mãi tháng này"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def generate_pdf(path: str, pages: int, rng: random.Random) -> None:
+    with fitz.open() as pdf:
+        for page_number in range(pages):
+            page = pdf.new_page()
+            text = f"Trang {page_number + 1}\n\n" + "\n".join(_sentence(rng) for _ in range(35))
+            page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=9)
+        pdf.save(path)
+
+
+def generate_markdown(path: str, size_kb: int, rng: random.Random) -> None:
+    target = size_kb * 1024
+    written = 0
+    section = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            section += 1
+            block = f"## Mục {section}\n\n" + " ".join(_sentence(rng) for _ in range(8)) + "\n\n"
+            f.write(block)
+            written += len(block.encode("utf-8"))
+
+
+def generate_csv(path: str, rows: int, rng: random.Random) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "category", "store_name", "good_name", "good_common", "price"])
+        for i in range(rows):
+            writer.writerow([
+                i,
+                rng.choice(["Đồ ăn vặt", "Đồ uống", "Thực phẩm khô", "Gia vị chế biến"]),
+                f"Cửa hàng {rng.randint(1, 500)}",
+                f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(100, 900)}gr",
+                _sentence(rng, 10),
+                rng.randint(10, 500) * 1000,
+            ])
+
+
+def max_rss(who: int) -> int:
+    """Peak RSS (bytes) theo getrusage, ru_maxrss là kB trên Linux và bytes trên macOS"""
+    value = resource.getrusage(who).ru_maxrss
+    return value if sys.platform == "darwin" else value * 1024
+
+
+class RSSSampler:
+    """Lấy mẫu RSS của process trong nền để đo peak RSS của từng giai đoạn"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def current_rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            # Không có /proc: dùng peak RSS của cả process
+            return max_rss(resource.RUSAGE_SELF)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RSSSampler":
+        self.peak = self.current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current_rss())
+
+
+def measure(stage: Callable[[], Any]) -> Dict[str, Any]:
+    rss_before = RSSSampler.current_rss()
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        result = stage()
+        seconds = time.perf_counter() - start
+    return {"result": result, "seconds": seconds, "peak_rss_mb": sampler.peak / (1024 * 1024),
+            "rss_before_mb": rss_before / (1024 * 1024)}
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 2) if seconds > 0 else 0.0
+
+
+class StageTimer:
+    """stage_hook cho ChromaDBManager.ingest_documents: cộng dồn thời gian theo giai đoạn"""
+
+    def __init__(self):
+        self.seconds = {"parse": 0.0, "split": 0.0, "embed": 0.0, "add": 0.0}
+
+    def __call__(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+
+def _memory(run: Dict[str, Any]) -> Dict[str, float]:
+    return {"peak_rss_mb": round(run["peak_rss_mb"], 1),
+            "rss_growth_mb": round(run["peak_rss_mb"] - run["rss_before_mb"], 1)}
+
+
+def bench_ingest_documents(manager: ChromaDBManager, name: str, open_pages: Callable[[], Iterable[Any]],
+                           batch_size: int, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """Chạy ChromaDBManager.ingest_documents trên iterator trang của loader, đo từng giai đoạn qua stage_hook"""
+    print(f"[ingest_documents:{name}] running...", flush=True)
+    timer = StageTimer()
+    progress = {"pages": 0, "chunks": 0}
+
+    async def on_progress(pages: int, chunks: int) -> None:
+        progress.update(pages=pages, chunks=chunks)
+
+    size_before = directory_size(manager.db_path)
+    run = measure(lambda: asyncio.run(manager.ingest_documents(
+        open_pages(),
+        f"bench-{name}",
+        ORIGIN_CATALOG,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        batch_size=batch_size,
+        progress_callback=on_progress,
+        stage_hook=timer
+    )))
+    index_growth = directory_size(manager.db_path) - size_before
+    chunks = run["result"]
+    pages = progress["pages"]
+
+    stages = {}
+    for stage, seconds in timer.seconds.items():
+        count, unit = (pages, "pages") if stage in ("parse", "split") else (chunks, "chunks")
+        stages[stage] = {"seconds": round(seconds, 4), unit: count, f"{unit}_per_sec": _rate(count, seconds)}
+    return {
+        "stages": stages,
+        "total": {
+            "seconds": round(run["seconds"], 4),
+            "pages": pages,
+            "chunks": chunks,
+            "pages_per_sec": _rate(pages, run["seconds"]),
+            "chunks_per_sec": _rate(chunks, run["seconds"]),
+            "index_growth_bytes": index_growth,
+            **_memory(run),
+        },
+    }
+
+
+def bench_process_document(name: str, path: str, document_type: str) -> Dict[str, Any]:
+    """Chạy Process_manager.process_document, hàm trả về toàn bộ chunk dưới dạng list"""
+    print(f"[process_document:{name}] running...", flush=True)
+    run = measure(lambda: asyncio.run(process_document(path, document_type)))
+    chunks = len(run["result"][0])
+    return {
+        "total": {
+            "seconds": round(run["seconds"], 4),
+            "chunks": chunks,
+            "chunks_per_sec": _rate(chunks, run["seconds"]),
+            **_memory(run),
+        },
+    }
+
+
+def bench_bulk_load(files: List[str], root: str, db_path: str, model: str, checkpoint_path: str,
+                    batch_size: int, workers: int, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """
+    Chạy create_chromaDB.bulk_load với Checkpoint hai lần: lần đầu nạp toàn bộ, lần sau chỉ đọc checkpoint.
+    Việc đọc/chia file chạy trong process con nên peak RSS của process con được ghi riêng.
+    """
+    collection, embedding_function, max_batch_size = init_collection(db_path, "benchmark", model)
+    if max_batch_size:
+        batch_size = min(batch_size, max_batch_size)
+
+    def load() -> int:
+        return bulk_load(files, collection, embedding_function, batch_size=batch_size, workers=workers,
+                         chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                         checkpoint=Checkpoint(checkpoint_path), root=root)
+
+    results = {}
+    for run_name in ("load", "resume"):
+        print(f"[bulk_load:{run_name}] {len(files)} files...", flush=True)
+        size_before = directory_size(db_path)
+        run = measure(load)
+        chunks = run["result"]
+        results[run_name] = {
+            "seconds": round(run["seconds"], 4),
+            "files": len(files),
+            "chunks": chunks,
+            "chunks_per_sec": _rate(chunks, run["seconds"]),
+            "index_growth_bytes": directory_size(db_path) - size_before,
+            "children_peak_rss_mb": round(max_rss(resource.RUSAGE_CHILDREN) / (1024 * 1024), 1),
+            **_memory(run),
+        }
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark tốc độ ingest tài liệu")
+    parser.add_argument("--pages", type=int, default=100, help="Số trang PDF tổng hợp")
+    parser.add_argument("--md-kb", type=int, default=1024, help="Kích thước file Markdown/TXT (KB)")
+    parser.add_argument("--csv-rows", type=int, default=20000, help="Số dòng CSV")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Số process của bulk_load")
+    parser.add_argument("--model", default=EMBEDDINGS_MODEL,
+                        help="Model embedding của bulk_load (ChromaDBManager dùng EMBEDDINGS_MODEL trong config)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--paths", nargs="*", default=None,
+                        help="Chỉ chạy các entry point: ingest_documents, process_document, bulk_load")
+    parser.add_argument("--only", nargs="*", default=None,
+                        help="Chỉ dùng các định dạng: pdf, pdf_bytes, csv, txt, md")
+    parser.add_argument("-o", "--output", default="bench_ingest.json", help="File JSON kết quả")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="ingest_bench_")
+
+    def enabled(path: str, fmt: Optional[str] = None) -> bool:
+        return (not args.paths or path in args.paths) and (fmt is None or not args.only or fmt in args.only)
+
+    try:
+        data_dir = os.path.join(work_dir, "data")
+        os.makedirs(data_dir)
+        pdf_path = os.path.join(data_dir, "synthetic.pdf")
+        md_path = os.path.join(data_dir, "synthetic.md")
+        txt_path = os.path.join(data_dir, "synthetic.txt")
+        csv_path = os.path.join(data_dir, "synthetic.csv")
+        print(f"Generating synthetic data in {work_dir}...", flush=True)
+        generate_pdf(pdf_path, args.pages, rng)
+        generate_markdown(md_path, args.md_kb, rng)
+        shutil.copyfile(md_path, txt_path)
+        generate_csv(csv_path, args.csv_rows, rng)
+
+        results: Dict[str, Any] = {}
+
+        if enabled("ingest_documents"):
+            manager = ChromaDBManager(os.path.join(work_dir, "chroma_manager"), collection_name="benchmark")
+            if not manager.is_initialized():
+                raise RuntimeError("ChromaDBManager could not be initialized")
+            with open(pdf_path, "rb") as f:
+                pdf_bytes = f.read()
+            # Cùng loader với ingest_pdf / ingest_file (load_document_pages) và ingest_pdf_bytes
+            sources = {
+                "pdf": lambda: load_document_pages(pdf_path, "pdf"),
+                "pdf_bytes": lambda: PyMuPDFBytesLoader(pdf_bytes, "synthetic.pdf").lazy_load(),
+                "csv": lambda: load_document_pages(csv_path, "csv"),
+                "txt": lambda: load_document_pages(txt_path, "txt"),
+            }
+            results["ingest_documents"] = {
+                name: bench_ingest_documents(manager, name, open_pages, args.batch_size,
+                                             args.chunk_size, args.chunk_overlap)
+                for name, open_pages in sources.items() if enabled("ingest_documents", name)
+            }
+
+        if enabled("process_document"):
+            documents = {"pdf": (pdf_path, "pdf"), "csv": (csv_path, "csv"), "txt": (txt_path, "txt")}
+            results["process_document"] = {
+                name: bench_process_document(name, path, document_type)
+                for name, (path, document_type) in documents.items() if enabled("process_document", name)
+            }
+
+        if enabled("bulk_load"):
+            files = [path for name, path in (("pdf", pdf_path), ("md", md_path), ("txt", txt_path),
+                                             ("csv", csv_path)) if enabled("bulk_load", name)]
+            results["bulk_load"] = bench_bulk_load(
+                files, data_dir, os.path.join(work_dir, "chroma_bulk"), args.model,
+                os.path.join(work_dir, "ingest_checkpoint.json"), args.batch_size, max(1, args.workers),
+                args.chunk_size, args.chunk_overlap
+            )
+
+        report = {
+            "meta": {
+                "timestamp": int(time.time()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "bulk_load_model": args.model,
+                "params": {
+                    "pages": args.pages,
+                    "md_kb": args.md_kb,
+                    "csv_rows": args.csv_rows,
+                    "batch_size": args.batch_size,
+                    "chunk_size": args.chunk_size,
+                    "chunk_overlap": args.chunk_overlap,
+                    "workers": args.workers,
+                    "seed": args.seed,
+                },
+                "input_bytes": {
+                    "pdf": os.path.getsize(pdf_path),
+                    "md": os.path.getsize(md_path),
+                    "txt": os.path.getsize(txt_path),
+                    "csv": os.path.getsize(csv_path),
+                },
+            },
+            "results": results,
+        }
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+        for path in ("ingest_documents", "process_document"):
+            for name, result in results.get(path, {}).items():
+                total = result["total"]
+                print(f"{path}:{name:<9} {total['chunks_per_sec']:>10} chunks/s {total['seconds']:>9}s "
+                      f"peak RSS {total['peak_rss_mb']} MB (+{total['rss_growth_mb']} MB)")
+        for run_name, result in results.get("bulk_load", {}).items():
+            print(f"bulk_load:{run_name:<7} {result['chunks_per_sec']:>10} chunks/s {result['seconds']:>9}s "
+                  f"peak RSS {result['peak_rss_mb']} MB, workers {result['children_peak_rss_mb']} MB")
+        print(f"Results written to {args.output}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark tìm kiếm sản phẩm: LIKE '%...%' so với FTS5 MATCH (src/db/product_search.py).
+
+Sinh catalog tổng hợp với số dòng tùy chỉnh (mặc định 10^5 và 10^6), đo thời gian tạo chỉ mục,
+dung lượng tăng thêm, chi phí trigger khi ghi và độ trễ của các truy vấn kiểu text-to-SQL trước/sau
+khi viết lại LIKE thành MATCH, rồi ghi kết quả ra file JSON.
+
+    python -m benchmarks.product_search_benchmark --rows 100000 1000000 -o bench_product_search.json
+"""
+import os
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import argparse
+import tempfile
+import statistics
+from typing import Any, Dict, List, Optional
+
+from src.db.product_search import build_index, rewrite_like_to_match
+
+PRODUCT_WORDS = (
+    "Kẹo me cay dừa gừng dẻo mứt sen trà xanh đậu phộng rang muối bánh tráng trộn mực khô cá cơm "
+    "nước mắm tôm chua cà phê rang xay hạt điều mật ong rừng nấm linh chi bò khô xoài sấy dẻo mít sấy giòn"
+).split()
+STORES = ["DaLaVi", "Đà Lạt Farm", "Huế Xưa", "Quảng Nam Food", "Bình Định Foods", "Hội An Đặc Sản",
+          "Nông Sản Việt", "Gia Vị Miền Trung", "Biển Đông Seafood", "Mộc Châu Tea"]
+CATEGORIES = ["Đồ ăn vặt", "Đồ uống", "Thực phẩm khô", "Gia vị chế biến", "Chăm sóc sức khỏe",
+              "Đặc sản miền Trung", "Thủy sản khô", "Đồ hộp"]
+
+# Truy vấn theo đúng các dạng mà QUERY_PROMPT_TEMPLATE yêu cầu model sinh ra
+QUERIES = {
+    "name_exact_words": (
+        "SELECT [products].[good_name], [products].[price] FROM products "
+        "JOIN goods_name ON [products].[good_id] = [goods_name].[id] "
+        "WHERE [goods_name].[name] LIKE '%Kẹo me cay%'"
+    ),
+    "name_unaccented": (
+        "SELECT [products].[good_name], [products].[price] FROM products "
+        "JOIN goods_name ON [products].[good_id] = [goods_name].[id] "
+        "WHERE [goods_name].[name] LIKE '%dau phong rang%'"
+    ),
+    "store": (
+        "SELECT [products].[good_name], [products].[price], [products].[store_name] FROM products "
+        "JOIN goods_name ON [products].[good_id] = [goods_name].[id] "
+        "WHERE [products].[store_name] LIKE '%Đà Lạt%' LIMIT 20"
+    ),
+    "category": (
+        "SELECT [products].[good_name], [products].[good_images], [products].[store_name], [products].[price] "
+        "FROM products JOIN goods_name ON [products].[good_id] = [goods_name].[id] "
+        "WHERE [products].[category2] LIKE '%ăn vặt%' LIMIT 20"
+    ),
+    "name_and_store": (
+        "SELECT [products].[good_name], [products].[price] FROM products "
+        "JOIN goods_name ON [products].[good_id] = [goods_name].[id] "
+        "WHERE [goods_name].[name] LIKE '%mít sấy%' AND [products].[store_name] LIKE '%DaLaVi%'"
+    ),
+}
+
+
+def generate_catalog(db_path: str, rows: int, rng: random.Random, batch_size: int = 10000) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE goods_name (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY, category1 TEXT, category2 TEXT, category3 TEXT,
+            store_id INTEGER, store_name TEXT, area TEXT, good_id INTEGER, good_name TEXT,
+            good_common TEXT, good_images TEXT, price INTEGER
+        );
+    """)
+    for start in range(0, rows, batch_size):
+        goods, products = [], []
+        for i in range(start + 1, min(start + batch_size, rows) + 1):
+            name = " ".join(rng.sample(PRODUCT_WORDS, rng.randint(2, 4))).capitalize() + f" {rng.randint(1, 9) * 100}gr"
+            store_id = rng.randrange(len(STORES))
+            goods.append((i, name))
+            products.append((i, "Thực phẩm", rng.choice(CATEGORIES), "", store_id, STORES[store_id], "Miền Trung",
+                             i, name, f"{name} chất lượng cao", f"https://example.com/{i}.jpg",
+                             rng.randint(10, 500) * 1000))
+        conn.executemany("INSERT INTO goods_name VALUES (?, ?)", goods)
+        conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", products)
+        conn.commit()
+    conn.execute("CREATE INDEX idx_products_good_id ON products(good_id)")
+    conn.commit()
+    conn.close()
+
+
+def database_size(db_path: str) -> int:
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+
+def time_query(conn: sqlite3.Connection, query: str, repeats: int) -> Dict[str, Any]:
+    samples = []
+    rows = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = conn.execute(query).fetchall()
+        samples.append(time.perf_counter() - start)
+    return {"median_ms": round(statistics.median(samples) * 1000, 3), "rows": len(rows)}
+
+
+def time_inserts(db_path: str, count: int, rng: random.Random) -> float:
+    """Thời gian ghi thêm count sản phẩm (đo chi phí trigger)"""
+    conn = sqlite3.connect(db_path)
+    offset = conn.execute("SELECT max(id) FROM products").fetchone()[0]
+    start = time.perf_counter()
+    with conn:
+        for i in range(offset + 1, offset + count + 1):
+            name = " ".join(rng.sample(PRODUCT_WORDS, 3)).capitalize()
+            conn.execute("INSERT INTO goods_name VALUES (?, ?)", (i, name))
+            conn.execute("INSERT INTO products (id, category2, store_name, good_id, good_name, price) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (i, rng.choice(CATEGORIES), rng.choice(STORES), i, name, 1000))
+    seconds = time.perf_counter() - start
+    conn.close()
+    return seconds
+
+
+def run_size(rows: int, work_dir: str, repeats: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    db_path = os.path.join(work_dir, f"catalog_{rows}.db")
+    print(f"[{rows}] generating catalog...", flush=True)
+    generate_catalog(db_path, rows, rng)
+
+    insert_rows = 1000
+    inserts_without_index = time_inserts(db_path, insert_rows, rng)
+
+    size_before = database_size(db_path)
+    print(f"[{rows}] building FTS index...", flush=True)
+    start = time.perf_counter()
+    build_index(db_path, rebuild=True)
+    build_seconds = time.perf_counter() - start
+    index_growth = database_size(db_path) - size_before
+
+    inserts_with_index = time_inserts(db_path, insert_rows, rng)
+
+    conn = sqlite3.connect(db_path)
+    queries = {}
+    for name, query in QUERIES.items():
+        rewritten, rewrites = rewrite_like_to_match(query)
+        print(f"[{rows}] query {name}...", flush=True)
+        like = time_query(conn, query, repeats)
+        match = time_query(conn, rewritten, repeats)
+        queries[name] = {
+            "rewrites": rewrites,
+            "like": like,
+            "match": match,
+            "speedup": round(like["median_ms"] / match["median_ms"], 1) if match["median_ms"] else None,
+        }
+    conn.close()
+    os.remove(db_path)
+
+    return {
+        "build_seconds": round(build_seconds, 3),
+        "index_growth_bytes": index_growth,
+        "insert_ms_per_row": {
+            "without_index": round(inserts_without_index / insert_rows * 1000, 4),
+            "with_index": round(inserts_with_index / insert_rows * 1000, 4),
+        },
+        "queries": queries,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark tìm kiếm sản phẩm LIKE so với FTS5")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="Số dòng catalog")
+    parser.add_argument("--repeats", type=int, default=5, help="Số lần chạy mỗi truy vấn")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", default="bench_product_search.json", help="File JSON kết quả")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    work_dir = tempfile.mkdtemp(prefix="product_search_bench_")
+
+    try:
+        results = {str(rows): run_size(rows, work_dir, args.repeats, args.seed) for rows in args.rows}
+        report = {
+            "meta": {
+                "timestamp": int(time.time()),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "params": {"rows": args.rows, "repeats": args.repeats, "seed": args.seed},
+            },
+            "results": results,
+        }
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+        for rows, result in results.items():
+            print(f"{rows:>8} rows: index built in {result['build_seconds']}s, "
+                  f"+{result['index_growth_bytes'] / (1024 * 1024):.1f} MB")
+            for name, query in result["queries"].items():
+                print(f"    {name:<18} LIKE {query['like']['median_ms']:>9} ms ({query['like']['rows']} rows)  "
+                      f"MATCH {query['match']['median_ms']:>9} ms ({query['match']['rows']} rows)")
+        print(f"Results written to {args.output}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
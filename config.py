@@ -7,12 +7,36 @@ load_dotenv()
 # Database config
 DB_NAME = os.getenv("DB_NAME", "data/database/data.db")
 CHAT_HISTORY_DB = os.getenv("CHAT_HISTORY_DB", "data/database/chat_history.db")
+# Read-only connection pool for the product catalog: one connection per worker thread
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+# Retries when the database is locked, with jittered exponential backoff (seconds)
+SQLITE_RETRY_ATTEMPTS = int(os.getenv("SQLITE_RETRY_ATTEMPTS", "5"))
+SQLITE_RETRY_BASE_DELAY = float(os.getenv("SQLITE_RETRY_BASE_DELAY", "0.05"))
+SQLITE_RETRY_MAX_DELAY = float(os.getenv("SQLITE_RETRY_MAX_DELAY", "2"))
+# Cache of formatted catalog query results, invalidated when the database file changes
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "600"))
+# Results longer than this (characters of markdown) are not cached
+QUERY_CACHE_MAX_RESULT_CHARS = int(os.getenv("QUERY_CACHE_MAX_RESULT_CHARS", "65536"))
+# Bounds on a formatted query result, so a broad SELECT cannot flood memory or the prompt
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "50"))
+QUERY_MAX_RESULT_CHARS = int(os.getenv("QUERY_MAX_RESULT_CHARS", "8000"))
+QUERY_MAX_CELL_CHARS = int(os.getenv("QUERY_MAX_CELL_CHARS", "300"))
+QUERY_FETCH_BATCH = int(os.getenv("QUERY_FETCH_BATCH", "100"))
+# Rows past the limits are counted up to this number for the "N more rows" note
+QUERY_COUNT_LIMIT = int(os.getenv("QUERY_COUNT_LIMIT", "10000"))
 
 # Telegram config
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
 # API endpoints
 LLM_URL = os.getenv("LLM_URL")
+# Comma-separated list of LLM backends, defaults to LLM_URL
+LLM_URLS = [url.strip() for url in os.getenv("LLM_URLS", LLM_URL or "").split(",") if url.strip()]
 STT_API_URL = os.getenv("STT_API_URL", "http://127.0.0.1:5001/api/speech-to-text")
 TTS_API_URL = os.getenv("TTS_API_URL", "http://127.0.0.1:5002/api/text-to-speech")
 
@@ -20,6 +44,23 @@ TTS_API_URL = os.getenv("TTS_API_URL", "http://127.0.0.1:5002/api/text-to-speech
 CHATBOT_MODEL = os.getenv("CHATBOT_MODEL")
 CHATBOT_TEMPERATURE = float(os.getenv("CHATBOT_TEMPERATURE", "0.5"))
 CHATBOT_MAX_TOKENS = int(os.getenv("CHATBOT_MAX_TOKENS", "500"))
+# LLM backend pool: health checks and hedged requests
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "15"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2.0"))
+# Total timeout of a non-streaming LLM request
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+# Prompt token budget: context window of the model, minus the tokens reserved for the answer
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "4096"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", str(LLM_CONTEXT_TOKENS - CHATBOT_MAX_TOKENS)))
+# Share of the budget left after instructions and question that chat history may use
+PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.25"))
+# Hugging Face tokenizer matching the LLM; without it tokens are estimated from characters
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "3.0"))
+# Stream tokens from the LLM and edit the Telegram message as they arrive
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes")
+LLM_STREAM_EDIT_INTERVAL = float(os.getenv("LLM_STREAM_EDIT_INTERVAL", "1.5"))
 
 # ChromaDB config
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "data/chroma_db")
@@ -28,6 +69,62 @@ RERANKER_MODEL = os.getenv("RERANKER_MODEL")
 USE_RERANKER = os.getenv("USE_RERANKER")
 RERANKER_THRESHOLD = float(os.getenv("RERANKER_THRESHOLD"))
 
+# Ingestion config
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "2.0"))
+# PDFs up to this size are parsed from memory, larger ones are spilled to a temp file
+PDF_IN_MEMORY_MAX_BYTES = int(os.getenv("PDF_IN_MEMORY_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# Document lifecycle config
+# Uploaded documents older than this are removed by the background sweeper (0 disables expiry)
+DOCUMENT_TTL_SECONDS = int(os.getenv("DOCUMENT_TTL_SECONDS", str(30 * 24 * 3600)))
+DOCUMENT_SWEEP_INTERVAL = int(os.getenv("DOCUMENT_SWEEP_INTERVAL", "3600"))
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "500"))
+ADMIN_CHAT_IDS = {int(i) for i in os.getenv("ADMIN_CHAT_IDS", "").split(",") if i.strip()}
+
+# Shared HTTP client config
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "60"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
+# Per-source timeouts for answer context: a source slower than this is dropped from the prompt
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "8"))
+PRODUCT_QA_ENABLED = os.getenv("PRODUCT_QA_ENABLED", "true").lower() in ("1", "true", "yes")
+PRODUCT_QA_TIMEOUT = float(os.getenv("PRODUCT_QA_TIMEOUT", "6"))
+# Deterministic fast path for common catalog questions (no LLM): a product-name match below
+# FAST_PATH_MIN_CONFIDENCE, or more than FAST_PATH_MAX_MATCHES equally good matches, falls back to text-to-SQL
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.75"))
+FAST_PATH_MAX_MATCHES = int(os.getenv("FAST_PATH_MAX_MATCHES", "5"))
+# Store and category names are reloaded from the catalog after this many seconds
+FAST_PATH_VOCAB_TTL = float(os.getenv("FAST_PATH_VOCAB_TTL", "300"))
+
+# Circuit breaker config for LLM, STT and TTS
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Calls slower than this are counted in the slow_calls metric only
+CIRCUIT_SLOW_CALL_WARN_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_WARN_SECONDS", "20"))
+# Calls slower than this count as failures and can open the circuit (0 disables, the default:
+# a slow answer from a CPU-bound LLM backend is still an answer, timeouts already count as failures)
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "0"))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+# Download config
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_IMAGE_DOWNLOAD_BYTES = int(os.getenv("MAX_IMAGE_DOWNLOAD_BYTES", str(10 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "2"))
+
+# Ingestion job queue config
+INGEST_QUEUE_DB = os.getenv("INGEST_QUEUE_DB", "data/database/ingestion_jobs.db")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "30"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "5"))
+
 # TTS voice config
 TTS_VOICE = os.getenv("TTS_VOICE", "vi-VN-NamMinhNeural")
 
@@ -37,4 +134,7 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 # Chat history config
 MAX_HISTORY_ENTRIES = int(os.getenv("MAX_HISTORY_ENTRIES", "5"))
-RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.7"))
\ No newline at end of file
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.7"))
+# Rolling per-chat summary used in prompts instead of raw history turns
+CHAT_SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "200"))
\ No newline at end of file
@@ -1,60 +1,261 @@
-from flask import Flask, request, jsonify
-import google.generativeai as genai
-from functools import wraps
 import os
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
 import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 # Cấu hình logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-app = Flask(__name__)
 
 API_KEY = os.getenv("API_KEY")
 CHATBOT_MODEL = os.getenv("CHATBOT_MODEL")
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel(CHATBOT_MODEL)
-chat_sessions = {}
-
-
-# def require_api_key(f):
-#     @wraps(f)
-#     def decorated_function(*args, **kwargs):
-#         api_key = request.headers.get('X-API-Key')
-#         logger.info(f"Received API Key: {api_key}")
-#         logger.info(f"Expected API Key: {GOOGLE_API_KEY}")
-#         if not api_key or api_key != GOOGLE_API_KEY:
-#             return jsonify({'error': 'Invalid or missing API key'}), 401
-#         return f(*args, **kwargs)
-#     return decorated_function
-
-@app.route('/api/generate', methods=['POST'])
-# @require_api_key
-def generate_text():
+# Số request Gemini chạy đồng thời, số request được xếp hàng chờ và thời gian chờ tối đa trong hàng đợi
+GATEWAY_MAX_CONCURRENCY = int(os.getenv("GATEWAY_MAX_CONCURRENCY", "8"))
+GATEWAY_MAX_QUEUE = int(os.getenv("GATEWAY_MAX_QUEUE", "64"))
+GATEWAY_QUEUE_TIMEOUT = float(os.getenv("GATEWAY_QUEUE_TIMEOUT", "30"))
+# Dùng model giả lập (không gọi Gemini) để chạy thử và kiểm thử cục bộ
+GATEWAY_STUB_MODEL = os.getenv("GATEWAY_STUB_MODEL", "false").lower() in ("1", "true", "yes")
+
+app = FastAPI(title="Gemini Gateway", description="API sinh văn bản bằng Gemini, tương thích /api/generate của Ollama")
+
+
+class QueueFullError(Exception):
+    """Raised when a request cannot get a generation slot in time"""
+
+
+class _Slot:
+    """Một chỗ trong giới hạn đồng thời; release() an toàn khi gọi nhiều lần"""
+
+    def __init__(self, limiter: "ConcurrencyLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+
+class ConcurrencyLimiter:
+    """Giới hạn số request sinh văn bản chạy đồng thời, các request còn lại xếp hàng có giới hạn"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.completed = 0
+
+    async def acquire(self) -> _Slot:
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Queue is full ({self.waiting} waiting)")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFullError(f"Timed out after {self.queue_timeout}s in queue")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        return _Slot(self)
+
+    def _release(self) -> None:
+        self.active -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class GeminiModel:
+    """Gọi Gemini bằng client async"""
+
+    def __init__(self, api_key: str, model_name: str):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+        # Mỗi system prompt cố định có một model riêng, được tạo một lần
+        self._models: Dict[Optional[str], Any] = {}
+
+    def _get_model(self, system: Optional[str]):
+        model = self._models.get(system)
+        if model is None:
+            model = self._genai.GenerativeModel(self.model_name, system_instruction=system or None)
+            self._models[system] = model
+        return model
+
+    @staticmethod
+    def _generation_config(options: Dict[str, Any]) -> Dict[str, Any]:
+        config = {}
+        if "temperature" in options:
+            config["temperature"] = options["temperature"]
+        if "num_predict" in options:
+            config["max_output_tokens"] = options["num_predict"]
+        return config
+
+    @staticmethod
+    def _usage(response) -> Dict[str, Any]:
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return {}
+        return {"prompt_eval_count": usage.prompt_token_count, "eval_count": usage.candidates_token_count}
+
+    async def generate(self, prompt: str, system: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._get_model(system).generate_content_async(
+            prompt, generation_config=self._generation_config(options)
+        )
+        return {"text": response.text, **self._usage(response)}
+
+    async def stream(self, prompt: str, system: Optional[str], options: Dict[str, Any],
+                     usage: Dict[str, Any]) -> AsyncIterator[str]:
+        response = await self._get_model(system).generate_content_async(
+            prompt, generation_config=self._generation_config(options), stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        usage.update(self._usage(response))
+
+
+class StubModel:
+    """Model giả lập: trả về lại prompt theo từng từ, không cần API key"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.model_name = "stub"
+
+    async def generate(self, prompt: str, system: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(self.delay)
+        return {"text": f"Stub answer: {prompt[-200:]}", "prompt_eval_count": len(prompt.split())}
+
+    async def stream(self, prompt: str, system: Optional[str], options: Dict[str, Any],
+                     usage: Dict[str, Any]) -> AsyncIterator[str]:
+        for word in f"Stub answer: {prompt[-200:]}".split(" "):
+            await asyncio.sleep(self.delay)
+            yield word + " "
+        usage["prompt_eval_count"] = len(prompt.split())
+
+
+app.state.model = StubModel() if GATEWAY_STUB_MODEL else GeminiModel(API_KEY, CHATBOT_MODEL)
+app.state.limiter = ConcurrencyLimiter(GATEWAY_MAX_CONCURRENCY, GATEWAY_MAX_QUEUE, GATEWAY_QUEUE_TIMEOUT)
+if isinstance(app.state.model, StubModel):
+    logger.warning("Gemini gateway is running with the stub model")
+
+
+def _ndjson(data: Dict[str, Any]) -> bytes:
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_generation(model, slot: _Slot, prompt: str, system: Optional[str],
+                             options: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """NDJSON giống Ollama: một dòng {"response": ..., "done": false} cho mỗi đoạn, dòng cuối có done=true"""
+    start = time.monotonic()
+    usage: Dict[str, Any] = {}
+    try:
+        async for piece in model.stream(prompt, system, options, usage):
+            yield _ndjson({"model": model.model_name, "response": piece, "done": False})
+        yield _ndjson({"model": model.model_name, "response": "", "done": True,
+                       "total_duration": int((time.monotonic() - start) * 1e9), **usage})
+    except Exception as e:
+        # Header đã được gửi, báo lỗi trong stream để client dừng lại
+        logger.error(f"Streaming generation error: {str(e)}")
+        yield _ndjson({"error": str(e), "done": True})
+    finally:
+        slot.release()
+
+
+@app.post("/api/generate")
+async def generate_text(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or not data.get('prompt'):
+        return JSONResponse({'success': False, 'error': 'Prompt is required'}, status_code=400)
+
+    prompt = data['prompt']
+    system = data.get('system')
+    options = data.get('options') or {}
+    logger.info(f"Generating text for prompt ({len(prompt)} chars, stream={bool(data.get('stream'))})")
+
+    limiter: ConcurrencyLimiter = app.state.limiter
     try:
-        data = request.get_json()
-        if not data or 'prompt' not in data:
-            return jsonify({'error': 'Prompt is required'}), 400
+        slot = await limiter.acquire()
+    except QueueFullError as e:
+        logger.warning(f"Rejecting request: {str(e)}")
+        return JSONResponse({'success': False, 'error': 'Server is busy, please retry'},
+                            status_code=503, headers={"Retry-After": "1"})
 
-        prompt = data['prompt']
-        logger.info(f"Generating text for prompt: {prompt}")
+    model = app.state.model
+    if data.get('stream'):
+        # Slot được giải phóng khi stream kết thúc; BackgroundTask phòng khi stream không bao giờ bắt đầu
+        return StreamingResponse(
+            _stream_generation(model, slot, prompt, system, options),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(slot.release)
+        )
 
-        response = model.generate_content(prompt)
-        return jsonify({
+    try:
+        start = time.monotonic()
+        result = await model.generate(prompt, system, options)
+        return JSONResponse({
             'success': True,
-            'response': response.text
+            'response': result.pop("text"),
+            'model': model.model_name,
+            'done': True,
+            'total_duration': int((time.monotonic() - start) * 1e9),
+            **result
         })
-    except genai.GenerationError as e:
-        logger.error(f"Generation error: {str(e)}")
-        return jsonify({'success': False, 'error': f"Generation error: {str(e)}"}), 500
     except Exception as e:
         logger.error(f"Unexpected error in generate_text: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+    finally:
+        slot.release()
+
+
+@app.get("/api/tags")
+async def list_models():
+    """Tương thích health check của LLM pool"""
+    return {"models": [{"name": app.state.model.model_name}]}
+
 
+# Health check endpoint
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "ok",
+        "timestamp": time.time(),
+        "model": app.state.model.model_name,
+        "concurrency": app.state.limiter.get_stats(),
+    }
 
-# Giữ nguyên phần code còn lại (chat endpoint, etc.)
 
 if __name__ == "__main__":
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    uvicorn.run("main_rag:app", host="127.0.0.1", port=5000)
@@ -4,11 +4,21 @@ import aiohttp
 from typing import Optional
 
 from config import STT_API_URL, TTS_API_URL, TTS_VOICE
+from src.api.http_client import get_session
+from src.core.circuit_breaker import CircuitBreaker, CircuitOpenError
 from src.utils import setup_logger
 
 # Get logger
 logger = setup_logger("voices", "logs/voices.log")
 
+# Khi dịch vụ STT/TTS lỗi liên tục, từ chối ngay thay vì chờ hết timeout
+stt_breaker = CircuitBreaker("stt")
+tts_breaker = CircuitBreaker("tts")
+
+
+class ServiceResponseError(Exception):
+    """Raised for 5xx responses so that the circuit breaker counts them as failures"""
+
 
 async def speech_to_text(audio_path: str, language: str = "vi-VN") -> str:
     """
@@ -26,19 +36,24 @@ async def speech_to_text(audio_path: str, language: str = "vi-VN") -> str:
         form_data.add_field('language', language)
 
         # Call STT API
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
+        async with stt_breaker.guard():
+            async with get_session().post(
                     STT_API_URL,
                     data=form_data,
-                    timeout=30) as response:
+                    timeout=aiohttp.ClientTimeout(total=30)) as response:
                 if response.status == 200:
                     result = await response.json()
                     if result.get('success'):
                         text = result.get('text', '')
                         logger.info(f"Recognized text: {text[:50]}...")
                         return text
+                if response.status >= 500:
+                    raise ServiceResponseError(f"STT API error: {response.status}")
                 logger.error(f"STT API error: {response.status}")
                 return ""
+    except CircuitOpenError as e:
+        logger.warning(f"Speech-to-text skipped: {e}")
+        return ""
     except Exception as e:
         logger.error(f"Speech-to-text error: {e}")
         return ""
@@ -49,22 +64,27 @@ async def text_to_speech(text: str, voice: str = TTS_VOICE) -> Optional[str]:
     try:
         payload = {'text': text, 'voice': voice}
         # Call API with text payload
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
+        async with tts_breaker.guard():
+            async with get_session().post(
                     TTS_API_URL,
                     json=payload,
-                    timeout=30) as response:
+                    timeout=aiohttp.ClientTimeout(total=30)) as response:
                 if response.status == 200:
                     # Save audio to temporary file
                     with tempfile.NamedTemporaryFile(
                             dir="temp_audio", delete=False, suffix='.mp3') as temp_file:
-                        temp_file.write(await response.read())
+                        async for block in response.content.iter_chunked(64 * 1024):
+                            temp_file.write(block)
                         logger.info(f"Saved audio TTS to {temp_file.name}")
                         return temp_file.name
-                logger.error(
-                    f"TTS API error: {response.status} - {await response.text()}"
-                )
+                error_text = await response.text()
+                if response.status >= 500:
+                    raise ServiceResponseError(f"TTS API error: {response.status} - {error_text[:200]}")
+                logger.error(f"TTS API error: {response.status} - {error_text}")
                 return None
+    except CircuitOpenError as e:
+        logger.warning(f"Text-to-speech skipped: {e}")
+        return None
     except Exception as e:
         logger.error(f"Text-to-speech error: {e}")
         return None
@@ -75,9 +95,8 @@ async def get_available_voices() -> list:
     try:
         # Call TTS API to get voices
         voice_url = f"{TTS_API_URL.rsplit('/', 1)[0]}/voices/vietnamese"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(voice_url, timeout=10) as response:
-                return await response.json() if response.status == 200 else []
+        async with get_session().get(voice_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            return await response.json() if response.status == 200 else []
     except Exception as e:
         logger.error(f"Error getting voices: {e}")
         return []
@@ -0,0 +1,127 @@
+import logging
+from collections import defaultdict
+from typing import Optional, Dict, Any
+
+import aiohttp
+
+from config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TOTAL_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientManager:
+    """
+    Quản lý session aiohttp dùng chung cho toàn bộ ứng dụng: connection pool giới hạn theo host,
+    keep-alive, timeout mặc định và thống kê tái sử dụng kết nối
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 total_timeout: float = HTTP_TOTAL_TIMEOUT, dns_cache_ttl: int = HTTP_DNS_CACHE_TTL):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout)
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Tạo session, gọi khi ứng dụng khởi động"""
+        return self.get_session()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Lấy session dùng chung, tạo mới nếu chưa có hoặc đã bị đóng.
+        Phải được gọi bên trong event loop đang chạy.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                trace_configs=[self._build_trace_config()],
+            )
+            logger.info(f"Created shared HTTP session (limit={self.limit}, "
+                        f"limit_per_host={self.limit_per_host}, keepalive={self.keepalive_timeout}s)")
+        return self._session
+
+    async def close(self) -> None:
+        """Đóng session khi ứng dụng dừng"""
+        if self._session is not None and not self._session.closed:
+            logger.info(f"HTTP connection metrics: {self.get_metrics()}")
+            await self._session.close()
+            logger.info("Closed shared HTTP session")
+        self._session = None
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        stats = self._stats
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host or "unknown"
+            stats[ctx.host]["requests"] += 1
+
+        async def on_request_exception(session, ctx, params):
+            stats[getattr(ctx, "host", "unknown")]["errors"] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            stats[getattr(ctx, "host", "unknown")]["new_connections"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats[getattr(ctx, "host", "unknown")]["reused_connections"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            stats[getattr(ctx, "host", "unknown")]["dns_lookups"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Thống kê theo host: số request, kết nối mới, kết nối tái sử dụng, DNS lookup, lỗi
+        và tỉ lệ tái sử dụng kết nối
+        """
+        hosts = {}
+        for host, counters in self._stats.items():
+            new = counters.get("new_connections", 0)
+            reused = counters.get("reused_connections", 0)
+            hosts[host] = {
+                "requests": counters.get("requests", 0),
+                "new_connections": new,
+                "reused_connections": reused,
+                "dns_lookups": counters.get("dns_lookups", 0),
+                "errors": counters.get("errors", 0),
+                "reuse_ratio": round(reused / (new + reused), 3) if new + reused else 0.0,
+            }
+        return hosts
+
+
+# Instance dùng chung, gắn với vòng đời của bot
+http_client = HTTPClientManager()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Lấy session aiohttp dùng chung"""
+    return http_client.get_session()
+
+
+async def close_session() -> None:
+    """Đóng session dùng chung khi ứng dụng dừng"""
+    await http_client.close()
@@ -1,21 +1,47 @@
 import os
+import asyncio
 import tempfile
 import time
+import weakref
+from datetime import datetime
 
-from typing import Optional, List, Dict, Any
-from telegram import Update
-from telegram.ext import ContextTypes
+from typing import Optional, List, Dict, Any, Callable, Awaitable, AsyncIterator, Tuple
+from telegram import Update, Message
+from telegram.ext import Application, ContextTypes
 from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
 
 from config import MAX_HISTORY_ENTRIES, RELEVANCE_THRESHOLD
-from config import USE_RERANKER
-
-from src.api.api_stt_tts import speech_to_text, text_to_speech
-
-from src.core.chroma_handler import process_pdf, search_documents
-from src.core.llm_generate import generate_answer
+from config import USE_RERANKER, INGEST_PROGRESS_INTERVAL, MAX_DOWNLOAD_BYTES, PDF_IN_MEMORY_MAX_BYTES
+from config import ADMIN_CHAT_IDS, DOCUMENT_TTL_SECONDS, DOCUMENT_SWEEP_INTERVAL
+from config import LLM_STREAM, LLM_STREAM_EDIT_INTERVAL, CHAT_SUMMARY_ENABLED
+from config import RETRIEVAL_TIMEOUT, PRODUCT_QA_ENABLED, PRODUCT_QA_TIMEOUT
+
+from src.api.api_stt_tts import speech_to_text, text_to_speech, stt_breaker
+from src.api.http_client import http_client
+
+from src.core.chroma_handler import ingest_pdf, ingest_pdf_bytes, ingest_file, search_documents
+from src.core.chroma_handler import ORIGIN_CATALOG, ORIGIN_UPLOAD
+from src.core.chroma_handler import list_sources, has_source, delete_documents, expire_documents
+from src.core.llm_generate import generate_answer, generate_answer_stream, llm_single_flight, prompt_eval_stats
+from src.core.llm_generate import summarize_conversation
+from src.core.prompt_budget import count_tokens
+from src.core.llm_pool import llm_pool
+from src.core.circuit_breaker import get_circuit_stats
+from src.core.core_shop import answer_product_query, is_product_query
+from src.core.intent_router import intent_router
+from src.db.sqlite_pool import close_pools, get_pool_stats
+from src.db.query_cache import query_cache
 
 from src.manager.Chat_History_Manager import ChatHistoryManager
+from src.manager.Ingestion_Queue_Manager import (
+    IngestionJobQueue,
+    IngestionWorkerPool,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    STATUS_DONE,
+    STATUS_FAILED,
+)
 
 from src.utils import setup_logger
 
@@ -24,6 +50,33 @@ logger = setup_logger("src", "logs/src.log")
 # Import chat history
 chat_history_manager = ChatHistoryManager()
 
+# Telegram rejects messages longer than this
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Number of raw history turns used when a chat has no summary yet
+RAW_HISTORY_TURNS = 3
+# Uploaded file extensions and the loader type used to ingest them
+UPLOAD_DOCUMENT_TYPES = {'.pdf': 'pdf', '.csv': 'csv', '.txt': 'txt'}
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable[Any]) -> Any:
+    """Await a pipeline stage and record its duration in timings"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def _document_type_of(file_name: str) -> Optional[str]:
+    """Loader type for an uploaded file name, None when the extension is not supported"""
+    return UPLOAD_DOCUMENT_TYPES.get(os.path.splitext(file_name or "")[1].lower())
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """Flood-control wait time, an int or a timedelta depending on the library version"""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
 
 class TelegramBotHandler:
     """
@@ -43,6 +96,61 @@ class TelegramBotHandler:
         # Threshold for ChromaDB relevance
         self.chroma_relevance_threshold = RELEVANCE_THRESHOLD
 
+        # Background ingestion queue for uploaded documents
+        self.bot = None
+        self.ingestion_queue = IngestionJobQueue()
+        self.ingestion_workers = IngestionWorkerPool(
+            self.ingestion_queue,
+            self._run_ingestion_job,
+            on_finished=self._on_ingestion_finished
+        )
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+        # Fire-and-forget tasks (typing action, summary updates); rolling chat summaries are
+        # updated one at a time per chat, locks are dropped once no summary task of that chat holds them
+        self._summary_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._background_tasks: set = set()
+        self.history_token_stats = {"turns": 0, "raw_tokens": 0, "used_tokens": 0}
+
+    async def on_startup(self, application: Application) -> None:
+        """
+        Start background workers once the application is initialized
+        """
+        self.bot = application.bot
+        await http_client.start()
+        await llm_pool.start()
+        self.ingestion_workers.start()
+        if DOCUMENT_TTL_SECONDS > 0:
+            self._sweeper_task = asyncio.create_task(self._expiry_sweeper(), name="document-expiry-sweeper")
+
+    async def on_shutdown(self, application: Application) -> None:
+        """
+        Stop background workers on application shutdown
+        """
+        await self.ingestion_workers.stop()
+        for task in list(self._background_tasks):
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await llm_pool.stop()
+        await asyncio.to_thread(close_pools)
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            await asyncio.gather(self._sweeper_task, return_exceptions=True)
+        await http_client.close()
+
+    async def _expiry_sweeper(self) -> None:
+        """
+        Periodically remove uploaded documents older than DOCUMENT_TTL_SECONDS
+        """
+        while True:
+            try:
+                deleted = await asyncio.to_thread(expire_documents, DOCUMENT_TTL_SECONDS)
+                if deleted:
+                    self.logger.info(f"Expiry sweeper removed {deleted} chunks")
+            except Exception as e:
+                self.logger.error(f"Error expiring documents: {str(e)}")
+            await asyncio.sleep(DOCUMENT_SWEEP_INTERVAL)
+
     async def process_and_respond(
             self,
             chat_id: int,
@@ -56,34 +164,48 @@ class TelegramBotHandler:
         """
         try:
             start_time = time.time()
-            await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            timings: Dict[str, float] = {}
+
+            # Typing indicator không cần chờ
+            self._spawn(context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING), "typing")
 
             # Đăng ký log để debug
             self.logger.info(f"Processing query: '{query_text}'")
 
-            # Step 1: Search ChromaDB for relevant information
-            # Sử dụng reranker
-            chroma_results, relevance_scores = await search_documents(
-                query_text,
-                limit=5,
-                return_scores=True,
-                threshold=0.4,  # Lấy tất cả kết quả trước khi phân tích
-                use_reranker=USE_RERANKER
-            )
-            self.logger.info(f"ChromaDB search completed in {time.time() - start_time:.2f} seconds")
+            # Step 1: Search ChromaDB (with reranker), query the product catalog and build the history
+            # context concurrently; the stages do not depend on each other. A knowledge source slower
+            # than its timeout is dropped instead of delaying the answer.
+            stages = [
+                _timed(timings, "retrieval", self._with_timeout(
+                    "retrieval",
+                    search_documents(
+                        query_text,
+                        limit=5,
+                        return_scores=True,
+                        threshold=0.4,  # Lấy tất cả kết quả trước khi phân tích
+                        use_reranker=USE_RERANKER
+                    ),
+                    RETRIEVAL_TIMEOUT,
+                    ("", [])
+                )),
+                # Get chat history for context: rolling summary + last turn, or raw turns if no summary yet
+                _timed(timings, "history", asyncio.to_thread(self._build_history_context, chat_id, query_text)),
+            ]
+            if PRODUCT_QA_ENABLED and is_product_query(query_text):
+                stages.append(_timed(timings, "product_qa", self._with_timeout(
+                    "product_qa", self._product_data(chat_id, query_text), PRODUCT_QA_TIMEOUT, ""
+                )))
+
+            results = await self._gather_stages(*stages)
+            (chroma_results, relevance_scores), (summary_str, context_str) = results[0], results[1]
+            product_data = results[2] if len(results) > 2 else ""
+            if product_data:
+                self.logger.info(f"Product catalog results length: {len(product_data)}")
             if USE_RERANKER:
                 self.logger.info(f"Results reranked with scores: {relevance_scores[:3] if relevance_scores else []}")
             else:
                 self.logger.info(f"Results retrieved with scores: {relevance_scores[:3] if relevance_scores else []}")
 
-            # Get chat history for context
-            chat_history = self.chat_history_manager.get_chat_history(chat_id, limit=3)
-            # Check history và câu hỏi mới có tương quan với nhau không
-            relevant_history = self.chat_history_manager.filter_relevant_history(query_text, chat_history)
-
-            # Format conversation context
-            context_str = self._format_chat_history(relevant_history)
-
             # Thêm log để gỡ lỗi
             self.logger.info(f"Using ChromaDB as data source")
             if chroma_results:
@@ -95,30 +217,180 @@ class TelegramBotHandler:
                     if USE_RERANKER:
                         self.logger.info(f"Reranking improved context relevance")
 
-            # Generate the final answer with the appropriate prompt template
-            answer = await generate_answer(
-                query_text,
-                context_str,
-                db_data="",  # Không sử dụng kết quả từ SQL
-                chroma_data=chroma_results,
-                prompt_template="chromadb_based"
-            )
+            if LLM_STREAM:
+                # Stream the answer into a message that is edited as tokens arrive
+                answer = await _timed(timings, "llm", self._stream_text_response(
+                    generate_answer_stream(
+                        query_text,
+                        context_str,
+                        db_data=product_data,
+                        chroma_data=chroma_results,
+                        prompt_template="chromadb_based",
+                        summary=summary_str
+                    ),
+                    update,
+                    context,
+                    chat_id
+                ))
+
+                # Save to chat history
+                self.chat_history_manager.add_conversation(chat_id, query_text, answer)
+                self._schedule_summary_update(chat_id)
+
+                # Send voice response if requested
+                if voice_response:
+                    await _timed(timings, "voice", self._send_voice_response(answer, update, context, chat_id))
+            else:
+                # Generate the final answer with the appropriate prompt template
+                answer = await _timed(timings, "llm", generate_answer(
+                    query_text,
+                    context_str,
+                    db_data=product_data,
+                    chroma_data=chroma_results,
+                    prompt_template="chromadb_based",
+                    summary=summary_str
+                ))
 
-            # Save to chat history
-            self.chat_history_manager.add_conversation(chat_id, query_text, answer)
+                # Save to chat history
+                self.chat_history_manager.add_conversation(chat_id, query_text, answer)
+                self._schedule_summary_update(chat_id)
 
-            # Send voice response if requested
-            if voice_response:
-                await self._send_voice_response(answer, update, context, chat_id)
+                # Send voice response if requested
+                if voice_response:
+                    await _timed(timings, "voice", self._send_voice_response(answer, update, context, chat_id))
 
-            # Send text response
-            await self._send_text_response(answer, update, context, chat_id)
+                # Send text response
+                await _timed(timings, "send", self._send_text_response(answer, update, context, chat_id))
 
-            self.logger.info(f"Total processing time: {time.time() - start_time:.2f} seconds")
+            self._log_stage_timings(timings, time.time() - start_time)
 
         except Exception as e:
             await self._handle_processing_error(e, chat_id, query_text, update, context)
 
+    def _build_history_context(self, chat_id: int, query_text: str) -> Tuple[str, str]:
+        """
+        Build the conversation context for the prompt as (summary, history turns) and record how many
+        tokens the summary saves compared to the raw history turns.
+        The summary is returned separately so the prompt budget keeps it as a fixed section
+        instead of dropping it as the oldest turn.
+        """
+        raw_history = self.chat_history_manager.get_chat_history(chat_id, limit=RAW_HISTORY_TURNS)
+        summary = self.chat_history_manager.get_summary(chat_id) if CHAT_SUMMARY_ENABLED else None
+
+        summary_str = summary['summary'] if summary else ""
+        if summary:
+            context_str = self._format_chat_history(raw_history[:1])
+        else:
+            # Check history và câu hỏi mới có tương quan với nhau không
+            relevant_history = self.chat_history_manager.filter_relevant_history(query_text, raw_history)
+            context_str = self._format_chat_history(relevant_history)
+
+        if raw_history:
+            raw_tokens = count_tokens(self._format_chat_history(raw_history))
+            used_tokens = count_tokens(summary_str) + count_tokens(context_str)
+            self.history_token_stats["turns"] += 1
+            self.history_token_stats["raw_tokens"] += raw_tokens
+            self.history_token_stats["used_tokens"] += used_tokens
+            self.logger.info(f"History context: {used_tokens} tokens "
+                             f"({'summary' if summary else 'raw'}, raw history would be {raw_tokens} tokens)")
+        return summary_str, context_str
+
+    def _schedule_summary_update(self, chat_id: int) -> None:
+        """
+        Update the rolling summary of a chat in the background, after the answer has been sent
+        """
+        if CHAT_SUMMARY_ENABLED:
+            self._spawn(self._update_summary(chat_id), "summary")
+
+    def _spawn(self, coro: Awaitable[Any], name: str) -> None:
+        """
+        Run a coroutine in the background, keeping a reference until it finishes and logging its failure
+        """
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+
+        def on_done(finished: asyncio.Task) -> None:
+            self._background_tasks.discard(finished)
+            if not finished.cancelled() and finished.exception():
+                self.logger.warning(f"Background task '{name}' failed: {finished.exception()}")
+
+        task.add_done_callback(on_done)
+
+    async def _with_timeout(self, source: str, awaitable: Awaitable[Any], timeout: float, fallback: Any) -> Any:
+        """
+        Await a knowledge source, returning fallback (and logging) if it is slower than timeout or fails
+        """
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Dropped knowledge source '{source}': no result within {timeout}s")
+        except Exception as e:
+            self.logger.error(f"Dropped knowledge source '{source}': {str(e)}")
+        return fallback
+
+    async def _product_data(self, chat_id: int, query_text: str) -> str:
+        """
+        Answer the query from the product catalog (text-to-SQL), as a markdown table
+        """
+        chat_history = await asyncio.to_thread(
+            self.chat_history_manager.get_chat_history, chat_id, RAW_HISTORY_TURNS
+        )
+        return await answer_product_query(query_text, chat_history)
+
+    @staticmethod
+    async def _gather_stages(*stages: Awaitable[Any]) -> List[Any]:
+        """
+        Run independent pipeline stages concurrently; if one fails the others are cancelled
+        """
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def _log_stage_timings(self, timings: Dict[str, float], total: float) -> None:
+        """
+        Log per-stage durations and the critical path: the slowest of the concurrent retrieval/history/product_qa
+        stages, followed by the sequential stages
+        """
+        parallel = {stage: timings[stage] for stage in ("retrieval", "history", "product_qa") if stage in timings}
+        critical_path = []
+        if parallel:
+            slowest = max(parallel, key=parallel.get)
+            critical_path.append(f"{slowest}={parallel[slowest]:.2f}s")
+        critical_path += [f"{stage}={seconds:.2f}s" for stage, seconds in timings.items() if stage not in parallel]
+
+        self.logger.info(
+            f"Stage timings: {', '.join(f'{stage}={seconds:.2f}s' for stage, seconds in timings.items())}; "
+            f"critical path: {' -> '.join(critical_path)}; total={total:.2f}s"
+        )
+
+    async def _update_summary(self, chat_id: int) -> None:
+        """
+        Fold all turns newer than the stored summary into it
+        """
+        # Hold a strong reference while waiting/running; the weak map drops the lock once no task uses it
+        lock = self._summary_locks.get(chat_id)
+        if lock is None:
+            lock = self._summary_locks[chat_id] = asyncio.Lock()
+        async with lock:
+            try:
+                # SQLite calls run in a thread so they never block the event loop
+                current = await asyncio.to_thread(self.chat_history_manager.get_summary, chat_id)
+                last_history_id = current["last_history_id"] if current else 0
+                turns = await asyncio.to_thread(
+                    self.chat_history_manager.get_chat_history_after, chat_id, last_history_id)
+                if not turns:
+                    return
+
+                summary = await summarize_conversation(current["summary"] if current else "", turns)
+                if summary:
+                    await asyncio.to_thread(self.chat_history_manager.save_summary, chat_id, summary, turns[-1]["id"])
+            except Exception as e:
+                self.logger.error(f"Error updating chat summary for {chat_id}: {str(e)}")
+
     def _format_chat_history(self, history_entries: List[Dict[str, Any]]) -> str:
         """
         Format chat history into a string
@@ -163,6 +435,84 @@ class TelegramBotHandler:
         else:
             await context.bot.send_message(chat_id=chat_id, text=answer, parse_mode='markdown')
 
+    async def _stream_text_response(
+            self,
+            pieces: AsyncIterator[str],
+            update: Optional[Update],
+            context: ContextTypes.DEFAULT_TYPE,
+            chat_id: int
+    ) -> str:
+        """
+        Send the answer as it is generated: the first tokens create a message, which is
+        then edited at most every LLM_STREAM_EDIT_INTERVAL seconds. Intermediate edits are
+        plain text, the final edit applies markdown. Returns the full answer.
+        """
+        answer = ""
+        message: Optional[Message] = None
+        shown = ""
+        next_edit = 0.0
+
+        async for piece in pieces:
+            answer += piece
+            now = time.monotonic()
+            if now < next_edit or not answer.strip():
+                continue
+
+            preview = answer[:TELEGRAM_MESSAGE_LIMIT]
+            try:
+                if message is None:
+                    if update:
+                        message = await update.message.reply_text(preview)
+                    else:
+                        message = await context.bot.send_message(chat_id=chat_id, text=preview)
+                elif preview != shown:
+                    await message.edit_text(preview)
+                shown = preview
+                next_edit = now + LLM_STREAM_EDIT_INTERVAL
+            except RetryAfter as e:
+                # Respect Telegram flood control
+                next_edit = now + _retry_after_seconds(e)
+            except BadRequest as e:
+                self.logger.debug(f"Skipped streaming edit: {str(e)}")
+                next_edit = now + LLM_STREAM_EDIT_INTERVAL
+
+        if message is None:
+            await self._send_text_response(answer, update, context, chat_id)
+            return answer
+
+        await self._finalize_streamed_message(message, answer, context, chat_id)
+        return answer
+
+    async def _finalize_streamed_message(
+            self,
+            message: Message,
+            answer: str,
+            context: ContextTypes.DEFAULT_TYPE,
+            chat_id: int
+    ) -> None:
+        """
+        Apply markdown to the streamed message and send any text beyond Telegram's length limit
+        """
+        parts = [answer[i:i + TELEGRAM_MESSAGE_LIMIT] for i in range(0, len(answer), TELEGRAM_MESSAGE_LIMIT)]
+
+        for attempt in range(3):
+            try:
+                await message.edit_text(parts[0], parse_mode='markdown')
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(_retry_after_seconds(e))
+            except BadRequest as e:
+                # Unbalanced markdown or unchanged text: keep the plain version
+                self.logger.debug(f"Final markdown edit failed: {str(e)}")
+                try:
+                    await message.edit_text(parts[0])
+                except BadRequest:
+                    pass
+                break
+
+        for part in parts[1:]:
+            await context.bot.send_message(chat_id=chat_id, text=part)
+
     async def _handle_processing_error(
             self,
             error: Exception,
@@ -195,6 +545,14 @@ class TelegramBotHandler:
         chat_id = update.effective_chat.id
         voice = update.message.voice
 
+        # STT đang mở circuit: báo ngay, không tải file
+        if not stt_breaker.is_available():
+            await update.message.reply_text(
+                "Xin lỗi, dịch vụ nhận dạng giọng nói đang tạm thời gián đoạn. "
+                "Vui lòng gửi câu hỏi bằng văn bản."
+            )
+            return
+
         # Show typing indicator
         await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
 
@@ -224,44 +582,151 @@ class TelegramBotHandler:
             if os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
 
-    async def handle_pdf_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
-        Handle PDF documents uploaded by users
+        Handle PDF/CSV/TXT documents uploaded by users by queueing them for background ingestion
         """
         chat_id = update.effective_chat.id
         document = update.message.document
 
-        # Check if it's a PDF
-        if not document.file_name.lower().endswith('.pdf'):
-            await update.message.reply_text("Vui lòng gửi file PDF.")
+        # Check if it's a supported document type
+        if _document_type_of(document.file_name) is None:
+            await update.message.reply_text("Vui lòng gửi file PDF, CSV hoặc TXT.")
             return
 
-        # Notify user we're processing
-        await update.message.reply_text("Đang xử lý file PDF của bạn...")
-        await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+        if document.file_size and document.file_size > MAX_DOWNLOAD_BYTES:
+            await update.message.reply_text(
+                f"File quá lớn. Kích thước tối đa là {MAX_DOWNLOAD_BYTES // (1024 * 1024)} MB.")
+            return
 
         try:
-            # Download PDF
-            pdf_file = await context.bot.get_file(document.file_id)
+            job, created = self.ingestion_queue.enqueue(
+                chat_id,
+                document.file_id,
+                document.file_unique_id,
+                document.file_name,
+                document.file_size
+            )
+        except Exception as e:
+            self.logger.error(f"Error queueing document: {str(e)}")
+            await update.message.reply_text(f"Lỗi khi xử lý file {document.file_name}: {str(e)}")
+            return
 
-            # Use temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                pdf_bytes = await pdf_file.download_as_bytearray()
-                temp_file.write(pdf_bytes)
-                pdf_path = temp_file.name
+        if not created and job['status'] == STATUS_DONE and not await asyncio.to_thread(
+                has_source, document.file_name, chat_id):
+            # Indexed earlier but expired or deleted since then, index it again
+            job, created = self.ingestion_queue.enqueue(
+                chat_id,
+                document.file_id,
+                document.file_unique_id,
+                document.file_name,
+                document.file_size,
+                force=True
+            )
 
-            # Process PDF and add to ChromaDB
-            result = await process_pdf(pdf_path, document.file_name)
+        if not created:
+            if job['status'] == STATUS_DONE:
+                await update.message.reply_text(f"File {document.file_name} đã được xử lý trước đó.")
+            else:
+                await update.message.reply_text(
+                    f"File {document.file_name} đang được xử lý (job #{job['id']}). Gõ /status để xem tiến độ.")
+            return
 
-            # Send response
-            await update.message.reply_text(result)
-        except Exception as e:
-            self.logger.error(f"Error processing PDF: {str(e)}")
-            await update.message.reply_text(f"Lỗi khi xử lý file PDF: {str(e)}")
+        # Acknowledge immediately, the worker edits this message with progress
+        status_message = await update.message.reply_text(
+            f"Đã nhận file {document.file_name} (job #{job['id']}). "
+            f"Tôi sẽ báo khi xử lý xong. Gõ /status để xem tiến độ.")
+        self.ingestion_queue.set_status_message(job['id'], status_message.message_id)
+        self.ingestion_workers.notify()
+
+    async def _run_ingestion_job(self, job: Dict[str, Any]) -> str:
+        """
+        Download and ingest a queued PDF/CSV/TXT, raising on failure so the job is retried
+        """
+        chat_id = job['chat_id']
+        # Chunks are keyed by chat and file so same-named uploads from different chats never collide
+        file_unique_id = job['file_unique_id']
+        document_type = _document_type_of(job['file_name'])
+        if document_type is None:
+            raise ValueError(f"Unsupported document type: {job['file_name']}")
+
+        temp_path = None
+        try:
+            telegram_file = await self.bot.get_file(job['file_id'])
+
+            progress_callback = None
+            if job.get('status_message_id'):
+                progress_callback = self._make_progress_callback(
+                    lambda text: self.bot.edit_message_text(
+                        text, chat_id=chat_id, message_id=job['status_message_id'])
+                )
+
+            # Small PDFs are parsed straight from memory, no temp file round trip
+            file_size = telegram_file.file_size or job.get('file_size')
+            if document_type == 'pdf' and file_size and file_size <= PDF_IN_MEMORY_MAX_BYTES:
+                pdf_bytes = await telegram_file.download_as_bytearray()
+                return await ingest_pdf_bytes(pdf_bytes, job['file_name'], progress_callback=progress_callback,
+                                              chat_id=chat_id, file_unique_id=file_unique_id)
+
+            # Spill large PDFs and all CSV/TXT files to a temp file, the loaders stream from disk
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{document_type}') as temp_file:
+                temp_path = temp_file.name
+            await telegram_file.download_to_drive(temp_path)
+
+            # Process document and add to ChromaDB
+            if document_type == 'pdf':
+                return await ingest_pdf(temp_path, job['file_name'], progress_callback=progress_callback,
+                                        chat_id=chat_id, file_unique_id=file_unique_id)
+            return await ingest_file(temp_path, job['file_name'], document_type, origin=ORIGIN_UPLOAD,
+                                     progress_callback=progress_callback, chat_id=chat_id,
+                                     file_unique_id=file_unique_id)
         finally:
             # Clean up temp file
-            if 'pdf_path' in locals() and os.path.exists(pdf_path):
-                os.remove(pdf_path)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def _on_ingestion_finished(
+            self,
+            job: Dict[str, Any],
+            result: Optional[str],
+            error: Optional[str],
+            will_retry: bool
+    ) -> None:
+        """
+        Notify the chat about the outcome of an ingestion job
+        """
+        if result:
+            text = result
+        elif will_retry:
+            text = f"Lỗi khi xử lý file {job['file_name']} (job #{job['id']}), sẽ thử lại sau: {error}"
+        else:
+            text = f"Lỗi khi xử lý file {job['file_name']}: {error}"
+
+        await self.bot.send_message(chat_id=job['chat_id'], text=text)
+
+    def _make_progress_callback(self, edit_text: Callable[[str], Awaitable[Any]]):
+        """
+        Create a throttled callback that edits the status message with ingestion progress
+        """
+        last_edit = {"time": 0.0, "text": ""}
+
+        async def report_progress(pages_done: int, chunks_done: int) -> None:
+            now = time.monotonic()
+            if now - last_edit["time"] < INGEST_PROGRESS_INTERVAL:
+                return
+
+            text = f"Đang xử lý file của bạn... {pages_done} phần đã đọc, {chunks_done} đoạn đã lưu."
+            if text == last_edit["text"]:
+                return
+
+            last_edit["time"] = now
+            last_edit["text"] = text
+            try:
+                await edit_text(text)
+            except Exception as e:
+                self.logger.debug(f"Could not update progress message: {str(e)}")
+
+        return report_progress
 
     async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -288,7 +753,7 @@ class TelegramBotHandler:
         user = update.effective_user
         welcome_message = (
             f"Xin chào {user.first_name}! Tôi là chatbot trợ giúp."
-            f"\nBạn có thể gửi tin nhắn văn bản, tin nhắn thoại, hoặc tài liệu PDF để tôi xử lý."
+            f"\nBạn có thể gửi tin nhắn văn bản, tin nhắn thoại, hoặc tài liệu PDF, CSV, TXT để tôi xử lý."
             f"\nGõ /help để xem các lệnh và chức năng của tôi."
         )
         await update.message.reply_text(welcome_message)
@@ -299,16 +764,17 @@ class TelegramBotHandler:
         """
         help_text = (
             "👋 Xin chào! Tôi là trợ lý trả lời câu hỏi cho bạn. Tôi có thể:\n\n"
-            "📄 Trích xuất thông tin từ file PDF bạn gửi\n"
+            "📄 Trích xuất thông tin từ file PDF, CSV, TXT bạn gửi\n"
             "🔊 Hiểu và trả lời tin nhắn thoại\n\n"
             "Các lệnh hỗ trợ:\n"
             "/start - Khởi động bot\n"
             "/help - Hiển thị trợ giúp này\n"
-            "/history - Xem lịch sử hội thoại gần đây\n\n"
+            "/history - Xem lịch sử hội thoại gần đây\n"
+            "/status - Xem trạng thái xử lý tài liệu\n\n"
             "💡 Mẹo:\n"
             "- Gửi tin nhắn thoại để hỏi bằng giọng nói\n"
             "- Thêm '/voice' vào cuối câu hỏi để nhận trả lời bằng giọng nói\n"
-            "- Gửi file PDF để tôi có thể tìm hiểu và trả lời về nội dung file\n"
+            "- Gửi file PDF, CSV hoặc TXT để tôi có thể tìm hiểu và trả lời về nội dung file\n"
         )
         await update.message.reply_text(help_text)
 
@@ -321,6 +787,194 @@ class TelegramBotHandler:
 
         await update.message.reply_text(history_text)
 
+    async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Display ingestion job status for this chat."""
+        chat_id = update.effective_chat.id
+
+        counts = self.ingestion_queue.get_status_counts(chat_id)
+        jobs = self.ingestion_queue.get_jobs(chat_id, limit=10)
+
+        if not jobs:
+            await update.message.reply_text("Chưa có tài liệu nào được gửi.")
+            return
+
+        labels = {
+            STATUS_QUEUED: "Đang chờ",
+            STATUS_RUNNING: "Đang xử lý",
+            STATUS_DONE: "Hoàn thành",
+            STATUS_FAILED: "Thất bại",
+        }
+        text = "Trạng thái xử lý tài liệu:\n"
+        text += ", ".join(f"{labels[status]}: {counts.get(status, 0)}" for status in labels)
+        text += "\n\n"
+        for job in jobs:
+            text += f"#{job['id']} {job['file_name']} - {labels.get(job['status'], job['status'])}"
+            if job['attempts'] > 1:
+                text += f" (lần thử {job['attempts']})"
+            text += "\n"
+
+        await update.message.reply_text(text)
+
+    def _is_admin(self, update: Update) -> bool:
+        return bool(update.effective_user and update.effective_user.id in ADMIN_CHAT_IDS)
+
+    async def sources_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Admin: list indexed sources with chunk counts and sizes, optionally of one chat, e.g. /sources 12345"""
+        if not self._is_admin(update):
+            await update.message.reply_text("Bạn không có quyền sử dụng lệnh này.")
+            return
+
+        chat_id = None
+        if context.args:
+            try:
+                chat_id = int(context.args[0])
+            except ValueError:
+                await update.message.reply_text("Cách dùng: /sources [chat_id]")
+                return
+
+        sources = await asyncio.to_thread(list_sources, chat_id)
+        if not sources:
+            await update.message.reply_text("Chưa có tài liệu nào trong cơ sở dữ liệu.")
+            return
+
+        text = f"Có {len(sources)} nguồn tài liệu:\n\n"
+        for entry in sources[:50]:
+            owner = f"chat {entry['chat_id']}" if entry['chat_id'] is not None else entry['origin'] or "catalog"
+            text += f"- {entry['source']} ({owner}): {entry['chunks']} đoạn, {entry['size'] / 1024:.1f} KB"
+            if entry['uploaded_at']:
+                text += f", tải lên {datetime.fromtimestamp(entry['uploaded_at']):%Y-%m-%d %H:%M}"
+            text += "\n"
+        if len(sources) > 50:
+            text += f"... và {len(sources) - 50} nguồn khác\n"
+
+        await update.message.reply_text(text)
+
+    async def delete_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Admin: delete all chunks of a source uploaded in this chat (/delete file.pdf),
+        in another chat (/delete 12345 file.pdf) or of the catalog (/delete catalog products.csv)
+        """
+        if not self._is_admin(update):
+            await update.message.reply_text("Bạn không có quyền sử dụng lệnh này.")
+            return
+
+        args = list(context.args or [])
+        chat_id = update.effective_chat.id
+        if len(args) > 1 and args[0].lower() == ORIGIN_CATALOG:
+            chat_id = None
+            args = args[1:]
+        elif len(args) > 1 and args[0].lstrip('-').isdigit():
+            chat_id = int(args[0])
+            args = args[1:]
+
+        source = " ".join(args).strip()
+        if not source:
+            await update.message.reply_text("Cách dùng: /delete [chat_id | catalog] <tên nguồn>")
+            return
+
+        result = await asyncio.to_thread(delete_documents, source, chat_id)
+        await update.message.reply_text(result)
+
+    async def expire_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Admin: expire uploads older than N days (default DOCUMENT_TTL_SECONDS), e.g. /expire 7"""
+        if not self._is_admin(update):
+            await update.message.reply_text("Bạn không có quyền sử dụng lệnh này.")
+            return
+
+        ttl_seconds = DOCUMENT_TTL_SECONDS
+        if context.args:
+            try:
+                ttl_seconds = int(float(context.args[0]) * 24 * 3600)
+            except ValueError:
+                await update.message.reply_text("Cách dùng: /expire [số ngày]")
+                return
+
+        if ttl_seconds <= 0:
+            await update.message.reply_text("Chưa cấu hình thời hạn lưu tài liệu.")
+            return
+
+        deleted = await asyncio.to_thread(expire_documents, ttl_seconds)
+        await update.message.reply_text(f"Đã xóa {deleted} đoạn từ các tài liệu hết hạn.")
+
+    async def health_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Admin: show health and connection metrics of outbound dependencies."""
+        if not self._is_admin(update):
+            await update.message.reply_text("Bạn không có quyền sử dụng lệnh này.")
+            return
+
+        text = "Kết nối HTTP:\n"
+        metrics = http_client.get_metrics()
+        if not metrics:
+            text += "- Chưa có request nào\n"
+        for host, stats in metrics.items():
+            text += (
+                f"- {host}: {stats['requests']} request, {stats['new_connections']} kết nối mới, "
+                f"{stats['reused_connections']} tái sử dụng (tỉ lệ {stats['reuse_ratio']:.0%}), "
+                f"{stats['errors']} lỗi\n"
+            )
+
+        pool = llm_pool.get_stats()
+        text += f"\nLLM backends (hedge sau {pool['hedge_delay']}s, {pool['hedged_requests']} lần hedge, "
+        text += f"{pool['hedge_wins']} lần hedge thắng, {pool['background_requests']} request nền):\n"
+        for backend in pool['backends']:
+            p95 = f"{backend['p95']:.2f}s" if backend['p95'] is not None else "n/a"
+            text += (
+                f"- {backend['url']}: {'OK' if backend['healthy'] else 'LỖI'}, "
+                f"{backend['outstanding']} đang chạy, {backend['requests']} request, "
+                f"{backend['failures']} lỗi, p95 {p95}\n"
+            )
+
+        text += "\nCircuit breakers:\n"
+        for breaker in get_circuit_stats():
+            retry = f", thử lại sau {breaker['retry_in']}s" if breaker['retry_in'] is not None else ""
+            text += (
+                f"- {breaker['name']}: {breaker['state']}{retry}, {breaker['calls']} lần gọi, "
+                f"{breaker['failures']} lỗi, {breaker['slow_calls']} chậm, {breaker['rejected']} bị từ chối\n"
+            )
+
+        coalescing = llm_single_flight.get_stats()
+        text += (
+            f"\nLLM single-flight: {coalescing['requests']} request, {coalescing['executions']} lần gọi thực, "
+            f"gộp {coalescing['coalesced']} (tỉ lệ {coalescing['coalescing_ratio']:.1%})\n"
+        )
+
+        history_stats = self.history_token_stats
+        if history_stats["turns"]:
+            saved = history_stats["raw_tokens"] - history_stats["used_tokens"]
+            ratio = saved / history_stats["raw_tokens"] if history_stats["raw_tokens"] else 0.0
+            text += (
+                f"Lịch sử hội thoại: trung bình {history_stats['used_tokens'] / history_stats['turns']:.0f} token/lượt, "
+                f"tiết kiệm {saved} token ({ratio:.0%}) so với lịch sử gốc\n"
+            )
+
+        routing = intent_router.get_stats()
+        if routing["requests"]:
+            saved = f", tiết kiệm ~{routing['latency_saved_seconds']}s" if routing["latency_saved_seconds"] else ""
+            text += (
+                f"Fast path sản phẩm: {routing['hits']}/{routing['requests']} câu hỏi ({routing['hit_rate']:.0%}), "
+                f"trung bình {routing['avg_fast_ms']} ms so với {routing['avg_llm_ms']} ms qua LLM{saved}\n"
+            )
+
+        for pool_stats in get_pool_stats():
+            text += (
+                f"SQLite {pool_stats['db_path']}: {pool_stats['open_connections']}/{pool_stats['pool_size']} kết nối, "
+                f"{pool_stats['queries']} truy vấn, {pool_stats['retries']} lần thử lại do khóa\n"
+            )
+        cache = query_cache.get_stats()
+        if cache["hits"] or cache["misses"]:
+            text += (
+                f"Cache kết quả SQL: {cache['entries']}/{cache['max_entries']} mục, {cache['hits']} hit, "
+                f"{cache['misses']} miss (tỉ lệ {cache['hit_rate']:.0%}), {cache['stale']} mục cũ do database thay đổi\n"
+            )
+
+        prompt_eval = prompt_eval_stats.get_stats()
+        text += (
+            f"LLM prompt eval: trung bình {prompt_eval['avg_prompt_tokens']} token, "
+            f"{prompt_eval['avg_prompt_eval_seconds']}s ({prompt_eval['requests']} request)\n"
+        )
+
+        await update.message.reply_text(text)
+
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Log errors and send a message to the user."""
         logger.error(f"Exception while handling an update: {context.error}")
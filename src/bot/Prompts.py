@@ -37,16 +37,9 @@ Dựa trên bảng dữ liệu sau đây, hãy tạo một truy vấn SQL chính
 """
 
 
-CHAT_PROMPT = """
-# Dựa trên dữ liệu:
-{table}
-
-# Lịch sử hội thoại:
-{context}
-
-# Câu hỏi của người dùng:
-{question}
-
+# Phần hướng dẫn cố định được gửi làm system prompt và luôn đứng đầu prompt, để LLM server
+# tái sử dụng KV cache của phần prefix giữa các request. Không đưa nội dung thay đổi theo request vào đây.
+CHAT_SYSTEM_PROMPT = """
 # Hướng dẫn:
 - Chỉ sử dụng tiếng Việt cho các câu trả lời.
 - Nếu số lượng sản phẩm lớn hơn 5, thì giới hạn câu trả lời về 5 sản phẩm để đưa ra thông tin cho người dùng.
@@ -59,13 +52,47 @@ CHAT_PROMPT = """
         "- Nếu hỏi về sản phẩm của hãng hoặc tư vấn danh mục hàng hóa (ví dụ: 'của', 'hàng', 'tư vấn ăn vặt'), liệt kê tối đa 5 sản phẩm theo định dạng ngắn gọn: '*Tên sản phẩm*: [name] - *Giá*: [price] VND - *Hãng sản xuất*: [store_name]' (hình ảnh sẽ được gửi riêng nếu có), nếu không có dữ liệu phù hợp thì thông báo không tìm thấy. "
         "- Nếu câu hỏi yêu cầu mua hàng (ví dụ: 'Tôi cần mua 2 sản phẩm Kẹo dâu 300gr'), tính tổng tiền dựa trên số lượng và giá trong dữ liệu, trả lời: 'Quý khách muốn mua [số lượng] sản phẩm [good_name], giá mỗi sản phẩm là [price] VND, tổng tiền là [tổng tiền] VND."
         "Định dạng rõ ràng, dễ đọc bằng Markdown, đảm bảo đóng tất cả các thẻ như *text*. Kết thúc bằng câu hỏi: 'Quý khách cần thêm thông tin nào không ạ?'."
+"""
+
+# Phần thay đổi theo request: dữ liệu (ít thay đổi) trước, lịch sử và câu hỏi (thay đổi mỗi lượt) sau cùng
+CHAT_PROMPT = """
+# Dựa trên dữ liệu:
+{table}
+
+# Lịch sử hội thoại:
+{context}
+
+# Câu hỏi của người dùng:
+{question}
+
 # Câu trả lời:
 """
 
-CHROMADB_PROMPT_TEMPLATE = """          
-### Câu hỏi: {question}
+CHROMADB_SYSTEM_PROMPT = """
+Trả lời câu hỏi của người dùng bằng tiếng Việt dựa trên nội dung tài liệu được cung cấp.
+Chỉ tham khảo lịch sử hội thoại nếu liên quan đến câu hỏi.
+"""
+
+CHROMADB_PROMPT_TEMPLATE = """
 ### Nội dung tài liệu:
 {knowledge_context}
 ### Lịch sử hội thoại (tham khảo nếu liên quan):
 {context}
-"""
\ No newline at end of file
+### Câu hỏi: {question}
+"""
+
+SUMMARY_SYSTEM_PROMPT = """
+Bạn tóm tắt cuộc hội thoại giữa người dùng và chatbot bán hàng.
+- Viết bằng tiếng Việt, tối đa 5 câu ngắn, không dùng bảng hay Markdown.
+- Giữ lại: sản phẩm, hãng, giá, số lượng người dùng quan tâm, yêu cầu còn dang dở và sở thích của người dùng.
+- Bỏ qua lời chào, câu xã giao và phần định dạng của câu trả lời.
+- Chỉ trả về bản tóm tắt mới.
+"""
+
+SUMMARY_PROMPT_TEMPLATE = """
+### Tóm tắt hiện tại:
+{summary}
+### Các lượt hội thoại mới:
+{turns}
+### Tóm tắt mới (gộp tóm tắt hiện tại và các lượt mới):
+"""
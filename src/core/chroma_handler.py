@@ -1,7 +1,7 @@
-from typing import List, Tuple, Union
+from typing import List, Tuple, Union, Optional, Dict, Any
 
 from config import CHROMA_DB_PATH, USE_RERANKER
-from src.manager.Chroma_Manager import ChromaDBManager
+from src.manager.Chroma_Manager import ChromaDBManager, ProgressCallback, ORIGIN_CATALOG, ORIGIN_UPLOAD
 
 from src.utils import setup_logger
 
@@ -35,15 +35,71 @@ async def search_documents(query: str, limit: int = 5, return_scores: bool = Fal
         query, limit, return_scores, actual_threshold, use_reranker)
 
 
-async def process_pdf(pdf_path: str, file_name: str) -> str:
+async def process_pdf(pdf_path: str, file_name: str,
+                      progress_callback: Optional[ProgressCallback] = None) -> str:
     """
     Xử lý PDF và thêm vào ChromaDB
     """
-    return await db_manager.process_pdf(pdf_path, file_name)
+    return await db_manager.process_pdf(pdf_path, file_name, progress_callback=progress_callback)
 
 
-def delete_documents(source: str = None) -> str:
+async def ingest_pdf(pdf_path: str, file_name: str,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> str:
     """
-    Xóa tài liệu từ ChromaDB
+    Xử lý PDF cho hàng đợi ingest, ném exception khi lỗi để job được thử lại
     """
-    return db_manager.delete_documents(source)
\ No newline at end of file
+    total_chunks = await db_manager.ingest_pdf(pdf_path, file_name, progress_callback=progress_callback,
+                                               chat_id=chat_id, file_unique_id=file_unique_id)
+    return db_manager.format_ingest_result(file_name, total_chunks)
+
+
+async def ingest_pdf_bytes(data: Union[bytes, bytearray], file_name: str,
+                           progress_callback: Optional[ProgressCallback] = None,
+                           chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> str:
+    """
+    Xử lý PDF trực tiếp từ bộ nhớ và thêm vào ChromaDB
+    """
+    total_chunks = await db_manager.ingest_pdf_bytes(data, file_name, progress_callback=progress_callback,
+                                                     chat_id=chat_id, file_unique_id=file_unique_id)
+    return db_manager.format_ingest_result(file_name, total_chunks)
+
+
+async def ingest_file(file_path: str, file_name: str, document_type: str, origin: str = ORIGIN_CATALOG,
+                      progress_callback: Optional[ProgressCallback] = None,
+                      chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> str:
+    """
+    Xử lý file PDF/CSV/TXT bằng loader streaming và thêm vào ChromaDB
+    """
+    total_chunks = await db_manager.ingest_file(file_path, file_name, document_type, origin=origin,
+                                                progress_callback=progress_callback,
+                                                chat_id=chat_id, file_unique_id=file_unique_id)
+    return db_manager.format_ingest_result(file_name, total_chunks)
+
+
+def delete_documents(source: str = None, chat_id: Optional[int] = None) -> str:
+    """
+    Xóa tài liệu từ ChromaDB, nguồn tài liệu tải lên được xác định theo chat_id
+    """
+    return db_manager.delete_documents(source, chat_id)
+
+
+def list_sources(chat_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Liệt kê các nguồn tài liệu với số chunk và dung lượng
+    """
+    return db_manager.list_sources(chat_id)
+
+
+def has_source(source: str, chat_id: Optional[int] = None) -> bool:
+    """
+    Kiểm tra nguồn tài liệu của chat còn trong ChromaDB
+    """
+    return db_manager.has_source(source, chat_id)
+
+
+def expire_documents(ttl_seconds: int) -> int:
+    """
+    Xóa tài liệu tải lên đã hết hạn, trả về số chunk đã xóa
+    """
+    return db_manager.expire_documents(ttl_seconds)
@@ -0,0 +1,166 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_SLOW_CALL_WARN_SECONDS,
+    CIRCUIT_RECOVERY_TIMEOUT,
+    CIRCUIT_HALF_OPEN_MAX_CALLS,
+)
+from src.utils import setup_logger
+
+logger = setup_logger("src", "logs/src.log")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Tất cả breaker đã tạo, để hiển thị trong /health
+circuit_breakers: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: Optional[float] = None):
+        message = f"Circuit '{name}' is open"
+        if retry_in is not None:
+            message += f", retry in {retry_in:.0f}s"
+        super().__init__(message)
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một dependency bên ngoài.
+    closed: gọi bình thường; mở (open) sau failure_threshold lỗi liên tiếp (lời gọi chậm hơn
+    slow_call_threshold cũng tính là lỗi nếu được đặt; lời gọi chậm hơn slow_call_warn_threshold chỉ được đếm
+    vào slow_calls). open: từ chối ngay bằng CircuitOpenError trong recovery_timeout giây.
+    half_open: cho tối đa half_open_max_calls lời gọi thử, thành công thì đóng lại, lỗi thì mở lại.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 slow_call_threshold: Optional[float] = CIRCUIT_SLOW_CALL_SECONDS,
+                 slow_call_warn_threshold: Optional[float] = CIRCUIT_SLOW_CALL_WARN_SECONDS,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT,
+                 half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_warn_threshold = slow_call_warn_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._half_open_calls = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+        circuit_breakers[name] = self
+
+    def _set_state(self, state: str, reason: str = "") -> None:
+        if state == self.state:
+            return
+        message = f"Circuit '{self.name}': {self.state} -> {state}" + (f" ({reason})" if reason else "")
+        if state == STATE_OPEN:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        self.state = state
+
+    def _refresh(self) -> None:
+        # Hết thời gian chờ: chuyển sang half_open để thử lại
+        if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._half_open_calls = 0
+            self._set_state(STATE_HALF_OPEN, "recovery timeout elapsed")
+
+    def retry_in(self) -> Optional[float]:
+        if self.state != STATE_OPEN:
+            return None
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def is_available(self) -> bool:
+        """Có thể gọi dependency ngay bây giờ không (không chiếm lượt thử của half_open)"""
+        self._refresh()
+        if self.state == STATE_CLOSED:
+            return True
+        return self.state == STATE_HALF_OPEN and self._half_open_calls < self.half_open_max_calls
+
+    def before_call(self) -> None:
+        """Đăng ký một lời gọi, ném CircuitOpenError nếu circuit đang mở"""
+        if not self.is_available():
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_in())
+        if self.state == STATE_HALF_OPEN:
+            self._half_open_calls += 1
+        self.calls += 1
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        if latency is not None:
+            is_failure = bool(self.slow_call_threshold) and latency > self.slow_call_threshold
+            if is_failure or (self.slow_call_warn_threshold and latency > self.slow_call_warn_threshold):
+                self.slow_calls += 1
+            if is_failure:
+                self._on_failure(f"slow call {latency:.1f}s")
+                return
+        self.consecutive_failures = 0
+        if self.state == STATE_HALF_OPEN:
+            self._set_state(STATE_CLOSED, "probe succeeded")
+
+    def record_failure(self, reason: str = "") -> None:
+        self.failures += 1
+        self._on_failure(reason)
+
+    def _on_failure(self, reason: str) -> None:
+        self.consecutive_failures += 1
+        if self.state == STATE_HALF_OPEN or (
+                self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            self._set_state(STATE_OPEN, f"{self.consecutive_failures} consecutive failures, last: {reason}")
+
+    @asynccontextmanager
+    async def guard(self, measure_latency: bool = True) -> AsyncIterator["CircuitBreaker"]:
+        """Bọc một lời gọi: từ chối khi circuit mở, ghi nhận lỗi, độ trễ và kết quả"""
+        self.before_call()
+        start = time.monotonic()
+        try:
+            yield self
+        except Exception as e:
+            self.record_failure(str(e) or type(e).__name__)
+            raise
+        except BaseException:
+            # Lời gọi bị hủy (CancelledError, GeneratorExit khi stream bị đóng giữa chừng)
+            # không nói lên gì về dependency, trả lại lượt thử
+            if self.state == STATE_HALF_OPEN:
+                self._half_open_calls = max(0, self._half_open_calls - 1)
+            raise
+        else:
+            self.record_success(time.monotonic() - start if measure_latency else None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._refresh()
+        retry_in = self.retry_in()
+        return {
+            "name": self.name,
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "retry_in": round(retry_in, 1) if retry_in is not None else None,
+        }
+
+
+def get_circuit_stats() -> List[Dict[str, Any]]:
+    """Trạng thái của tất cả circuit breaker"""
+    return [breaker.get_stats() for breaker in circuit_breakers.values()]
@@ -1,12 +1,23 @@
 import sqlite3
 import os
+import re
+import asyncio
+import itertools
 from dotenv import load_dotenv
 import logging
+import aiohttp
 import requests
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
+from config import DB_NAME, FAST_PATH_ENABLED, QUERY_CACHE_ENABLED
+from config import QUERY_MAX_ROWS, QUERY_MAX_RESULT_CHARS, QUERY_MAX_CELL_CHARS, QUERY_FETCH_BATCH, QUERY_COUNT_LIMIT
 from src.bot.Prompts import QUERY_PROMPT_TEMPLATE
+from src.db.product_search import has_product_search, rewrite_like_to_match
+from src.db.sqlite_pool import get_pool
+from src.db.query_cache import query_cache, database_version
+from src.core.intent_router import intent_router
+from src.api.http_client import get_session
 from src.manager.Chat_History_Manager import ChatHistoryManager
 
 logger = logging.getLogger(__name__)
@@ -16,31 +27,33 @@ load_dotenv()
 API_URL = os.getenv("API_URL", "http://localhost:5000") 
 API_KEY = os.getenv("API_KEY") 
 
+# Large columns left out of the result unless the query names them explicitly (e.g. SELECT *)
+HEAVY_COLUMNS = ("good_images", "good_common")
+# Formatted result of a query that returned no rows
+NO_RESULTS = "Không có dữ liệu trả về."
+
 chat_history_manager = ChatHistoryManager()
-# call api to query model
-def rag_query(user_prompt, chat_history=None):
-    headers = {
-        'X-API-Key': API_KEY,
-        'Content-Type': 'application/json'
-    }
-    
+
+
+def _build_query_prompt(user_prompt, chat_history=None):
+    """Format the text-to-SQL prompt with the chat history (oldest first)"""
     try:
         # Log chat_history for debugging
         if chat_history:
             logger.info(f"Received chat_history with {len(chat_history)} entries")
         else:
             logger.info("No chat_history provided")
-            
-        # Format chat history for the prompt
+
+        # Format the chat history for the prompt
         context_str = ""
         if chat_history:
             # Format the chat history (oldest first)
             history_entries = list(reversed(chat_history))
             context_str = "\n".join([
-                f"User: {entry['user_question']}\nBot: {entry['bot_response']}" 
+                f"User: {entry['user_question']}\nBot: {entry['bot_response']}"
                 for entry in history_entries
             ])
-        
+
         # Format the prompt template with proper parameters
         full_prompt = QUERY_PROMPT_TEMPLATE.format(query=user_prompt, context=context_str)
         logger.info(f"Full prompt sent to API (first 200 chars): {full_prompt[:500]}...")
@@ -48,6 +61,32 @@ def rag_query(user_prompt, chat_history=None):
         logger.error(f"Error in rag_query preprocessing: {str(e)}")
         context_str = ""
         full_prompt = QUERY_PROMPT_TEMPLATE.format(query=user_prompt, context=context_str)
+    return full_prompt
+
+
+def _parse_query_response(result):
+    """Extract the SQL query from a successful API response"""
+    logger.info(f"API response: {result}")
+    if result.get('success'):
+        sql_query = extract_sql_query(result['response'])
+        if sql_query:
+            logger.info(f"Generated SQL Query: {sql_query}")
+            return sql_query
+        else:
+            logger.error("No SQL query extracted from the response.")
+            return None
+    else:
+        logger.error(f"API error: {result.get('error')}")
+        return None
+
+
+# call api to query model
+def rag_query(user_prompt, chat_history=None):
+    headers = {
+        'X-API-Key': API_KEY,
+        'Content-Type': 'application/json'
+    }
+    full_prompt = _build_query_prompt(user_prompt, chat_history)
 
     try:
         response = requests.post(
@@ -56,40 +95,73 @@ def rag_query(user_prompt, chat_history=None):
             json={'prompt': full_prompt},
             timeout=10
         )
-        
+
         if response.status_code == 200:
-            result = response.json()
-            logger.info(f"API response: {result}")
-            if result.get('success'):
-                sql_query = extract_sql_query(result['response'])
-                if sql_query:
-                    logger.info(f"Generated SQL Query: {sql_query}")
-                    return sql_query
-                else:
-                    logger.error("No SQL query extracted from the response.")
-                    return None
-            else:
-                logger.error(f"API error: {result.get('error')}")
-                return None
+            return _parse_query_response(response.json())
         else:
             logger.error(f"API request failed with status code: {response.status_code}")
             return None
-            
+
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error: {e}")
         return None
 
+
+async def rag_query_async(user_prompt, chat_history=None):
+    """Async version of rag_query using the shared aiohttp session"""
+    headers = {
+        'X-API-Key': API_KEY or "",
+        'Content-Type': 'application/json'
+    }
+    full_prompt = _build_query_prompt(user_prompt, chat_history)
+
+    try:
+        async with get_session().post(
+                f"{API_URL}/api/generate",
+                headers=headers,
+                json={'prompt': full_prompt},
+                timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status == 200:
+                return _parse_query_response(await response.json())
+            logger.error(f"API request failed with status code: {response.status}")
+            return None
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Request error: {e}")
+        return None
+
+
+# Keywords are matched on word boundaries (like intent_router), so "gr" in "telegram" or "giá" in "giáo" do not count
+PRICE_KEYWORDS = re.compile(r"(?<!\w)(?:giá|bao nhiêu tiền|cost|price)(?!\w)")
+PRODUCT_KEYWORDS = re.compile(
+    r"(?<!\w)(?:sản phẩm|mua|hãng|tư vấn|có bán|loại nào|danh mục|đặc sản|"
+    r"ăn vặt|đồ uống|hải sản|gia vị|thực phẩm|products?)(?!\w)"
+)
+# Units only mark a product question when they follow a number ("mít sấy 200gr", "1 kg")
+QUANTITY = re.compile(r"\d+(?:[.,]\d+)?\s*(?:gr|g|kg|ml|lít|l)(?!\w)")
+
+
 def is_price_query(query):
     """Check if the query is asking about price"""
-    price_keywords = ['giá', 'bao nhiêu tiền', 'giá cả', 'giá bao nhiêu', 'giá tiền', 'cost', 'price']
-    query_lower = query.lower()
-    is_price = any(keyword in query_lower for keyword in price_keywords)
+    is_price = PRICE_KEYWORDS.search(query.lower()) is not None
     
     if is_price:
         logger.info(f"Query '{query}' identified as a price query")
     
     return is_price
 
+
+def is_product_query(query):
+    """Check if the query is about the product catalog (price, product info, brand, category, purchase)"""
+    query_lower = query.lower()
+    is_product = (is_price_query(query) or PRODUCT_KEYWORDS.search(query_lower) is not None
+                  or QUANTITY.search(query_lower) is not None)
+
+    if is_product:
+        logger.info(f"Query '{query}' identified as a product query")
+
+    return is_product
+
 # def extract_product_from_history(chat_history):
 #     """Extract product name from chat history"""
 #     if not chat_history:
@@ -147,6 +219,28 @@ def is_price_query(query):
     
 #     return None
 
+# String literals, quoted identifiers and comments, removed before looking for write keywords
+_SQL_QUOTED_OR_COMMENT = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|--[^\n]*|/\*.*?\*/""", re.DOTALL)
+# Statements that modify the database; REPLACE only as "REPLACE INTO" since replace() is a string function
+_SQL_WRITE_KEYWORDS = re.compile(
+    r"\b(?:insert|update|delete|replace\s+into|create|drop|alter|attach|detach|pragma|vacuum|reindex|analyze)\b",
+    re.IGNORECASE
+)
+
+
+def is_read_only_query(sql):
+    """
+    True if sql is a single SELECT/WITH statement without DML/DDL keywords outside literals,
+    so e.g. "WITH x AS (...) DELETE FROM products" is rejected
+    """
+    code = _SQL_QUOTED_OR_COMMENT.sub(" ", sql).strip().rstrip(";").strip()
+    if not code.lower().startswith(("select", "with")):
+        return False
+    if ";" in code:
+        return False
+    return _SQL_WRITE_KEYWORDS.search(code) is None
+
+
 def extract_sql_query(response_text):
     if "```sql" in response_text:
         sql = response_text.split("```sql")[1].split("```")[0].strip()
@@ -156,6 +250,49 @@ def extract_sql_query(response_text):
     return sql
 
 
+def _run_query(DB_NAME, query, params=()):
+    """
+    Run the query once on this thread's pooled read-only connection and format the rows;
+    sqlite3 errors propagate to the caller
+    """
+    conn = get_pool(DB_NAME).connection()
+    cursor = conn.cursor()
+    try:
+        # LIKE '%...%' trên tên sản phẩm/hãng/danh mục quét toàn bảng và phân biệt dấu,
+        # dùng chỉ mục FTS5 nếu database đã có
+        rewritten, rewrites = rewrite_like_to_match(query) if has_product_search(conn) else (query, 0)
+        if rewrites:
+            logger.info(f"Rewrote {rewrites} LIKE predicates to FTS MATCH: {rewritten}")
+            try:
+                cursor.execute(rewritten, params)
+                result = format_cursor_results(cursor, query)
+                if result != NO_RESULTS:
+                    return result
+                # MATCH không tìm được chuỗi con giữa từ ('%am%' trong "cam"), chạy lại LIKE gốc
+                logger.info("FTS rewrite returned no rows, running the original query")
+            except sqlite3.OperationalError as e:
+                if "database is locked" in str(e):
+                    raise
+                logger.warning(f"FTS rewrite failed ({e}), running the original query")
+
+        cursor.execute(query, params)
+        return format_cursor_results(cursor, query)
+    finally:
+        cursor.close()
+
+
+def _cache_lookup(DB_NAME, query, params):
+    """
+    Look the query up in the result cache.
+    Returns (key, version, cached table); key is None when caching is disabled.
+    """
+    if not QUERY_CACHE_ENABLED:
+        return None, None, None
+    key = query_cache.make_key(DB_NAME, query, params)
+    version = database_version(DB_NAME)
+    return key, version, query_cache.get(key, version)
+
+
 def execute_query(DB_NAME, query):
     """
     Execute the SQL query on the database.
@@ -171,37 +308,79 @@ def execute_query(DB_NAME, query):
     
     for attempt in range(attempts):
         try:
-            if not os.path.exists(DB_NAME):
-                raise FileNotFoundError(f"Database file not found: {DB_NAME}")
-            
-            conn = sqlite3.connect(DB_NAME, timeout=5)
-            conn.execute("PRAGMA journal_mode=WAL;")
-            cursor = conn.cursor()
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            if not results:
-                return "Không có dữ liệu trả về."
-            
-            # Get column names from cursor description
-            columns = [column[0] for column in cursor.description]
-            
-            return format_markdown_table(columns, results)
+            key, version, cached = _cache_lookup(DB_NAME, query, ())
+            if cached is not None:
+                return cached
+            result = _run_query(DB_NAME, query)
+            if key is not None:
+                query_cache.put(key, version, result)
+            return result
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e) and attempt < attempts - 1:
                 time.sleep(2)
                 continue
             logger.error(f"Database error: {e}")
             return f"Lỗi thực thi truy vấn: {e}"
-        except sqlite3.Error as e:
+        except (sqlite3.Error, FileNotFoundError) as e:
             logger.error(f"Database error: {e}")    
             return f"Lỗi thực thi truy vấn: {e}"
-        finally:
-            if 'conn' in locals():
-                conn.close()        
     
     return "Không thể truy cập cơ sở dữ liệu sau nhiều lần thử."
+
+
+async def execute_query_async(DB_NAME, query, params=()) -> Optional[str]:
+    """
+    Async version of execute_query: cached results are returned directly, otherwise the query runs on the
+    database's read-only connection pool and lock retries back off without blocking the event loop.
+    Returns None on error so callers can drop the result.
+    """
+    try:
+        # The version is read before the query runs, so a write committed meanwhile invalidates the entry
+        key, version, cached = _cache_lookup(DB_NAME, query, params)
+        if cached is not None:
+            return cached
+        result = await get_pool(DB_NAME).run_with_retry(_run_query, DB_NAME, query, params)
+        if key is not None:
+            query_cache.put(key, version, result)
+        return result
+    except (sqlite3.Error, FileNotFoundError) as e:
+        logger.error(f"Database error: {e}")
+        return None
+
+
+async def answer_product_query(query_text: str, chat_history: Optional[List[Dict[str, Any]]] = None,
+                               db_name: str = DB_NAME) -> str:
+    """
+    Product catalog QA: common questions are answered by the intent router's SQL templates,
+    the rest by text-to-SQL, then the query runs on the product database.
+    Returns the result as a markdown table, or "" when nothing usable was found.
+    """
+    start_time = time.perf_counter()
+    if FAST_PATH_ENABLED and db_name == intent_router.db_name:
+        routed = await get_pool(db_name).run(intent_router.route, query_text)
+        if routed:
+            table = await execute_query_async(db_name, routed["sql"], routed["params"])
+            if table and table != NO_RESULTS:
+                intent_router.record_fast_path(routed["intent"], time.perf_counter() - start_time)
+                return table
+            intent_router.record_empty()
+
+    sql_query = await rag_query_async(query_text, chat_history)
+    if not sql_query:
+        return ""
+
+    # Chỉ chạy truy vấn đọc dữ liệu do model sinh ra
+    if not is_read_only_query(sql_query):
+        logger.warning(f"Refusing to run non-SELECT query: {sql_query[:200]}")
+        return ""
+
+    table = await execute_query_async(db_name, sql_query)
+    intent_router.record_llm_path(time.perf_counter() - start_time)
+    if not table or table == NO_RESULTS:
+        return ""
+    return table
+
+
 # This function should be added to your RAG/core_shop.py file
 
 def extract_product_from_history(chat_id: int, query_text: str, db_path: str = "database/chat_history.db") -> Optional[Dict[str, Any]]:
@@ -368,28 +547,86 @@ def extract_product_info_from_text(text: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+def _format_value(value, max_chars=None):
+    if isinstance(value, bytes):
+        return "<BLOB>"
+    if value is None:
+        return "NULL"
+    text = str(value)
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "..."
+    return text
+
+
+def _table_header(columns):
+    header = "| " + " | ".join(columns) + " |"
+    separator = "|-" + "-|-".join(["-" * len(col) for col in columns]) + "-|"
+    return header, separator
+
+
 def format_markdown_table(columns, results):
     if not columns or not results:
-        return "Không có dữ liệu trả về."
+        return NO_RESULTS
     
-    header = "| " + " | ".join(columns) + " |"
-    separator = "|-" + "-|-".join(["-" * len(col) for col in columns]) + "-|"
+    header, separator = _table_header(columns)
     
     rows = []
     for row in results:
-        formatted_row = []
-        for value in row:
-            if isinstance(value, bytes):
-                formatted_value = "<BLOB>"
-            elif value is None:
-                formatted_value = "NULL"
-            else:
-                formatted_value = str(value)
-            formatted_row.append(formatted_value)
+        formatted_row = [_format_value(value) for value in row]
         rows.append("| " + " | ".join(formatted_row) + " |")
     
     return "\n".join([header, separator] + rows)
 
+
+def _iter_rows(cursor, batch_size=QUERY_FETCH_BATCH):
+    """Stream rows from the cursor with fetchmany so the full result set is never held in memory"""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def format_cursor_results(cursor, query, max_rows=QUERY_MAX_ROWS, max_chars=QUERY_MAX_RESULT_CHARS):
+    """
+    Format the rows of an executed query as a markdown table of at most max_rows rows and about
+    max_chars characters. Long cells are shortened, heavy columns the query did not name are dropped,
+    and rows beyond the limits are only counted (up to QUERY_COUNT_LIMIT) for a "N more rows" note.
+    """
+    columns = [column[0] for column in cursor.description]
+    keep = [
+        i for i, column in enumerate(columns)
+        if column.lower() not in HEAVY_COLUMNS or re.search(rf"\b{re.escape(column)}\b", query, re.IGNORECASE)
+    ] or list(range(len(columns)))
+    dropped = [columns[i] for i in range(len(columns)) if i not in keep]
+
+    header, separator = _table_header([columns[i] for i in keep])
+    lines = [header, separator]
+    size = len(header) + len(separator) + 1
+    shown = 0
+    more = 0
+
+    rows = _iter_rows(cursor)
+    for row in rows:
+        line = "| " + " | ".join(_format_value(row[i], QUERY_MAX_CELL_CHARS) for i in keep) + " |"
+        if shown >= max_rows or (shown and size + len(line) + 1 > max_chars):
+            more = 1 + sum(1 for _ in itertools.islice(rows, QUERY_COUNT_LIMIT))
+            break
+        lines.append(line)
+        size += len(line) + 1
+        shown += 1
+
+    if not shown:
+        return NO_RESULTS
+
+    if more:
+        count = f"hơn {QUERY_COUNT_LIMIT}" if more > QUERY_COUNT_LIMIT else str(more)
+        lines.append(f"\n... còn {count} dòng khác không hiển thị.")
+        logger.info(f"Query result truncated to {shown} rows, {count} more rows not shown")
+    if dropped:
+        lines.append(f"(Đã bỏ các cột: {', '.join(dropped)})")
+    return "\n".join(lines)
+
 def display_results(columns, results):
     if not columns or not results:
         print("Không có kết quả")
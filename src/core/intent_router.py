@@ -0,0 +1,268 @@
+import re
+import time
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import DB_NAME, FAST_PATH_MIN_CONFIDENCE, FAST_PATH_MAX_MATCHES, FAST_PATH_VOCAB_TTL
+from src.db.product_search import PRODUCT_SEARCH_TABLE, fold_accents, has_product_search
+from src.db.sqlite_pool import get_pool
+from src.utils import setup_logger
+
+logger = setup_logger("src", "logs/src.log")
+
+INTENT_PRICE = "price"
+INTENT_INFO = "info"
+INTENT_BRAND = "brand"
+INTENT_CATEGORY = "category"
+
+# Số sản phẩm tối đa trả về cho truy vấn theo hãng hoặc danh mục
+LIST_LIMIT = 20
+# Số ứng viên lấy ra để chấm điểm khi tìm sản phẩm theo tên
+CANDIDATE_LIMIT = 50
+
+_PRODUCTS_JOIN = "FROM products JOIN goods_name ON [products].[good_id] = [goods_name].[id]"
+
+# Cùng các cột mà QUERY_PROMPT_TEMPLATE yêu cầu cho từng loại câu hỏi
+_SQL_TEMPLATES = {
+    INTENT_PRICE: (
+        f"SELECT [products].[good_name], [products].[price] {_PRODUCTS_JOIN} "
+        "WHERE [products].rowid IN ({placeholders})"
+    ),
+    INTENT_INFO: (
+        "SELECT [products].[good_name], [products].[good_common], [products].[good_images], "
+        f"[products].[store_name], [products].[price] {_PRODUCTS_JOIN} "
+        "WHERE [products].rowid IN ({placeholders})"
+    ),
+    INTENT_BRAND: (
+        "SELECT [products].[id], [products].[category1], [products].[category2], [products].[category3], "
+        "[products].[store_id], [products].[store_name], [products].[area], [products].[good_id], "
+        "[products].[good_name], [products].[good_common], [products].[good_images], [products].[price], "
+        f"[goods_name].[name] {_PRODUCTS_JOIN} "
+        f"WHERE [products].[store_name] = ? LIMIT {LIST_LIMIT}"
+    ),
+    INTENT_CATEGORY: (
+        "SELECT [products].[good_name], [products].[good_images], [products].[store_name], [products].[price] "
+        f"{_PRODUCTS_JOIN} WHERE [products].[category2] IN ({{placeholders}}) LIMIT {LIST_LIMIT}"
+    ),
+}
+
+PRICE_PHRASES = ["giá bao nhiêu", "bao nhiêu tiền", "giá cả", "giá tiền", "giá", "cost", "price",
+                 "mua", "đặt hàng"]
+INFO_PHRASES = ["thông tin", "chi tiết", "là thế nào", "là gì", "mô tả", "giới thiệu"]
+# Từ không mang nghĩa tên sản phẩm, so khớp trên chữ còn dấu để không nhầm "cả" với "cá"
+STOPWORDS = {
+    "của", "cho", "tôi", "mình", "em", "anh", "chị", "về", "nào", "này", "đó", "vậy", "ạ", "à", "nhé", "ơi",
+    "shop", "bạn", "có", "không", "ko", "muốn", "cần", "biết", "hỏi", "xin", "hãng", "là", "bao", "nhiêu",
+    "sản", "phẩm", "loại", "cái", "một", "vài", "được", "với", "và", "thì", "sao", "gì", "the", "of",
+}
+# Ánh xạ từ khóa sang danh mục [category2], giống QUERY_PROMPT_TEMPLATE
+CATEGORY_ALIASES = {
+    "ăn vặt": ["Đồ ăn vặt"],
+    "ngọt ngọt": ["Đồ ăn vặt"],
+    "hải sản": ["Thủy sản đông lạnh", "Thủy sản tươi sống", "Thủy sản khô"],
+    "gia dụng": ["Trang trí nhà cửa", "Đồ Thờ cúng"],
+}
+
+
+def _contains_phrase(text: str, phrase: str) -> bool:
+    return re.search(rf"(?<!\w){re.escape(phrase)}(?!\w)", text) is not None
+
+
+def _remove_phrases(text: str, phrases: List[str]) -> str:
+    for phrase in sorted(phrases, key=len, reverse=True):
+        text = re.sub(rf"(?<!\w){re.escape(phrase)}(?!\w)", " ", text)
+    return text
+
+
+class IntentRouter:
+    """
+    Trả lời các câu hỏi catalog phổ biến (giá của X, thông tin về X, sản phẩm của hãng Y, tư vấn danh mục)
+    bằng truy vấn SQL có sẵn thay vì nhờ LLM sinh SQL. Tên sản phẩm được so khớp với catalog
+    (chỉ mục FTS5 nếu có); khi không đủ chắc chắn, route() trả về None để dùng text-to-SQL như cũ.
+    """
+
+    def __init__(self, db_name: str = DB_NAME, min_confidence: float = FAST_PATH_MIN_CONFIDENCE,
+                 max_matches: int = FAST_PATH_MAX_MATCHES, vocabulary_ttl: float = FAST_PATH_VOCAB_TTL):
+        self.db_name = db_name
+        self.min_confidence = min_confidence
+        self.max_matches = max_matches
+        self.vocabulary_ttl = vocabulary_ttl
+
+        self._stores: List[Tuple[str, str]] = []
+        self._categories: List[Tuple[str, str]] = []
+        self._vocabulary_loaded_at = 0.0
+
+        self.requests = 0
+        self.hits: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {}
+        self.fast_seconds = 0.0
+        self.llm_requests = 0
+        self.llm_seconds = 0.0
+
+    def _load_vocabulary(self, conn: sqlite3.Connection) -> None:
+        """Tên hãng và danh mục trong catalog (đã bỏ dấu), được nạp lại sau vocabulary_ttl giây"""
+        if self._stores and time.monotonic() - self._vocabulary_loaded_at < self.vocabulary_ttl:
+            return
+        stores = conn.execute("SELECT DISTINCT store_name FROM products WHERE store_name <> ''").fetchall()
+        categories = conn.execute("SELECT DISTINCT category2 FROM products WHERE category2 <> ''").fetchall()
+        # Tên dài trước để "Đà Lạt Farm" được chọn thay vì "Đà Lạt"
+        self._stores = sorted(((fold_accents(s), s) for (s,) in stores if s), key=lambda x: -len(x[0]))
+        self._categories = sorted(((fold_accents(c), c) for (c,) in categories if c), key=lambda x: -len(x[0]))
+        self._vocabulary_loaded_at = time.monotonic()
+
+    @staticmethod
+    def _find(folded_query: str, vocabulary: List[Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+        for folded, original in vocabulary:
+            if _contains_phrase(folded_query, folded):
+                return folded, original
+        return None
+
+    def _match_categories(self, text: str, folded_query: str) -> List[str]:
+        for alias, categories in CATEGORY_ALIASES.items():
+            if _contains_phrase(text, alias):
+                return categories
+        category = self._find(folded_query, self._categories)
+        return [category[1]] if category else []
+
+    @staticmethod
+    def _product_terms(text: str, store: Optional[str]) -> List[Tuple[str, str]]:
+        """Các từ còn lại sau khi bỏ cụm từ chỉ ý định, từ dừng và tên hãng: [(từ gốc, từ bỏ dấu)]"""
+        text = _remove_phrases(text, PRICE_PHRASES + INFO_PHRASES)
+        # Số đứng riêng là số lượng ("mua 2 hộp"), không phải tên sản phẩm
+        terms = [(word, fold_accents(word)) for word in re.findall(r"\w+", text)
+                 if word not in STOPWORDS and not word.isdigit()]
+        if store:
+            store_words = store.split()
+            terms = [term for term in terms if term[1] not in store_words]
+        return terms
+
+    def _candidates(self, conn: sqlite3.Connection, terms: List[Tuple[str, str]],
+                    store: Optional[str]) -> List[Tuple[int, str]]:
+        """Sản phẩm có thể khớp: [(rowid, tên)]"""
+        store_filter = " AND p.store_name = ?" if store else ""
+        store_params = (store,) if store else ()
+        if has_product_search(conn):
+            expression = "name : (" + " OR ".join(f'"{folded}"' for _, folded in terms) + ")"
+            return conn.execute(
+                f"SELECT {PRODUCT_SEARCH_TABLE}.rowid, {PRODUCT_SEARCH_TABLE}.name FROM {PRODUCT_SEARCH_TABLE} "
+                f"JOIN products p ON p.rowid = {PRODUCT_SEARCH_TABLE}.rowid "
+                f"WHERE {PRODUCT_SEARCH_TABLE} MATCH ?{store_filter} "
+                f"ORDER BY bm25({PRODUCT_SEARCH_TABLE}) LIMIT {CANDIDATE_LIMIT}",
+                (expression, *store_params)
+            ).fetchall()
+
+        # Không có chỉ mục: lọc theo từ dài nhất (LIKE phân biệt dấu) rồi chấm điểm trong Python
+        longest = max(terms, key=lambda term: len(term[0]))[0]
+        return conn.execute(
+            "SELECT p.rowid, coalesce(g.name, p.good_name) FROM products p "
+            "LEFT JOIN goods_name g ON g.id = p.good_id "
+            f"WHERE coalesce(g.name, p.good_name) LIKE ?{store_filter} LIMIT {CANDIDATE_LIMIT * 4}",
+            (f"%{longest}%", *store_params)
+        ).fetchall()
+
+    def _match_products(self, conn: sqlite3.Connection, terms: List[Tuple[str, str]],
+                        store: Optional[str]) -> Tuple[List[int], float]:
+        """
+        Chấm điểm ứng viên theo tỉ lệ từ trong câu hỏi có trong tên sản phẩm (độ tin cậy),
+        hòa điểm thì ưu tiên tên ngắn hơn. Trả về (rowid của các sản phẩm điểm cao nhất, độ tin cậy).
+        """
+        query_words = {folded for _, folded in terms}
+
+        scored = []
+        for rowid, name in self._candidates(conn, terms, store):
+            name_words = set(re.findall(r"\w+", fold_accents(name or "")))
+            matched = len(query_words & name_words)
+            if matched:
+                scored.append(((matched / len(query_words), matched / len(name_words)), rowid))
+        if not scored:
+            return [], 0.0
+
+        best = max(score for score, _ in scored)
+        rowids = [rowid for score, rowid in scored if score == best]
+        if len(rowids) > self.max_matches:
+            # Quá nhiều sản phẩm khớp như nhau (ví dụ chỉ hỏi "giá kẹo"), để LLM dùng ngữ cảnh hội thoại
+            return [], 0.0
+        return rowids, best[0]
+
+    def route(self, query_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Xác định ý định và tạo truy vấn có tham số.
+        Trả về dict gồm intent, sql, params, confidence; None nếu nên dùng text-to-SQL.
+        """
+        self.requests += 1
+        text = query_text.lower()
+        folded_query = fold_accents(query_text)
+
+        try:
+            conn = get_pool(self.db_name).connection()
+            self._load_vocabulary(conn)
+            store = self._find(folded_query, self._stores)
+            store_folded, store_name = store if store else (None, None)
+
+            asks_price = any(_contains_phrase(text, phrase) for phrase in PRICE_PHRASES)
+            asks_info = any(_contains_phrase(text, phrase) for phrase in INFO_PHRASES)
+            if asks_price or asks_info:
+                intent = INTENT_INFO if asks_info else INTENT_PRICE
+                terms = self._product_terms(text, store_folded)
+                rowids, confidence = self._match_products(conn, terms, store_name) if terms else ([], 0.0)
+                if confidence < self.min_confidence:
+                    return self._fallback("low_confidence", query_text, confidence)
+                routed = {"intent": intent, "params": rowids, "confidence": confidence}
+            else:
+                categories = self._match_categories(text, folded_query)
+                if categories:
+                    routed = {"intent": INTENT_CATEGORY, "params": categories, "confidence": 1.0}
+                elif store_name:
+                    routed = {"intent": INTENT_BRAND, "params": [store_name], "confidence": 1.0}
+                else:
+                    return self._fallback("no_intent", query_text)
+        except (sqlite3.Error, FileNotFoundError) as e:
+            logger.warning(f"Intent routing failed, using text-to-SQL: {str(e)}")
+            return self._fallback("error", query_text)
+
+        routed["sql"] = _SQL_TEMPLATES[routed["intent"]].format(
+            placeholders=", ".join("?" * len(routed["params"]))
+        )
+        logger.info(f"Fast path '{routed['intent']}' for '{query_text}' "
+                    f"(confidence {routed['confidence']:.2f}, params {routed['params']})")
+        return routed
+
+    def _fallback(self, reason: str, query_text: str, confidence: float = 0.0) -> None:
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+        logger.info(f"No fast path for '{query_text}' ({reason}, confidence {confidence:.2f})")
+        return None
+
+    def record_fast_path(self, intent: str, seconds: float) -> None:
+        """Câu hỏi đã được trả lời bằng fast path trong seconds giây"""
+        self.hits[intent] = self.hits.get(intent, 0) + 1
+        self.fast_seconds += seconds
+
+    def record_empty(self) -> None:
+        """Fast path không trả về dòng nào, câu hỏi được chuyển sang text-to-SQL"""
+        self.fallbacks["empty_result"] = self.fallbacks.get("empty_result", 0) + 1
+
+    def record_llm_path(self, seconds: float) -> None:
+        """Câu hỏi được trả lời bằng text-to-SQL trong seconds giây"""
+        self.llm_requests += 1
+        self.llm_seconds += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        avg_fast = self.fast_seconds / hits if hits else None
+        avg_llm = self.llm_seconds / self.llm_requests if self.llm_requests else None
+        # Ước lượng: mỗi lần fast path tiết kiệm độ trễ trung bình của text-to-SQL trừ độ trễ của fast path
+        saved = (avg_llm - avg_fast) * hits if avg_fast is not None and avg_llm is not None else None
+        return {
+            "requests": self.requests,
+            "hits": hits,
+            "hit_rate": hits / self.requests if self.requests else 0.0,
+            "hits_by_intent": dict(self.hits),
+            "fallbacks": dict(self.fallbacks),
+            "avg_fast_ms": round(avg_fast * 1000, 1) if avg_fast is not None else None,
+            "avg_llm_ms": round(avg_llm * 1000, 1) if avg_llm is not None else None,
+            "latency_saved_seconds": round(saved, 1) if saved is not None else None,
+        }
+
+
+# Router dùng chung cho answer_product_query
+intent_router = IntentRouter()
@@ -1,8 +1,143 @@
+import json
 import aiohttp
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from config import LLM_URL, CHATBOT_MODEL, CHATBOT_TEMPERATURE, CHATBOT_MAX_TOKENS
+from config import CHATBOT_MODEL, CHATBOT_TEMPERATURE, CHATBOT_MAX_TOKENS, LLM_CONTEXT_TOKENS
+from config import CHAT_SUMMARY_MAX_TOKENS, LLM_REQUEST_TIMEOUT
 from src.utils import logger
-from src.core.Prompts import CHAT_PROMPT, CHROMADB_PROMPT_TEMPLATE
+from src.api.http_client import get_session
+from src.core.llm_pool import llm_pool, LLMBackend
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.single_flight import SingleFlight, make_key
+from src.core.prompt_budget import prompt_budget, split_documents, split_history, truncate_to_tokens
+from src.bot.Prompts import CHAT_SYSTEM_PROMPT, CHAT_PROMPT, CHROMADB_SYSTEM_PROMPT, CHROMADB_PROMPT_TEMPLATE
+from src.bot.Prompts import SUMMARY_SYSTEM_PROMPT, SUMMARY_PROMPT_TEMPLATE
+
+
+# Trả lời ngay khi tất cả LLM backend đang mở circuit
+DEGRADED_MESSAGE = "Xin lỗi, dịch vụ AI đang tạm thời gián đoạn. Vui lòng thử lại sau ít phút."
+
+# Gộp các prompt giống hệt nhau đang được xử lý đồng thời
+llm_single_flight = SingleFlight("llm")
+
+
+class PromptEvalStats:
+    """
+    Thống kê thời gian xử lý prompt (prompt_eval_count / prompt_eval_duration) do Ollama trả về,
+    dùng để đo hiệu quả tái sử dụng KV cache của phần system prompt cố định
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.prompt_eval_seconds = 0.0
+
+    def record(self, result: Dict[str, Any]) -> None:
+        if "prompt_eval_duration" not in result:
+            return
+        tokens = result.get("prompt_eval_count", 0)
+        seconds = result["prompt_eval_duration"] / 1e9  # nanoseconds
+        self.requests += 1
+        self.prompt_tokens += tokens
+        self.prompt_eval_seconds += seconds
+        logger.info(f"LLM prompt eval: {tokens} tokens in {seconds:.3f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else 0.0,
+            "avg_prompt_eval_seconds": round(self.prompt_eval_seconds / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+prompt_eval_stats = PromptEvalStats()
+
+
+def _build_prompt(
+        question: str,
+        context: str = "",
+        db_data: str = "",
+        chroma_data: str = "",
+        prompt_template: str = "default",
+        summary: str = ""
+) -> Tuple[str, str]:
+    """
+    Build the LLM prompt from the knowledge sources, the rolling chat summary and chat history.
+    Returns (system, prompt): the static system block first, then documents, history and question,
+    so that consecutive requests share the longest possible prompt prefix.
+    The summary is kept as its own section ahead of the history turns, it is never dropped as an old turn.
+    """
+    if prompt_template == "chromadb_based":
+        system_prompt, template = CHROMADB_SYSTEM_PROMPT, CHROMADB_PROMPT_TEMPLATE
+    else:
+        system_prompt, template = CHAT_SYSTEM_PROMPT, CHAT_PROMPT
+
+    # Dữ liệu SQL đứng trước, sau đó là các tài liệu theo thứ tự rank
+    documents = []
+    if db_data:
+        documents.append(f"Thông tin từ cơ sở dữ liệu:\n{db_data}")
+    chroma_documents = split_documents(chroma_data) if chroma_data else []
+    if chroma_documents:
+        chroma_documents[0] = f"Thông tin từ tài liệu:\n{chroma_documents[0]}"
+    documents.extend(chroma_documents)
+
+    # Chia ngân sách token giữa hướng dẫn, tài liệu, lịch sử và câu hỏi
+    allocation = prompt_budget.allocate(
+        system_prompt,
+        template.format(question="", knowledge_context="", context="", table=""),
+        question,
+        documents,
+        split_history(context) if context else [],
+        summary
+    )
+    knowledge_context = "\n\n".join(document.strip() for document in allocation["documents"])
+    context = "\n".join(turn.strip() for turn in allocation["history"])
+    if allocation["summary"]:
+        context = f"Tóm tắt hội thoại trước đó:\n{allocation['summary'].strip()}\n" + context
+    question = allocation["question"]
+
+    # Log ngắn gọn hơn
+    if knowledge_context:
+        logger.info(f"Knowledge context length: {len(knowledge_context)} chars")
+        logger.debug(f"Knowledge context: {knowledge_context}")
+    # Chuẩn bị prompt dựa trên template được chọn
+    if prompt_template == "chromadb_based":
+        return system_prompt, template.format(
+            question=question,
+            knowledge_context=knowledge_context,
+            context=context
+        )
+
+    # Sử dụng prompt mặc định
+    return system_prompt, template.format(
+        context=context,
+        question=question,
+        table=knowledge_context
+    )
+
+
+def _build_payload(system: str, prompt: str, stream: bool,
+                   temperature: float = CHATBOT_TEMPERATURE, max_tokens: int = CHATBOT_MAX_TOKENS) -> dict:
+    return {
+        "model": CHATBOT_MODEL,
+        # Ollama đặt system prompt ở đầu template nên phần prefix cố định được cache giữa các request
+        "system": system,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {
+            "temperature": temperature,
+            "num_predict": max_tokens,
+            "num_ctx": LLM_CONTEXT_TOKENS,
+        }
+    }
+
+
+class LLMResponseError(Exception):
+    """Raised when an LLM backend answers with a non-200 status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"LLM API error {status}: {message}")
+        self.status = status
 
 
 async def generate_answer(
@@ -10,77 +145,32 @@ async def generate_answer(
         context: str = "",
         db_data: str = "",
         chroma_data: str = "",
-        prompt_template: str = "default"
+        prompt_template: str = "default",
+        summary: str = ""
 ) -> str:
     """
     Generate answer using LLM API
     """
     try:
-        # Kết hợp nguồn dữ liệu cho context
-        knowledge_parts = []
-        if db_data:
-            knowledge_parts.append(f"Thông tin từ cơ sở dữ liệu:\n{db_data}")
-
-        if chroma_data:
-            knowledge_parts.append(f"Thông tin từ tài liệu:\n{chroma_data}")
-
-        knowledge_context = "\n\n".join(knowledge_parts)
-
-        # Log ngắn gọn hơn
-        if knowledge_context:
-            logger.info(f"Knowledge context length: {len(knowledge_context)} chars")
-            logger.debug(f"Knowledge context: {knowledge_context}")
-        # Chuẩn bị prompt dựa trên template được chọn
-        if prompt_template == "chromadb_based":
-            formatted_prompt = CHROMADB_PROMPT_TEMPLATE.format(
-                question=question,
-                knowledge_context=knowledge_context,
-                context=context
-            )
-        else:
-            # Sử dụng prompt mặc định
-            formatted_prompt = CHAT_PROMPT.format(
-                context=context,
-                question=question,
-                table=knowledge_context
-            )
+        system_prompt, formatted_prompt = _build_prompt(question, context, db_data, chroma_data, prompt_template,
+                                                        summary)
 
         # Chuẩn bị payload cho LLM API
-        payload = {
-            "model": CHATBOT_MODEL,
-            "prompt": formatted_prompt,
-            "stream": False,
-            "options": {
-                "temperature": CHATBOT_TEMPERATURE,
-                "num_predict": CHATBOT_MAX_TOKENS,
-            }
-        }
+        payload = _build_payload(system_prompt, formatted_prompt, stream=False)
 
-        # Xác định API endpoint
-        base_url = LLM_URL.rstrip('/')
-        api_url = f"{base_url}/api/generate"
-        if base_url.endswith('/v1'):
-            api_url = f"{base_url[:-3]}/api/generate"  # Loại bỏ '/v1' và thêm path
-
-        logger.info(f"Calling LLM API at {api_url}")
-
-        # Gọi LLM API với timeout hợp lý
-        async with aiohttp.ClientSession() as session:
-            async with session.post(api_url, json=payload, timeout=30) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    answer = result.get("response")
-                    if answer:
-                        return answer
-                    else:
-                        logger.error(f"Unexpected response structure: {result}")
-                        return "Xin lỗi, tôi không thể xử lý câu trả lời từ hệ thống AI."
-                else:
-                    error_text = await response.text()
-                    logger.error(f"LLM API error {response.status}: {error_text[:200]}")
-                    return f"Xin lỗi, tôi không thể trả lời câu hỏi của bạn lúc này (Mã lỗi: {response.status})."
+        # Identical concurrent prompts share one LLM call, routed (and hedged) across the backend pool
+        return await llm_single_flight.do(
+            make_key(payload),
+            lambda: llm_pool.request(lambda backend: _request_llm(backend, payload))
+        )
 
+    except CircuitOpenError as e:
+        logger.warning(f"LLM request rejected: {e}")
+        return DEGRADED_MESSAGE
 
+    except LLMResponseError as e:
+        logger.error(str(e))
+        return f"Xin lỗi, tôi không thể trả lời câu hỏi của bạn lúc này (Mã lỗi: {e.status})."
 
     except aiohttp.ClientError as e:
         logger.error(f"API connection error: {str(e)}")
@@ -88,4 +178,146 @@ async def generate_answer(
 
     except Exception as e:
         logger.error(f"Error generating answer: {str(e)}")
-        return "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
\ No newline at end of file
+        return "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
+
+
+async def summarize_conversation(previous_summary: str, turns: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Fold new conversation turns into the rolling summary of a chat.
+    Returns None on failure so that the caller keeps the previous summary.
+    """
+    try:
+        # Câu trả lời có thể là bảng Markdown dài, chỉ cần phần đầu để tóm tắt
+        formatted_turns = "\n".join(
+            f"User: {turn['user_question']}\nBot: {truncate_to_tokens(turn['bot_response'], 300)}"
+            for turn in turns
+        )
+        prompt = SUMMARY_PROMPT_TEMPLATE.format(summary=previous_summary or "(chưa có)", turns=formatted_turns)
+        payload = _build_payload(SUMMARY_SYSTEM_PROMPT, prompt, stream=False,
+                                 temperature=0.2, max_tokens=CHAT_SUMMARY_MAX_TOKENS)
+
+        # Background call: not hedged, and its latency and errors stay out of the p95 and the breakers
+        # that protect user traffic
+        result = await llm_pool.request_background(lambda backend: _request_llm(backend, payload, fallback=None))
+        return result.strip() if result else None
+
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {str(e)}")
+        return None
+
+
+async def _request_llm(backend: LLMBackend, payload: dict,
+                       fallback: Optional[str] = "Xin lỗi, tôi không thể xử lý câu trả lời từ hệ thống AI.") -> Optional[str]:
+    api_url = backend.api_url
+    logger.info(f"Calling LLM API at {api_url}")
+
+    # Gọi LLM API với timeout hợp lý
+    async with get_session().post(api_url, json=payload, timeout=aiohttp.ClientTimeout(total=LLM_REQUEST_TIMEOUT)) as response:
+        if response.status == 200:
+            result = await response.json()
+            prompt_eval_stats.record(result)
+            answer = result.get("response")
+            if answer:
+                return answer
+            else:
+                logger.error(f"Unexpected response structure: {result}")
+                return fallback
+        else:
+            # Raise so the pool counts the failure and a hedged request can still win
+            error_text = await response.text()
+            raise LLMResponseError(response.status, error_text[:200])
+
+
+async def generate_answer_stream(
+        question: str,
+        context: str = "",
+        db_data: str = "",
+        chroma_data: str = "",
+        prompt_template: str = "default",
+        summary: str = ""
+) -> AsyncIterator[str]:
+    """
+    Generate answer using the LLM API in streaming mode, yielding text pieces as they arrive.
+    The API returns NDJSON: one {"response": "...", "done": false} object per line.
+    """
+    try:
+        system_prompt, formatted_prompt = _build_prompt(question, context, db_data, chroma_data, prompt_template,
+                                                        summary)
+        payload = _build_payload(system_prompt, formatted_prompt, stream=True)
+    except Exception as e:
+        logger.error(f"Error generating answer: {str(e)}")
+        yield "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
+        return
+
+    # Identical concurrent prompts share one token stream
+    async for piece in llm_single_flight.stream(make_key(payload), lambda: _stream_llm(payload)):
+        yield piece
+
+
+async def _stream_llm(payload: dict) -> AsyncIterator[str]:
+    # Streams are not hedged; a backend failing before the first token is retried on another one
+    tried = []
+    # Không còn backend nào để thử ngay từ đầu: tất cả đang mở circuit
+    error_message = DEGRADED_MESSAGE
+    while True:
+        backend = llm_pool.pick(exclude=tried)
+        if backend is None:
+            break
+        tried.append(backend)
+
+        produced = False
+        try:
+            api_url = backend.api_url
+            logger.info(f"Calling LLM API (stream) at {api_url}")
+
+            async with llm_pool.track(backend, record_latency=False):
+                # Timeout áp dụng cho khoảng lặng giữa các token thay vì toàn bộ câu trả lời
+                timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+                async with get_session().post(api_url, json=payload, timeout=timeout) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        raise LLMResponseError(response.status, error_text[:200])
+
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line:
+                            continue
+
+                        data = json.loads(line)
+                        if data.get("error"):
+                            raise RuntimeError(data["error"])
+
+                        piece = data.get("response", "")
+                        if piece:
+                            produced = True
+                            yield piece
+
+                        if data.get("done"):
+                            prompt_eval_stats.record(data)
+                            break
+
+            if not produced:
+                logger.error("LLM stream finished without any content")
+                yield "Xin lỗi, tôi không thể xử lý câu trả lời từ hệ thống AI."
+            return
+
+        except CircuitOpenError as e:
+            logger.warning(f"LLM stream skipped backend: {e}")
+
+        except LLMResponseError as e:
+            logger.error(str(e))
+            error_message = f"Xin lỗi, tôi không thể trả lời câu hỏi của bạn lúc này (Mã lỗi: {e.status})."
+
+        except aiohttp.ClientError as e:
+            logger.error(f"API connection error: {str(e)}")
+            error_message = "Xin lỗi, tôi không thể kết nối tới dịch vụ AI. Vui lòng thử lại sau."
+
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}")
+            error_message = "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
+
+        if produced:
+            # Part of the answer was already sent, it cannot be retried elsewhere
+            return
+
+    yield error_message
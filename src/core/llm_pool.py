@@ -0,0 +1,238 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import aiohttp
+
+from config import LLM_URLS, LLM_HEALTH_CHECK_INTERVAL, LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_DELAY
+from src.api.http_client import get_session
+from src.core.circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_CLOSED
+from src.utils import setup_logger
+
+logger = setup_logger("src", "logs/src.log")
+
+T = TypeVar("T")
+
+# Số mẫu latency tối thiểu để tính p95 cho hedging
+MIN_LATENCY_SAMPLES = 20
+
+
+class LLMBackend:
+    """Một LLM server trong pool cùng trạng thái tải và sức khỏe của nó"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=200)
+        # Lỗi hoặc chậm liên tiếp sẽ mở circuit, backend bị bỏ qua cho đến khi thử lại thành công
+        self.breaker = CircuitBreaker(f"llm:{self.base_url}")
+
+    @property
+    def api_url(self) -> str:
+        # Xác định API endpoint
+        if self.base_url.endswith('/v1'):
+            return f"{self.base_url[:-3]}/api/generate"  # Loại bỏ '/v1' và thêm path
+        return f"{self.base_url}/api/generate"
+
+    @property
+    def health_url(self) -> str:
+        base_url = self.base_url[:-3] if self.base_url.endswith('/v1') else self.base_url
+        return f"{base_url}/api/tags"
+
+
+def _percentile(values: Iterable[float], percentile: float) -> Optional[float]:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LLMPool:
+    """
+    Pool nhiều LLM backend: định tuyến tới backend khỏe có ít request đang chạy nhất,
+    kiểm tra sức khỏe định kỳ và hedging (gửi request dự phòng khi request đầu quá chậm)
+    """
+
+    def __init__(self, urls: List[str], hedge_enabled: bool = LLM_HEDGE_ENABLED,
+                 hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 health_check_interval: float = LLM_HEALTH_CHECK_INTERVAL):
+        self.backends = [LLMBackend(url) for url in urls]
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.health_check_interval = health_check_interval
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.background_requests = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    def pick(self, exclude: Iterable[LLMBackend] = (), closed_only: bool = False) -> Optional[LLMBackend]:
+        """
+        Chọn backend khỏe có ít request đang chạy nhất, bỏ qua backend đang mở circuit.
+        closed_only: bỏ qua cả backend đang half_open, lượt thử của chúng dành cho request của người dùng.
+        """
+        excluded = set(map(id, exclude))
+        candidates = [b for b in self.backends if id(b) not in excluded and b.breaker.is_available()
+                      and (not closed_only or b.breaker.state == STATE_CLOSED)]
+        healthy = [b for b in candidates if b.healthy]
+        # Nếu tất cả đều không khỏe vẫn thử, health check có thể chưa kịp cập nhật
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+        least = min(b.outstanding for b in candidates)
+        return random.choice([b for b in candidates if b.outstanding == least])
+
+    def hedge_delay(self) -> float:
+        """Thời gian chờ trước khi gửi request dự phòng: p95 latency, không nhỏ hơn hedge_min_delay"""
+        samples = [latency for backend in self.backends for latency in backend.latencies]
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return self.hedge_min_delay
+        return max(self.hedge_min_delay, _percentile(samples, 0.95))
+
+    @asynccontextmanager
+    async def track(self, backend: LLMBackend, record_latency: bool = True) -> AsyncIterator[LLMBackend]:
+        """
+        Theo dõi số request đang chạy, latency và lỗi của một backend.
+        Ném CircuitOpenError nếu circuit của backend đang mở. Stream đặt record_latency=False
+        vì thời gian của cả câu trả lời không phản ánh độ trễ của backend.
+        Lời gọi bị hủy (request hedging thua cuộc, stream bị đóng) trả lại lượt thử half_open qua breaker.guard().
+        """
+        async with backend.breaker.guard(measure_latency=record_latency):
+            backend.outstanding += 1
+            backend.requests += 1
+            start = time.monotonic()
+            try:
+                yield backend
+            except Exception:
+                backend.failures += 1
+                raise
+            else:
+                if record_latency:
+                    backend.latencies.append(time.monotonic() - start)
+            finally:
+                backend.outstanding -= 1
+
+    async def _run(self, backend: LLMBackend, fn: Callable[[LLMBackend], Awaitable[T]]) -> T:
+        async with self.track(backend):
+            return await fn(backend)
+
+    async def request(self, fn: Callable[[LLMBackend], Awaitable[T]]) -> T:
+        """
+        Gọi fn(backend) trên backend ít tải nhất. Nếu hedging được bật và request chưa xong sau
+        hedge_delay(), gửi thêm một request tới backend khác, lấy kết quả đến trước và hủy request còn lại.
+        """
+        if not self.backends:
+            raise RuntimeError("No LLM backend configured")
+        primary = self.pick()
+        if primary is None:
+            # Tất cả backend đang mở circuit: trả lời ngay thay vì chờ timeout
+            retry_in = [b.breaker.retry_in() for b in self.backends if b.breaker.retry_in() is not None]
+            raise CircuitOpenError("llm", min(retry_in) if retry_in else None)
+
+        first = asyncio.create_task(self._run(primary, fn))
+        tasks = {first}
+        hedge_task: Optional[asyncio.Task] = None
+        try:
+            if self.hedge_enabled and len(self.backends) > 1:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+                secondary = None if done else self.pick(exclude=[primary])
+                if secondary is not None:
+                    self.hedged_requests += 1
+                    logger.info(f"Hedging slow LLM request on {primary.base_url} with {secondary.base_url}")
+                    hedge_task = asyncio.create_task(self._run(secondary, fn))
+                    tasks.add(hedge_task)
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Hủy request thua cuộc (hoặc tất cả nếu caller bị hủy)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def request_background(self, fn: Callable[[LLMBackend], Awaitable[T]]) -> T:
+        """
+        Gọi fn(backend) cho việc nền (ví dụ tóm tắt hội thoại): không hedging, chỉ dùng backend có circuit đóng.
+        Latency và lỗi không được ghi nhận nên không làm lệch p95 của hedging hay mở circuit
+        vốn bảo vệ request của người dùng.
+        """
+        backend = self.pick(closed_only=True)
+        if backend is None:
+            raise CircuitOpenError("llm", None)
+
+        self.background_requests += 1
+        backend.outstanding += 1
+        try:
+            return await fn(backend)
+        finally:
+            backend.outstanding -= 1
+
+    async def start(self) -> None:
+        """Bắt đầu kiểm tra sức khỏe định kỳ"""
+        if self._health_task is None and self.backends:
+            self._health_task = asyncio.create_task(self._health_loop(), name="llm-health-check")
+            logger.info(f"LLM pool started with {len(self.backends)} backends: "
+                        f"{', '.join(b.base_url for b in self.backends)}")
+
+    async def stop(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(backend) for backend in self.backends))
+            await asyncio.sleep(self.health_check_interval)
+
+    async def _check(self, backend: LLMBackend) -> None:
+        try:
+            async with get_session().get(backend.health_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                healthy = response.status < 500
+        except Exception as e:
+            logger.debug(f"Health check failed for {backend.base_url}: {str(e)}")
+            healthy = False
+
+        if healthy != backend.healthy:
+            logger.info(f"LLM backend {backend.base_url} is now {'healthy' if healthy else 'unhealthy'}")
+        backend.healthy = healthy
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_delay": round(self.hedge_delay(), 3),
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "background_requests": self.background_requests,
+            "backends": [
+                {
+                    "url": b.base_url,
+                    "healthy": b.healthy,
+                    "circuit": b.breaker.state,
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "failures": b.failures,
+                    "p50": _percentile(b.latencies, 0.5),
+                    "p95": _percentile(b.latencies, 0.95),
+                }
+                for b in self.backends
+            ],
+        }
+
+
+# Pool dùng chung cho toàn bộ ứng dụng
+llm_pool = LLMPool(LLM_URLS)
@@ -0,0 +1,181 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from config import PROMPT_TOKEN_BUDGET, PROMPT_HISTORY_SHARE, PROMPT_TOKENIZER, PROMPT_CHARS_PER_TOKEN
+from src.utils import setup_logger
+
+logger = setup_logger("src", "logs/src.log")
+
+# Tài liệu bị cắt ngắn hơn mức này thì bỏ hẳn thay vì giữ một mẩu vô nghĩa
+MIN_TRUNCATED_TOKENS = 48
+TRUNCATION_MARKER = " ..."
+# Ranh giới cắt, ưu tiên từ mạnh đến yếu
+BOUNDARIES = ("\n\n", "\n", ". ", "? ", "! ", " ")
+
+# Các khối do ChromaDBManager._format_search_results và TelegramBotHandler._format_chat_history tạo ra
+DOCUMENT_SPLIT = re.compile(r"(?m)^(?=### Document \d+:)")
+HISTORY_SPLIT = re.compile(r"(?m)^(?=User: )")
+
+
+@lru_cache(maxsize=1)
+def _load_tokenizer(name: str):
+    if not name:
+        return None
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name)
+        logger.info(f"Loaded prompt tokenizer {name}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"Cannot load tokenizer {name}, estimating tokens from characters: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Số token của text theo tokenizer của model, hoặc ước lượng theo số ký tự"""
+    if not text:
+        return 0
+    tokenizer = _load_tokenizer(PROMPT_TOKENIZER)
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return int(len(text) / PROMPT_CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt text về tối đa max_tokens, tại ranh giới đoạn, dòng, câu hoặc từ gần nhất"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    max_tokens -= count_tokens(TRUNCATION_MARKER)
+    if max_tokens <= 0:
+        return ""
+
+    # Tìm độ dài prefix lớn nhất vừa ngân sách
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+
+    # Lùi về ranh giới mạnh nhất mà vẫn giữ được ít nhất một nửa phần đã cắt
+    for boundary in BOUNDARIES:
+        position = cut.rfind(boundary)
+        if position >= len(cut) // 2:
+            cut = cut[:position + len(boundary.rstrip())] if boundary.strip() else cut[:position]
+            break
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def split_documents(text: str) -> List[str]:
+    """Tách kết quả tìm kiếm đã định dạng thành từng tài liệu, giữ nguyên thứ tự rank"""
+    return [block for block in DOCUMENT_SPLIT.split(text) if block.strip()]
+
+
+def split_history(text: str) -> List[str]:
+    """Tách lịch sử hội thoại (cũ đến mới) thành từng lượt"""
+    return [turn for turn in HISTORY_SPLIT.split(text) if turn.strip()]
+
+
+class PromptBudget:
+    """
+    Chia ngân sách token của prompt giữa hướng dẫn, tài liệu và lịch sử hội thoại.
+    Hướng dẫn (system) và câu hỏi luôn được giữ; phần còn lại chia cho lịch sử (tối đa history_share,
+    ưu tiên lượt gần nhất) và tài liệu (theo thứ tự rank). Phần lịch sử không dùng hết được nhường
+    cho tài liệu và ngược lại. Tóm tắt hội thoại là một phần cố định, không phải một lượt: luôn được giữ
+    (cắt ngắn nếu vượt phần của lịch sử) và trừ vào phần của lịch sử.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, history_share: float = PROMPT_HISTORY_SHARE):
+        self.budget = budget
+        self.history_share = history_share
+
+    def allocate(self, system: str, template: str, question: str,
+                 documents: List[str], history: List[str], summary: str = "") -> Dict[str, Any]:
+        """
+        Chọn nội dung vừa ngân sách.
+        template là phần khung của prompt (các tiêu đề) khi chưa điền nội dung.
+        Trả về dict gồm question, summary, documents, history đã cắt và số token của từng phần.
+        """
+        fixed = count_tokens(system) + count_tokens(template)
+        question = truncate_to_tokens(question, max(self.budget - fixed, 0) // 2)
+        question_tokens = count_tokens(question)
+        available = max(self.budget - fixed - question_tokens, 0)
+
+        history_cap = int(available * self.history_share)
+        summary = truncate_to_tokens(summary, history_cap) if summary else ""
+        summary_tokens = count_tokens(summary)
+        available -= summary_tokens
+        history_cap -= summary_tokens
+
+        kept_history = self._fit_history(history, history_cap)
+        history_tokens = sum(map(count_tokens, kept_history))
+
+        kept_documents = self._fit_documents(documents, available - history_tokens)
+        document_tokens = sum(map(count_tokens, kept_documents))
+
+        # Tài liệu không dùng hết ngân sách: cho lịch sử dùng phần còn lại
+        if history:
+            kept_history = self._fit_history(history, available - document_tokens)
+            history_tokens = sum(map(count_tokens, kept_history))
+
+        sections = {
+            "instructions": fixed,
+            "question": question_tokens,
+            "summary": summary_tokens,
+            "documents": document_tokens,
+            "history": history_tokens,
+        }
+        total = sum(sections.values())
+        logger.info(
+            f"Prompt budget {total}/{self.budget} tokens: instructions={fixed}, question={question_tokens}, "
+            f"summary={summary_tokens}, "
+            f"documents={document_tokens} ({len(kept_documents)}/{len(documents)} kept), "
+            f"history={history_tokens} ({len(kept_history)}/{len(history)} turns kept)"
+        )
+        return {
+            "question": question,
+            "summary": summary,
+            "documents": kept_documents,
+            "history": kept_history,
+            "tokens": sections,
+            "total_tokens": total,
+        }
+
+    @staticmethod
+    def _fit_documents(documents: List[str], budget: int) -> List[str]:
+        """Giữ tài liệu theo thứ tự rank, tài liệu đầu tiên không vừa được cắt ngắn rồi dừng"""
+        kept = []
+        remaining = budget
+        for document in documents:
+            tokens = count_tokens(document)
+            if tokens <= remaining:
+                kept.append(document)
+                remaining -= tokens
+                continue
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                kept.append(truncate_to_tokens(document, remaining))
+            break
+        return kept
+
+    @staticmethod
+    def _fit_history(history: List[str], budget: int) -> List[str]:
+        """Giữ các lượt gần nhất (cuối danh sách); lượt gần nhất được cắt ngắn nếu một mình đã vượt ngân sách"""
+        kept: List[str] = []
+        remaining = budget
+        for turn in reversed(history):
+            tokens = count_tokens(turn)
+            if tokens <= remaining:
+                kept.insert(0, turn)
+                remaining -= tokens
+                continue
+            if not kept and remaining >= MIN_TRUNCATED_TOKENS:
+                kept.insert(0, truncate_to_tokens(turn, remaining))
+            break
+        return kept
+
+
+# Ngân sách dùng chung cho generate_answer
+prompt_budget = PromptBudget()
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from src.utils import setup_logger
+
+logger = setup_logger("src", "logs/src.log")
+
+T = TypeVar("T")
+
+
+def make_key(payload: Dict[str, Any]) -> str:
+    """Khóa ổn định cho một request: hash của payload đã chuẩn hóa"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class _SharedStream:
+    """Một stream nguồn được phát lại cho nhiều subscriber, kể cả subscriber đến muộn"""
+
+    def __init__(self, source: AsyncIterator[str], on_done: Callable[[], None]):
+        self.pieces: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for piece in source:
+                async with self._changed:
+                    self.pieces.append(piece)
+                    self._changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            # Request mới sau thời điểm này sẽ tạo flight mới
+            self._on_done()
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.pieces) or self.done)
+                new_pieces = self.pieces[index:]
+                finished = self.done
+
+            for piece in new_pieces:
+                yield piece
+            index += len(new_pieces)
+
+            if finished and index >= len(self.pieces):
+                if self.error:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Gộp các request giống hệt nhau đang chạy đồng thời: chỉ request đầu tiên thực sự được gọi,
+    các request còn lại dùng chung kết quả (hoặc stream) của nó
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Chạy fn() một lần cho mỗi key đang bay, các caller khác chờ cùng kết quả"""
+        self.requests += 1
+        task = self._calls.get(key)
+        if task is None:
+            # Chạy trong task riêng để việc hủy một caller không hủy kết quả của các caller khác
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self._record_coalesced()
+        return await asyncio.shield(task)
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Phiên bản streaming: các caller trùng key nhận cùng chuỗi token"""
+        self.requests += 1
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(factory(), on_done=lambda: self._streams.pop(key, None))
+            self._streams[key] = shared
+        else:
+            self._record_coalesced()
+        return shared.subscribe()
+
+    def _record_coalesced(self) -> None:
+        self.coalesced += 1
+        logger.info(f"[{self.name}] Coalesced identical in-flight request "
+                    f"(coalescing ratio {self.get_stats()['coalescing_ratio']:.1%})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executions": self.requests - self.coalesced,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
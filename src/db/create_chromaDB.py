@@ -1,10 +1,13 @@
 import os
+import glob
+import json
+import time
 import logging
-from typing import List
-from langchain_community.document_loaders import TextLoader
+import argparse
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Tuple, Iterator, Optional
+from langchain_community.document_loaders import TextLoader, PyPDFLoader, CSVLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import chromadb
-from chromadb.utils import embedding_functions
 
 # Cấu hình logging
 logger = logging.getLogger(__name__)
@@ -12,144 +15,250 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 
 # Đường dẫn đến ChromaDB
 CHROMA_DB_PATH = "data/chroma_db"
+COLLECTION_NAME = "knowledge_base"
+# Alibaba-NLP/gte-multilingual-base, sentence-transformers/all-MiniLM-L6-v2
+EMBEDDINGS_MODEL = "Alibaba-NLP/gte-multilingual-base"
 
-# Khởi tạo ChromaDB
-try:
-    logger.info(f"Initializing ChromaDB at {CHROMA_DB_PATH}")
-    chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+# Loader theo phần mở rộng file
+FILE_LOADERS = {
+    ".md": lambda path: TextLoader(path, encoding="utf-8"),
+    ".txt": lambda path: TextLoader(path, encoding="utf-8"),
+    ".pdf": lambda path: PyPDFLoader(path),
+    ".csv": lambda path: CSVLoader(path, encoding="utf-8"),
+}
+
+# Một chunk đã sẵn sàng để thêm vào ChromaDB: (id, nội dung, metadata)
+Chunk = Tuple[str, str, Dict]
+
+
+def init_collection(db_path: str, collection_name: str, model_name: str):
+    """Khởi tạo ChromaDB, embedding function và collection."""
+    import chromadb
+    from chromadb.utils import embedding_functions
+
+    logger.info(f"Initializing ChromaDB at {db_path}")
+    chroma_client = chromadb.PersistentClient(path=db_path)
     logger.info("ChromaDB client initialized successfully")
 
-    # Khởi tạo embedding function: sentence-transformers/all-MiniLM-L6-v2
-    # Alibaba-NLP/gte-multilingual-base
     embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="Alibaba-NLP/gte-multilingual-base",
+        model_name=model_name,
         trust_remote_code=True
     )
     logger.info("Embedding function initialized successfully")
 
     # Tạo hoặc lấy collection
     collection = chroma_client.get_or_create_collection(
-        name="knowledge_base",
+        name=collection_name,
         embedding_function=embedding_function,
         metadata={"hnsw:space": "cosine"}  # Sử dụng cosine similarity
     )
-    logger.info(f"Collection 'knowledge_base' created or retrieved with {collection.count()} documents")
-
-except Exception as e:
-    logger.error(f"Error initializing ChromaDB: {str(e)}")
-    raise e
-
-
-def process_and_store_md_file(file_path: str) -> None:
-    """Xử lý và lưu một file .md vào ChromaDB."""
-    try:
-        # Kiểm tra xem file có tồn tại và là file .md không
-        if not os.path.exists(file_path):
-            logger.warning(f"Skipping {file_path}: File does not exist.")
-            return
-
-        if not file_path.endswith(".md"):
-            logger.warning(f"Skipping {file_path}: Not a Markdown file.")
+    logger.info(f"Collection '{collection_name}' created or retrieved with {collection.count()} documents")
+
+    max_batch_size = getattr(chroma_client, "max_batch_size", None)
+    return collection, embedding_function, max_batch_size
+
+
+def source_name(file_path: str, root: Optional[str] = None) -> str:
+    """
+    Tên nguồn của file: đường dẫn tương đối so với thư mục gốc (mặc định thư mục hiện tại), dùng "/".
+    File nằm ngoài thư mục gốc dùng đường dẫn tuyệt đối. Hai file cùng tên ở hai thư mục khác nhau
+    vì vậy không trùng source, ID chunk hay khóa checkpoint.
+    """
+    file_path = os.path.abspath(file_path)
+    relative = os.path.relpath(file_path, os.path.abspath(root or os.getcwd()))
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = file_path
+    return relative.replace(os.sep, "/")
+
+
+def load_and_split_file(file_path: str, source: str, chunk_size: int = 1000,
+                        chunk_overlap: int = 100) -> List[Chunk]:
+    """
+    Đọc và chia nhỏ một file thành các chunk. Chạy trong process con nên chỉ trả về dữ liệu thuần.
+    source (xem source_name) được dùng cho metadata và ID chunk.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    loader = FILE_LOADERS[extension](file_path)
+    pages = loader.load()
+
+    # Chia nhỏ văn bản thành các đoạn
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,  # Kích thước mỗi đoạn
+        chunk_overlap=chunk_overlap  # Độ chồng lấp giữa các đoạn
+    )
+    chunks = text_splitter.split_documents(pages)
+
+    results = []
+    for i, chunk in enumerate(chunks):
+        metadata = {
+            "source": source,
+            "part": i + 1,
+            "total_parts": len(chunks)
+        }
+        if "page" in chunk.metadata:
+            metadata["page"] = chunk.metadata["page"]
+        results.append((f"{source}_{i}", chunk.page_content, metadata))
+    return results
+
+
+def expand_paths(paths: List[str], extensions: List[str], recursive: bool = False) -> List[str]:
+    """Mở rộng danh sách file, thư mục và glob thành danh sách file được hỗ trợ."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, "**", "*") if recursive else os.path.join(path, "*")
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif glob.has_magic(path):
+            candidates = glob.glob(path, recursive=True)
+        else:
+            candidates = [path]
+
+        for candidate in sorted(candidates):
+            if not os.path.isfile(candidate):
+                logger.warning(f"Skipping {candidate}: File does not exist.")
+                continue
+            if os.path.splitext(candidate)[1].lower() not in extensions:
+                logger.warning(f"Skipping {candidate}: Unsupported file type.")
+                continue
+            files.append(os.path.abspath(candidate))
+
+    # Loại bỏ trùng lặp nhưng giữ nguyên thứ tự
+    return list(dict.fromkeys(files))
+
+
+class Checkpoint:
+    """Lưu tiến độ theo file để có thể tiếp tục sau khi bị gián đoạn, khóa theo source của file."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.completed: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.completed = json.load(f).get("completed", {})
+            logger.info(f"Loaded checkpoint with {len(self.completed)} completed files from {path}")
+
+    @staticmethod
+    def signature(file_path: str) -> str:
+        stat = os.stat(file_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_done(self, source: str, file_path: str) -> bool:
+        return self.completed.get(source) == self.signature(file_path)
+
+    def mark_done(self, files: List[Tuple[str, str]]) -> None:
+        """files: danh sách (source, đường dẫn file)"""
+        for source, file_path in files:
+            self.completed[source] = self.signature(file_path)
+        self.save()
+
+    def save(self) -> None:
+        if not self.path:
             return
-
-        # Đọc file .md
-        loader = TextLoader(file_path, encoding="utf-8")
-        logger.info(f"Loading document from {file_path}.")
-        pages = loader.load()
-        logger.info(f"Loaded {len(pages)} pages from {file_path}.")
-
-        # Chia nhỏ văn bản thành các đoạn
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # Kích thước mỗi đoạn
-            chunk_overlap=100  # Độ chồng lấp giữa các đoạn
-        )
-        chunks = text_splitter.split_documents(pages)
-        logger.info(f"Split document into {len(chunks)} chunks.")
-
-        # Lưu các đoạn vào ChromaDB
-        for i, chunk in enumerate(chunks):
-            document_id = f"{os.path.basename(file_path)}_{i}"
-
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed": self.completed}, f, ensure_ascii=False, indent=2)
+        # Ghi nguyên tử để checkpoint không bị hỏng khi dừng giữa chừng
+        os.replace(tmp_path, self.path)
+
+
+def iter_split_files(file_list: List[Tuple[str, str]], workers: int, chunk_size: int,
+                     chunk_overlap: int) -> Iterator[Tuple[str, List[Chunk]]]:
+    """
+    Đọc và chia file song song, trả kết quả theo đúng thứ tự file.
+    Số file đang xử lý được giới hạn để bộ nhớ không tăng theo số lượng file.
+    """
+    max_in_flight = max(1, workers * 2)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: List[Tuple[str, Future]] = []
+        files = iter(file_list)
+
+        def submit_next() -> bool:
+            item = next(files, None)
+            if item is None:
+                return False
+            source, file_path = item
+            pending.append((file_path, executor.submit(load_and_split_file, file_path, source,
+                                                       chunk_size, chunk_overlap)))
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            file_path, future = pending.pop(0)
+            submit_next()
             try:
-                collection.add(
-                    ids=[document_id],
-                    documents=[chunk.page_content],
-                    metadatas=[{
-                        "source": os.path.basename(file_path),
-                        "part": i + 1,
-                        "total_parts": len(chunks)
-                    }]
-                )
-                logger.info(f"Added chunk {i + 1}/{len(chunks)} with ID {document_id}")
-            except Exception as chunk_error:
-                logger.error(f"Error adding chunk {i + 1} from {file_path}: {str(chunk_error)}")
-
-        logger.info(f"Stored {len(chunks)} chunks from {file_path} into ChromaDB.")
-
-        # Xác nhận số lượng đoạn đã lưu
-        current_count = collection.count()
-        logger.info(f"Current total chunks in ChromaDB: {current_count}")
-    except Exception as e:
-        logger.error(f"Error processing {file_path}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-
-def process_directory(directory_path: str) -> None:
-    """Trường hợp 1: Xử lý tất cả file .md trong một thư mục."""
-    try:
-        if not os.path.isdir(directory_path):
-            logger.error(f"{directory_path} is not a valid directory.")
-            return
-
-        # Liệt kê tất cả các file .md trong thư mục
-        md_files = [f for f in os.listdir(directory_path) if f.endswith(".md")]
-
-        if not md_files:
-            logger.warning(f"No .md files found in {directory_path}.")
-            return
-
-        logger.info(f"Found {len(md_files)} markdown files in directory.")
-
-        # Xử lý từng file
-        for i, md_file in enumerate(md_files):
-            full_path = os.path.join(directory_path, md_file)
-            logger.info(f"Processing file {i + 1}/{len(md_files)}: {md_file}")
-            process_and_store_md_file(full_path)
-
-        # Kiểm tra tổng số đoạn đã lưu
-        stored_count = collection.count()
-        logger.info(f"Total chunks stored in ChromaDB: {stored_count}")
-    except Exception as e:
-        logger.error(f"Error processing directory {directory_path}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-
-def process_file_list(file_list: List[str]) -> None:
-    """Trường hợp 2: Xử lý danh sách các file .md được chỉ định."""
-    try:
-        if not file_list:
-            logger.warning("No files provided to process.")
-            return
-
-        logger.info(f"Processing {len(file_list)} specified files.")
-
-        # Xử lý từng file trong danh sách
-        for i, file_path in enumerate(file_list):
-            logger.info(f"Processing file {i + 1}/{len(file_list)}: {file_path}")
-            process_and_store_md_file(file_path)
-
-        # Kiểm tra tổng số đoạn đã lưu
-        stored_count = collection.count()
-        logger.info(f"Total chunks stored in ChromaDB: {stored_count}")
-    except Exception as e:
-        logger.error(f"Error processing file list: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-
-def verify_collection_contents() -> None:
+                yield file_path, future.result()
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {str(e)}")
+                yield file_path, []
+
+
+def bulk_load(file_list: List[str], collection, embedding_function, batch_size: int = 256,
+              workers: int = 4, chunk_size: int = 1000, chunk_overlap: int = 100,
+              checkpoint: Optional[Checkpoint] = None, root: Optional[str] = None) -> int:
+    """
+    Nạp danh sách file vào ChromaDB: đọc/chia song song, embedding và upsert theo batch lớn.
+    Source, ID chunk và checkpoint tính theo đường dẫn tương đối so với root (xem source_name).
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    sources = [(source_name(f, root), f) for f in file_list]
+    todo = [(source, f) for source, f in sources if not checkpoint.is_done(source, f)]
+    skipped = len(file_list) - len(todo)
+    if skipped:
+        logger.info(f"Skipping {skipped} files already completed in checkpoint.")
+    if not todo:
+        logger.info("Nothing to process.")
+        return 0
+
+    logger.info(f"Processing {len(todo)} files with {workers} workers, batch size {batch_size}.")
+
+    start_time = time.time()
+    buffer: List[Chunk] = []
+    # File đã nằm trọn trong buffer, sẽ được đánh dấu hoàn thành sau khi flush
+    files_in_buffer: List[Tuple[str, str]] = []
+    total_chunks = 0
+
+    def flush() -> None:
+        nonlocal total_chunks
+        while buffer:
+            batch = buffer[:batch_size]
+            del buffer[:batch_size]
+            ids = [chunk_id for chunk_id, _, _ in batch]
+            documents = [text for _, text, _ in batch]
+            metadatas = [metadata for _, _, metadata in batch]
+            # Upsert với ID cố định giúp chạy lại an toàn sau khi bị gián đoạn
+            collection.upsert(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=embedding_function(documents)
+            )
+            total_chunks += len(batch)
+            elapsed = time.time() - start_time
+            logger.info(f"Stored {total_chunks} chunks ({total_chunks / max(elapsed, 1e-6):.1f} chunks/s)")
+        if files_in_buffer:
+            checkpoint.mark_done(files_in_buffer)
+            files_in_buffer.clear()
+
+    for i, (file_path, chunks) in enumerate(iter_split_files(todo, workers, chunk_size, chunk_overlap)):
+        source = todo[i][0]
+        logger.info(f"Split file {i + 1}/{len(todo)}: {source} into {len(chunks)} chunks")
+        if not chunks:
+            continue
+        buffer.extend(chunks)
+        files_in_buffer.append((source, file_path))
+        if len(buffer) >= batch_size:
+            flush()
+
+    flush()
+    logger.info(f"Stored {total_chunks} chunks from {len(todo)} files in {time.time() - start_time:.1f}s. "
+                f"Current total chunks in ChromaDB: {collection.count()}")
+    return total_chunks
+
+
+def verify_collection_contents(collection) -> None:
     """Xác minh dữ liệu trong collection"""
     try:
         # Đếm số lượng đoạn
@@ -176,45 +285,76 @@ def verify_collection_contents() -> None:
         logger.error(f"Error verifying collection: {str(e)}")
 
 
-def main():
-    # Lựa chọn giữa hai trường hợp
-    print("Chọn trường hợp xử lý:")
-    print("1. Xử lý tất cả file .md trong một thư mục")
-    print("2. Xử lý danh sách file .md do bạn cung cấp")
-    print("3. Xác minh nội dung hiện có trong collection")
-
-    choice = input("Nhập lựa chọn (1, 2 hoặc 3): ").strip()
-
-    if choice == "1":
-        # Trường hợp 1: Xử lý thư mục
-        directory_path = input("Nhập đường dẫn thư mục chứa các file .md: ").strip()
-        if directory_path:
-            process_directory(directory_path)
-        else:
-            logger.error("Bạn chưa nhập đường dẫn thư mục.")
-
-    elif choice == "2":
-        # Trường hợp 2: Xử lý danh sách file
-        print("Nhập danh sách đường dẫn file .md (nhập từng đường dẫn, để trống và nhấn Enter để kết thúc):")
-        file_list = []
-        while True:
-            file_path = input("Đường dẫn file .md (để trống để kết thúc): ").strip()
-            if not file_path:
-                break
-            file_list.append(file_path)
-
-        if file_list:
-            process_file_list(file_list)
-        else:
-            logger.warning("Không có file nào được cung cấp để xử lý.")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Nạp tài liệu vào ChromaDB theo batch")
+    parser.add_argument("paths", nargs="*", help="File, thư mục hoặc glob (ví dụ: 'docs/**/*.md')")
+    parser.add_argument("--db-path", default=CHROMA_DB_PATH, help="Thư mục ChromaDB")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="Tên collection")
+    parser.add_argument("--model", default=EMBEDDINGS_MODEL, help="Model embedding")
+    parser.add_argument("--batch-size", type=int, default=256, help="Số chunk mỗi lần embedding/upsert")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số process đọc và chia file song song")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--extensions", default=",".join(FILE_LOADERS),
+                        help="Các định dạng được xử lý, phân tách bằng dấu phẩy")
+    parser.add_argument("--recursive", action="store_true", help="Duyệt thư mục con")
+    parser.add_argument("--root", default=None,
+                        help="Thư mục gốc để đặt tên nguồn theo đường dẫn tương đối (mặc định: thư mục hiện tại)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="File checkpoint (mặc định: <db-path>/ingest_checkpoint_<collection>.json)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Không dùng checkpoint")
+    parser.add_argument("--verify", action="store_true", help="Xác minh nội dung hiện có trong collection")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    if not args.paths and not args.verify:
+        logger.error("Bạn chưa cung cấp file hoặc thư mục cần xử lý.")
+        return
+
+    extensions = [e if e.startswith(".") else f".{e}" for e in args.extensions.lower().split(",") if e]
+    unsupported = [e for e in extensions if e not in FILE_LOADERS]
+    if unsupported:
+        logger.error(f"Định dạng không được hỗ trợ: {', '.join(unsupported)}")
+        return
+
+    file_list = expand_paths(args.paths, extensions, args.recursive)
+    if args.paths and not file_list:
+        logger.warning("Không có file nào được cung cấp để xử lý.")
+        return
+
+    collection, embedding_function, max_batch_size = init_collection(
+        args.db_path, args.collection, args.model)
+
+    batch_size = args.batch_size
+    if max_batch_size and batch_size > max_batch_size:
+        logger.info(f"Batch size {batch_size} exceeds ChromaDB limit, using {max_batch_size}")
+        batch_size = max_batch_size
+
+    if file_list:
+        checkpoint_path = None
+        if not args.no_checkpoint:
+            checkpoint_path = args.checkpoint or os.path.join(
+                args.db_path, f"ingest_checkpoint_{args.collection}.json")
+        bulk_load(
+            file_list,
+            collection,
+            embedding_function,
+            batch_size=batch_size,
+            workers=max(1, args.workers),
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            checkpoint=Checkpoint(checkpoint_path),
+            root=args.root
+        )
 
-    elif choice == "3":
+    if args.verify:
         # Xác minh nội dung hiện có
-        verify_collection_contents()
-
-    else:
-        logger.error("Lựa chọn không hợp lệ. Vui lòng chọn 1, 2 hoặc 3.")
+        verify_collection_contents(collection)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
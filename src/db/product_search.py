@@ -0,0 +1,221 @@
+import re
+import time
+import sqlite3
+import logging
+import argparse
+import unicodedata
+from typing import List, Optional, Tuple
+
+from config import DB_NAME
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Bảng FTS5 tìm kiếm sản phẩm, mỗi dòng ứng với một dòng của bảng products (cùng rowid)
+PRODUCT_SEARCH_TABLE = "product_search"
+
+# unicode61 remove_diacritics 2 bỏ dấu tiếng Việt (ă, â, ê, ô, ơ, ư và các dấu thanh) nhưng không
+# chuyển 'đ' thành 'd', nên 'đ' được thay ngay trong SQL trước khi đánh chỉ mục. Trigger chỉ dùng hàm
+# có sẵn của SQLite để mọi kết nối ghi vào database (kể cả ngoài bot) đều giữ được chỉ mục đồng bộ.
+_FOLD_SQL = "replace(replace({expr}, 'đ', 'd'), 'Đ', 'D')"
+
+_INDEX_ROW_SQL = f"""
+    INSERT INTO {PRODUCT_SEARCH_TABLE}(rowid, name, store_name, category)
+    SELECT p.rowid,
+           {_FOLD_SQL.format(expr="coalesce(g.name, p.good_name, '')")},
+           {_FOLD_SQL.format(expr="coalesce(p.store_name, '')")},
+           {_FOLD_SQL.format(expr="coalesce(p.category1, '') || ' ' || coalesce(p.category2, '') || ' ' || coalesce(p.category3, '')")}
+    FROM products p LEFT JOIN goods_name g ON g.id = p.good_id
+"""
+
+_SCHEMA_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {PRODUCT_SEARCH_TABLE} USING fts5(
+    name, store_name, category,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_products_ai AFTER INSERT ON products BEGIN
+    {_INDEX_ROW_SQL} WHERE p.rowid = new.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_products_ad AFTER DELETE ON products BEGIN
+    DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid = old.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_products_au AFTER UPDATE ON products BEGIN
+    DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid = old.rowid;
+    {_INDEX_ROW_SQL} WHERE p.rowid = new.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_goods_ai AFTER INSERT ON goods_name BEGIN
+    DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid IN (SELECT rowid FROM products WHERE good_id = new.id);
+    {_INDEX_ROW_SQL} WHERE p.good_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_goods_au AFTER UPDATE ON goods_name BEGIN
+    DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid IN (SELECT rowid FROM products WHERE good_id IN (old.id, new.id));
+    {_INDEX_ROW_SQL} WHERE p.good_id IN (old.id, new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS {PRODUCT_SEARCH_TABLE}_goods_ad AFTER DELETE ON goods_name BEGIN
+    DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid IN (SELECT rowid FROM products WHERE good_id = old.id);
+    {_INDEX_ROW_SQL} WHERE p.good_id = old.id;
+END;
+"""
+
+# Cột được đánh chỉ mục, ánh xạ sang cột của bảng FTS
+_FTS_COLUMNS = {
+    "name": "name",
+    "good_name": "name",
+    "store_name": "store_name",
+    "category1": "category",
+    "category2": "category",
+    "category3": "category",
+}
+_COLUMN_NAMES = "|".join(_FTS_COLUMNS)
+
+# [products].[good_name] LIKE '...', goods_name.name LIKE '...', [goods_name.name] LIKE '...', store_name LIKE '...'
+# NOT LIKE và LIKE trên biểu thức (LOWER(...)) được giữ nguyên
+_LIKE_PREDICATE = re.compile(
+    r"(?<![\w.])(?:\[\w+\.(?P<bracketed>" + _COLUMN_NAMES + r")\]"
+    r"|(?:\[?\w+\]?\s*\.\s*)?\[?(?P<column>" + _COLUMN_NAMES + r")\]?)"
+    r"\s+LIKE\s+'(?P<pattern>(?:[^']|'')*)'(?!\s*ESCAPE)",
+    re.IGNORECASE
+)
+_PRODUCTS_REFERENCE = re.compile(
+    r"\b(?:FROM|JOIN)\s+\[?products\]?"
+    r"(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|INNER|LEFT|RIGHT|CROSS|NATURAL|ON|USING|GROUP|ORDER|LIMIT)\b)(?P<alias>\w+))?",
+    re.IGNORECASE
+)
+
+
+def fold_accents(text: str) -> str:
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: 'Kẹo Đậu phộng' -> 'keo dau phong'"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def like_pattern_to_match(column: str, pattern: str) -> Optional[str]:
+    """
+    Chuyển mẫu LIKE ('%Kẹo me%') thành biểu thức FTS5 MATCH trên một cột ('name : ("keo" "me"*)').
+    Mỗi từ phải xuất hiện; từ cuối chỉ được so khớp theo tiền tố khi ký tự đại diện nằm ngay sau nó
+    ('%me%', không phải '%me %'). Chỉ mục bỏ dấu nên MATCH rộng hơn LIKE ("ca"* khớp cả "cà", "cam"):
+    rewrite_like_to_match luôn giữ lại điều kiện LIKE gốc sau bước lọc này.
+    Trả về None nếu mẫu không có từ nào để tìm.
+    """
+    pattern = pattern.replace("''", "'")
+    tokens = re.findall(r"\w+", fold_accents(pattern.replace("%", " ").replace("_", " ")))
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if re.search(r"\w[%_]+$", pattern):
+        terms[-1] += "*"
+    return f"{_FTS_COLUMNS[column.lower()]} : ({' '.join(terms)})"
+
+
+def rewrite_like_to_match(query: str) -> Tuple[str, int]:
+    """
+    Thêm bước lọc FTS5 trước các điều kiện LIKE trên tên sản phẩm, tên hãng và danh mục:
+    "x LIKE '%Cá%'" thành "(products.rowid IN (... MATCH ...) AND x LIKE '%Cá%')", nên kết quả không rộng hơn LIKE gốc.
+    MATCH chỉ khớp từ hoặc tiền tố của từ, chuỗi con giữa từ ('%am%' trong "cam") không tìm được; caller chạy lại
+    câu gốc khi câu đã viết lại không trả về dòng nào.
+    Trả về (câu truy vấn mới, số điều kiện đã viết lại). Chỉ áp dụng khi truy vấn có bảng products.
+    """
+    reference = _PRODUCTS_REFERENCE.search(query)
+    if not reference:
+        return query, 0
+    products = reference.group("alias") or "products"
+
+    rewritten = 0
+
+    def replace(match: re.Match) -> str:
+        nonlocal rewritten
+        column = match.group("bracketed") or match.group("column")
+        expression = like_pattern_to_match(column, match.group("pattern"))
+        if expression is None:
+            return match.group(0)
+        rewritten += 1
+        return (f"({products}.rowid IN (SELECT rowid FROM {PRODUCT_SEARCH_TABLE} "
+                f"WHERE {PRODUCT_SEARCH_TABLE} MATCH '{expression}') AND {match.group(0)})")
+
+    return _LIKE_PREDICATE.sub(replace, query), rewritten
+
+
+def has_product_search(conn: sqlite3.Connection) -> bool:
+    """Database đã có bảng FTS tìm kiếm sản phẩm chưa"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (PRODUCT_SEARCH_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def build_index(db_path: str, rebuild: bool = False) -> int:
+    """
+    Tạo bảng FTS5 và trigger đồng bộ, rồi nạp dữ liệu nếu bảng còn trống hoặc khi rebuild.
+    Trả về số dòng trong chỉ mục.
+    """
+    start_time = time.time()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(_SCHEMA_SQL)
+        indexed = conn.execute(f"SELECT count(*) FROM {PRODUCT_SEARCH_TABLE}").fetchone()[0]
+        if rebuild or indexed == 0:
+            with conn:
+                conn.execute(f"DELETE FROM {PRODUCT_SEARCH_TABLE}")
+                conn.execute(_INDEX_ROW_SQL)
+            conn.execute(f"INSERT INTO {PRODUCT_SEARCH_TABLE}({PRODUCT_SEARCH_TABLE}) VALUES ('optimize')")
+            conn.commit()
+            indexed = conn.execute(f"SELECT count(*) FROM {PRODUCT_SEARCH_TABLE}").fetchone()[0]
+            logger.info(f"Indexed {indexed} products in {time.time() - start_time:.2f} seconds")
+        else:
+            logger.info(f"Product search index already contains {indexed} rows (use --rebuild to rebuild)")
+        return indexed
+    finally:
+        conn.close()
+
+
+def drop_index(db_path: str) -> None:
+    """Xóa bảng FTS và các trigger"""
+    conn = sqlite3.connect(db_path)
+    try:
+        triggers = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", (f"{PRODUCT_SEARCH_TABLE}_%",)
+        ).fetchall()
+        for (trigger,) in triggers:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute(f"DROP TABLE IF EXISTS {PRODUCT_SEARCH_TABLE}")
+        conn.commit()
+        logger.info("Dropped product search index")
+    finally:
+        conn.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Quản lý chỉ mục FTS5 tìm kiếm sản phẩm")
+    parser.add_argument("--db", default=DB_NAME, help="Database sản phẩm (SQLite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Tạo chỉ mục và trigger đồng bộ")
+    build_parser.add_argument("--rebuild", action="store_true", help="Nạp lại toàn bộ chỉ mục")
+    subparsers.add_parser("drop", help="Xóa chỉ mục và trigger")
+
+    rewrite_parser = subparsers.add_parser("rewrite", help="In câu truy vấn sau khi viết lại LIKE thành MATCH")
+    rewrite_parser.add_argument("query", help="Câu truy vấn SQL")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+
+    if args.command == "build":
+        build_index(args.db, args.rebuild)
+    elif args.command == "drop":
+        drop_index(args.db)
+    elif args.command == "rewrite":
+        print(rewrite_like_to_match(args.query)[0])
+
+
+if __name__ == "__main__":
+    main()
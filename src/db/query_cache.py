@@ -0,0 +1,116 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from config import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL, QUERY_CACHE_MAX_RESULT_CHARS
+
+# Chuỗi trong dấu nháy đơn hoặc nháy kép được giữ nguyên khi chuẩn hóa: SQLite chấp nhận "..." là chuỗi
+# nếu không có cột trùng tên, và LIKE phân biệt hoa/thường với ký tự ngoài ASCII ("%Đậu%" khác "%đậu%")
+_STRING_LITERAL = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Chuẩn hóa câu SQL để các truy vấn chỉ khác khoảng trắng, chữ hoa/thường của từ khóa, tên cột
+    hoặc dấu ; cuối câu dùng chung một khóa. Nội dung trong '...' và "..." không bị thay đổi.
+    """
+    parts = _STRING_LITERAL.split(query.strip().rstrip(";").strip())
+    # Phần tử lẻ là chuỗi literal
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part).lower() for i, part in enumerate(parts))
+
+
+def database_version(db_path: str) -> Tuple[int, ...]:
+    """
+    Phiên bản nội dung của database: inode, mtime và kích thước của file database và file WAL.
+    Mọi commit đều ghi vào một trong hai file nên phiên bản thay đổi. PRAGMA data_version không dùng được
+    vì giá trị của nó chỉ so sánh được trên cùng một kết nối, còn mỗi thread của pool có kết nối riêng.
+    """
+    stat = os.stat(db_path)
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    try:
+        wal = os.stat(db_path + "-wal")
+        version += (wal.st_mtime_ns, wal.st_size)
+    except FileNotFoundError:
+        pass
+    return version
+
+
+class QueryResultCache:
+    """
+    Cache LRU kết quả truy vấn đã định dạng (bảng markdown), khóa theo database, câu SQL đã chuẩn hóa
+    và tham số. Mục bị bỏ khi phiên bản database thay đổi hoặc quá ttl giây.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl: float = QUERY_CACHE_TTL,
+                 max_result_chars: int = QUERY_CACHE_MAX_RESULT_CHARS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_result_chars = max_result_chars
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[Tuple[int, ...], float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(db_path: str, query: str, params: Sequence[Any] = ()) -> Tuple[Any, ...]:
+        return os.path.abspath(db_path), normalize_sql(query), tuple(params)
+
+    def get(self, key: Tuple[Any, ...], version: Tuple[int, ...]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_version, stored_at, result = entry
+            if entry_version != version:
+                self.stale += 1
+            elif time.monotonic() - stored_at > self.ttl:
+                self.expired += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple[Any, ...], version: Tuple[int, ...], result: str) -> None:
+        # Kết quả quá lớn chiếm nhiều bộ nhớ mà hiếm khi được hỏi lại nguyên văn
+        if len(result) > self.max_result_chars:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+# Cache dùng chung cho execute_query và execute_query_async
+query_cache = QueryResultCache()
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import logging
+import argparse
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import chromadb
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Đường dẫn đến ChromaDB
+CHROMA_DB_PATH = "data/chroma_db"
+COLLECTION_NAME = "knowledge_base"
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("document", pa.string()),
+    # Metadata của Chroma có kiểu linh hoạt nên được lưu dưới dạng JSON
+    ("metadata", pa.string()),
+    ("embedding", pa.list_(pa.float32())),
+])
+
+
+def export_collection(db_path: str, collection_name: str, output_path: str, batch_size: int = 1000) -> int:
+    """
+    Xuất ids, documents, metadatas và embeddings của collection ra file Parquet, theo từng batch.
+    """
+    chroma_client = chromadb.PersistentClient(path=db_path)
+    collection = chroma_client.get_collection(name=collection_name, embedding_function=None)
+    total = collection.count()
+    logger.info(f"Exporting {total} records from '{collection_name}' to {output_path}")
+
+    schema = SNAPSHOT_SCHEMA.with_metadata({
+        "collection": collection_name,
+        "collection_metadata": json.dumps(collection.metadata or {}, ensure_ascii=False),
+        "exported_at": str(int(time.time())),
+    })
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    start_time = time.time()
+    exported = 0
+    with pq.ParquetWriter(output_path, schema, compression="zstd") as writer:
+        while True:
+            results = collection.get(
+                limit=batch_size,
+                offset=exported,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            ids = results["ids"]
+            if not ids:
+                break
+
+            table = pa.table({
+                "id": ids,
+                "document": results["documents"],
+                "metadata": [json.dumps(meta or {}, ensure_ascii=False) for meta in results["metadatas"]],
+                "embedding": pa.array(
+                    [np.asarray(embedding, dtype=np.float32) for embedding in results["embeddings"]],
+                    type=pa.list_(pa.float32())
+                ),
+            }, schema=schema)
+            writer.write_table(table)
+
+            exported += len(ids)
+            logger.info(f"Exported {exported}/{total} records")
+
+    logger.info(f"Exported {exported} records in {time.time() - start_time:.1f}s "
+                f"({os.path.getsize(output_path) / (1024 * 1024):.1f} MB)")
+    return exported
+
+
+def import_collection(db_path: str, collection_name: Optional[str], input_path: str,
+                      batch_size: int = 1000) -> int:
+    """
+    Nạp snapshot Parquet vào collection theo dạng streaming, dùng lại embeddings có sẵn.
+    """
+    parquet_file = pq.ParquetFile(input_path)
+    schema_metadata = {
+        key.decode(): value.decode()
+        for key, value in (parquet_file.schema_arrow.metadata or {}).items()
+    }
+    collection_name = collection_name or schema_metadata.get("collection", COLLECTION_NAME)
+    collection_metadata = json.loads(schema_metadata.get("collection_metadata", "{}")) or {"hnsw:space": "cosine"}
+
+    chroma_client = chromadb.PersistentClient(path=db_path)
+    # Không cần embedding function vì embeddings đã có trong snapshot
+    collection = chroma_client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=None,
+        metadata=collection_metadata
+    )
+
+    max_batch_size = getattr(chroma_client, "max_batch_size", None)
+    if max_batch_size and batch_size > max_batch_size:
+        batch_size = max_batch_size
+
+    total = parquet_file.metadata.num_rows
+    logger.info(f"Importing {total} records from {input_path} into '{collection_name}'")
+
+    start_time = time.time()
+    imported = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        columns = batch.to_pydict()
+        collection.upsert(
+            ids=columns["id"],
+            documents=columns["document"],
+            metadatas=[json.loads(meta) or None for meta in columns["metadata"]],
+            embeddings=columns["embedding"]
+        )
+        imported += batch.num_rows
+        logger.info(f"Imported {imported}/{total} records")
+
+    logger.info(f"Imported {imported} records in {time.time() - start_time:.1f}s. "
+                f"Collection now contains {collection.count()} documents")
+    return imported
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Xuất/nhập snapshot collection ChromaDB dạng Parquet")
+    parser.add_argument("--db-path", default=CHROMA_DB_PATH, help="Thư mục ChromaDB")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Số bản ghi mỗi batch")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Xuất collection ra file Parquet")
+    export_parser.add_argument("output", help="Đường dẫn file .parquet")
+    export_parser.add_argument("--collection", default=COLLECTION_NAME, help="Tên collection")
+
+    import_parser = subparsers.add_parser("import", help="Nạp file Parquet vào collection")
+    import_parser.add_argument("input", help="Đường dẫn file .parquet")
+    import_parser.add_argument("--collection", default=None,
+                               help="Tên collection (mặc định: tên lưu trong snapshot)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    if args.command == "export":
+        export_collection(args.db_path, args.collection, args.output, args.batch_size)
+    elif args.command == "import":
+        import_collection(args.db_path, args.collection, args.input, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import random
+import asyncio
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from config import (
+    SQLITE_POOL_SIZE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_RETRY_ATTEMPTS,
+    SQLITE_RETRY_BASE_DELAY,
+    SQLITE_RETRY_MAX_DELAY,
+)
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def is_locked_error(error: Exception) -> bool:
+    """Lỗi tạm thời do database đang bị ghi, có thể thử lại"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class ReadOnlyConnectionPool:
+    """
+    Kết nối chỉ đọc (URI mode=ro, query_only) tới một database SQLite, mỗi thread dùng lại kết nối của mình.
+    Truy vấn async chạy trên executor riêng gồm pool_size thread nên số kết nối luôn bị giới hạn;
+    lỗi khóa database được thử lại với backoff ngẫu nhiên mà không chặn event loop.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = SQLITE_POOL_SIZE):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.queries = 0
+        self.retries = 0
+        self.connections_opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        # check_same_thread=False chỉ để close() đóng được kết nối từ thread khác
+        conn = sqlite3.connect(uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+        # Số âm: kích thước cache tính theo KiB
+        conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+        with self._lock:
+            self._connections.append(conn)
+            self.connections_opened += 1
+        logger.info(f"Opened read-only connection to {self.db_path} in {threading.current_thread().name}")
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Kết nối của thread hiện tại. Mở lại nếu file database đã bị thay thế (ví dụ khi nạp lại catalog).
+        """
+        try:
+            inode = os.stat(self.db_path).st_ino
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Database file not found: {self.db_path}")
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.inode != inode:
+            self._discard(conn)
+            conn = None
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.inode = inode
+        self.queries += 1
+        return conn
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                        thread_name_prefix=f"sqlite-ro-{Path(self.db_path).stem}")
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Chạy fn(*args) trên một thread của pool; fn lấy kết nối bằng connection()"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def run_with_retry(self, fn: Callable[..., T], *args: Any,
+                             attempts: int = SQLITE_RETRY_ATTEMPTS) -> T:
+        """
+        Như run(), thử lại khi database bị khóa với backoff lũy thừa có jitter (full jitter)
+        để các truy vấn cùng bị khóa không thử lại cùng lúc
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self.run(fn, *args)
+            except sqlite3.OperationalError as e:
+                attempt += 1
+                if not is_locked_error(e) or attempt >= attempts:
+                    raise
+                delay = random.uniform(0, min(SQLITE_RETRY_MAX_DELAY, SQLITE_RETRY_BASE_DELAY * 2 ** attempt))
+                self.retries += 1
+                logger.warning(f"Database {self.db_path} is locked, retrying in {delay:.2f}s "
+                               f"(attempt {attempt}/{attempts})")
+                await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        """Đóng tất cả kết nối và executor"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        # Kết nối thread-local cũ không còn dùng được, các thread sẽ mở kết nối mới
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "db_path": self.db_path,
+            "pool_size": self.pool_size,
+            "open_connections": len(self._connections),
+            "connections_opened": self.connections_opened,
+            "queries": self.queries,
+            "retries": self.retries,
+        }
+
+
+# Một pool cho mỗi file database
+_pools: Dict[str, ReadOnlyConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ReadOnlyConnectionPool:
+    """Pool chỉ đọc dùng chung cho db_path"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ReadOnlyConnectionPool(db_path))
+    return pool
+
+
+def close_pools() -> None:
+    """Đóng tất cả pool, gọi khi ứng dụng dừng"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def get_pool_stats() -> List[Dict[str, Any]]:
+    return [pool.get_stats() for pool in _pools.values()]
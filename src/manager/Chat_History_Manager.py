@@ -1,7 +1,7 @@
 import os
 import sqlite3
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
@@ -42,6 +42,15 @@ class ChatHistoryManager:
                 """)
                 # Create an index on user_id for faster queries
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_id ON chat_history(user_id)")
+                # Tóm tắt hội thoại theo từng chat, cập nhật dần đến lượt last_history_id
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS chat_summaries (
+                        user_id INTEGER PRIMARY KEY,
+                        summary TEXT NOT NULL,
+                        last_history_id INTEGER NOT NULL,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
                 
                 conn.commit()
                 logger.info("Database schema initialized successfully")
@@ -117,6 +126,69 @@ class ChatHistoryManager:
             logger.error(f"Error retrieving chat history: {str(e)}")
             return []
     
+    def get_chat_history_after(self, user_id: int, after_id: int, limit: int = 20) -> List[Dict]:
+        """
+        Get chat history entries newer than after_id, oldest first
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+
+                cursor.execute(
+                    """
+                    SELECT * FROM chat_history
+                    WHERE user_id = ? AND id > ?
+                    ORDER BY id ASC LIMIT ?
+                    """,
+                    (user_id, after_id, limit)
+                )
+
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error retrieving chat history: {str(e)}")
+            return []
+
+    def get_summary(self, user_id: int) -> Optional[Dict]:
+        """
+        Get the rolling conversation summary of a user, None if there is none yet
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM chat_summaries WHERE user_id = ?", (user_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error retrieving chat summary: {str(e)}")
+            return None
+
+    def save_summary(self, user_id: int, summary: str, last_history_id: int) -> bool:
+        """
+        Store the rolling conversation summary covering history up to last_history_id
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    INSERT INTO chat_summaries (user_id, summary, last_history_id, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        summary = excluded.summary,
+                        last_history_id = excluded.last_history_id,
+                        updated_at = excluded.updated_at
+                    """,
+                    (user_id, summary, last_history_id)
+                )
+                conn.commit()
+                logger.info(f"Updated chat summary for user {user_id}")
+                return True
+        except Exception as e:
+            logger.error(f"Error saving chat summary: {str(e)}")
+            return False
+
     def get_conversation_text_history(self, user_id: int, limit: int = 5) -> str:
         """
         Get formatted chat history text for a user
@@ -168,6 +240,10 @@ class ChatHistoryManager:
                     "DELETE FROM chat_history WHERE user_id = ?",
                     (user_id,)
                 )
+                cursor.execute(
+                    "DELETE FROM chat_summaries WHERE user_id = ?",
+                    (user_id,)
+                )
                 
                 conn.commit()
                 logger.info(f"Cleared chat history for user {user_id}")
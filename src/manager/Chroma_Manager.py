@@ -1,16 +1,29 @@
+import asyncio
+import time
 import chromadb
 from chromadb.utils import embedding_functions
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Any, Tuple, Union
+from typing import List, Dict, Any, Tuple, Union, Iterable, Iterator, Optional, Callable, Awaitable
 import logging
 
 from src.utils import setup_logger
-from config import EMBEDDINGS_MODEL, RERANKER_MODEL
+from config import EMBEDDINGS_MODEL, RERANKER_MODEL, INGEST_BATCH_SIZE, DELETE_BATCH_SIZE
 from src.core.reranker import DocumentReranker
+from src.manager.Process_manager import load_document_pages, PyMuPDFBytesLoader
 
 logger = setup_logger("src", "logs/src.log")
 
+# Nguồn gốc tài liệu, chỉ tài liệu người dùng tải lên mới bị hết hạn theo TTL
+ORIGIN_UPLOAD = "upload"
+# Dữ liệu catalog (CSV/TXT nạp bằng ingest_file), không bao giờ hết hạn
+ORIGIN_CATALOG = "catalog"
+
+# Callback tiến độ: nhận (số trang đã đọc, số chunk đã lưu)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+# Hook đo thời gian: nhận (giai đoạn "parse" | "split" | "embed" | "add", số giây), dùng cho benchmark
+StageHook = Callable[[str, float], None]
+
 
 class ChromaDBManager:
     """Quản lý ChromaDB và các thao tác liên quan"""
@@ -97,17 +110,21 @@ class ChromaDBManager:
         # logger.info(f"Tìm kiếm cho câu truy vấn: '{query}'")
         # logger.info(f"Collection chứa {self.knowledge_collection.count()} tài liệu")
 
+        # Các lời gọi ChromaDB và reranker là đồng bộ, chạy trong thread để không chặn event loop
+        collection_count = await asyncio.to_thread(self.knowledge_collection.count)
+
         # Nếu collection trống, trả về sớm
-        if self.knowledge_collection.count() == 0:
+        if collection_count == 0:
             logger.warning("Collection trống, không có tài liệu để tìm kiếm")
             return ("Collection trống. Vui lòng thêm tài liệu trước.",
                     []) if return_scores else "Collection trống. Vui lòng thêm tài liệu trước."
 
         try:
             # Thực hiện tìm kiếm ban đầu với số lượng kết quả lớn hơn để reranking
-            initial_limit = min(5, self.knowledge_collection.count()) if use_reranker and self.reranker else limit
+            initial_limit = min(5, collection_count) if use_reranker and self.reranker else limit
 
-            results = self.knowledge_collection.query(
+            results = await asyncio.to_thread(
+                self.knowledge_collection.query,
                 query_texts=[query],
                 n_results=initial_limit,
                 include=['documents', 'metadatas', 'distances']
@@ -150,7 +167,7 @@ class ChromaDBManager:
             if use_reranker and self.reranker and self.reranker.is_initialized():
                 logger.info("Áp dụng reranking cho kết quả")
                 try:
-                    reranked_docs = self.reranker.rerank(query, document_objects, top_n=limit)
+                    reranked_docs = await asyncio.to_thread(self.reranker.rerank, query, document_objects, top_n=limit)
 
                     for doc in reranked_docs:
                         final_results.append((doc['document'], doc['metadata'], doc['rerank_score']))
@@ -196,76 +213,376 @@ class ChromaDBManager:
         return formatted_results
 
     async def process_pdf(self, pdf_path: str, file_name: str,
-                          chunk_size: int = 1000, chunk_overlap: int = 100) -> str:
+                          chunk_size: int = 1000, chunk_overlap: int = 100,
+                          progress_callback: Optional[ProgressCallback] = None) -> str:
         """
-        Xử lý PDF và thêm vào ChromaDB
+        Xử lý PDF và thêm vào ChromaDB theo dạng streaming
         """
         if not self.is_initialized():
             logger.error("ChromaDB chưa được khởi tạo. Không thể xử lý PDF.")
             return "ChromaDB không sẵn sàng. Không thể xử lý PDF lúc này."
 
         try:
-            # Đọc file PDF
-            loader = PyPDFLoader(pdf_path)
-            pages = loader.load()
-
-            # Chia tài liệu thành các chunk
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-            chunks = text_splitter.split_documents(pages)
-
-            # Thêm vào ChromaDB
-            documents = []
-            metadatas = []
-            ids = []
-
-            for i, chunk in enumerate(chunks):
-                document_id = f"{file_name.replace('.pdf', '')}-chunk-{i}"
-                documents.append(chunk.page_content)
-                metadatas.append({"source": file_name, "page": chunk.metadata.get("page", i + 1)})
-                ids.append(document_id)
-
-            # Thêm tất cả các chunk cùng một lúc để tăng hiệu suất
-            if documents:
-                self.knowledge_collection.add(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-
-            logger.info(f"Đã xử lý và lưu trữ {len(chunks)} chunk từ {file_name}")
-            return f"Đã xử lý {len(chunks)} đoạn văn bản từ file {file_name}. Bạn có thể đặt câu hỏi về nội dung của tài liệu này."
+            total_chunks = await self.ingest_pdf(pdf_path, file_name, chunk_size, chunk_overlap,
+                                                 progress_callback)
+            return self.format_ingest_result(file_name, total_chunks)
 
         except Exception as e:
             logger.error(f"Lỗi khi xử lý PDF: {str(e)}")
             return f"Lỗi khi xử lý file PDF: {str(e)}"
 
-    def delete_documents(self, source: str = None) -> str:
+    async def ingest_pdf(self, pdf_path: str, file_name: str,
+                         chunk_size: int = 1000, chunk_overlap: int = 100,
+                         progress_callback: Optional[ProgressCallback] = None,
+                         chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> int:
+        """
+        Ingest PDF và trả về số chunk đã lưu, ném exception khi lỗi.
+        chat_id/file_unique_id gắn tài liệu với đoạn chat đã tải lên để các chat trùng tên file không đè nhau.
+        """
+        if not self.is_initialized():
+            raise RuntimeError("ChromaDB không sẵn sàng")
+
+        # Đọc từng trang PDF thay vì load toàn bộ file vào bộ nhớ
+        loader = PyPDFLoader(pdf_path)
+        total_chunks = await self.ingest_documents(
+            loader.lazy_load(),
+            file_name,
+            ORIGIN_UPLOAD,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            progress_callback=progress_callback,
+            chat_id=chat_id,
+            file_unique_id=file_unique_id
+        )
+
+        logger.info(f"Đã xử lý và lưu trữ {total_chunks} chunk từ {file_name}")
+        return total_chunks
+
+    async def ingest_pdf_bytes(self, data: Union[bytes, bytearray], file_name: str,
+                               chunk_size: int = 1000, chunk_overlap: int = 100,
+                               progress_callback: Optional[ProgressCallback] = None,
+                               chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> int:
+        """
+        Ingest PDF trực tiếp từ bộ nhớ, không ghi file tạm
+        """
+        if not self.is_initialized():
+            raise RuntimeError("ChromaDB không sẵn sàng")
+
+        total_chunks = await self.ingest_documents(
+            PyMuPDFBytesLoader(data, file_name).lazy_load(),
+            file_name,
+            ORIGIN_UPLOAD,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            progress_callback=progress_callback,
+            chat_id=chat_id,
+            file_unique_id=file_unique_id
+        )
+
+        logger.info(f"Đã xử lý và lưu trữ {total_chunks} chunk từ {file_name} (in-memory)")
+        return total_chunks
+
+    async def ingest_file(self, file_path: str, file_name: str, document_type: str,
+                          origin: str = ORIGIN_CATALOG, chunk_size: int = 1000, chunk_overlap: int = 100,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> int:
+        """
+        Ingest file PDF/CSV/TXT bằng loader streaming, trả về số chunk đã lưu.
+        Mặc định là dữ liệu catalog (không hết hạn); file người dùng tải lên truyền origin=ORIGIN_UPLOAD
+        cùng chat_id/file_unique_id của lần tải lên.
+        """
+        if not self.is_initialized():
+            raise RuntimeError("ChromaDB không sẵn sàng")
+
+        total_chunks = await self.ingest_documents(
+            load_document_pages(file_path, document_type),
+            file_name,
+            origin,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            progress_callback=progress_callback,
+            chat_id=chat_id,
+            file_unique_id=file_unique_id
+        )
+
+        logger.info(f"Đã xử lý và lưu trữ {total_chunks} chunk từ {file_name}")
+        return total_chunks
+
+    @staticmethod
+    def format_ingest_result(file_name: str, total_chunks: int) -> str:
+        return f"Đã xử lý {total_chunks} đoạn văn bản từ file {file_name}. Bạn có thể đặt câu hỏi về nội dung của tài liệu này."
+
+    async def ingest_documents(self, pages: Iterable, file_name: str, origin: str,
+                               chunk_size: int = 1000, chunk_overlap: int = 100,
+                               batch_size: int = INGEST_BATCH_SIZE,
+                               progress_callback: Optional[ProgressCallback] = None,
+                               stage_hook: Optional[StageHook] = None,
+                               chat_id: Optional[int] = None, file_unique_id: Optional[str] = None) -> int:
+        """
+        Pipeline streaming: trang -> chia chunk -> embedding theo batch -> thêm vào ChromaDB theo batch.
+        Bộ nhớ chỉ giữ tối đa một batch chunk tại một thời điểm.
+        origin được lưu trong metadata; chỉ chunk có origin ORIGIN_UPLOAD mới có uploaded_at và bị hết hạn.
+        stage_hook nhận thời gian của từng giai đoạn cho mỗi trang (parse, split) và mỗi batch (embed, add).
+        Tài liệu tải lên từ chat có chat_id trong metadata và ID chunk theo (chat_id, file_unique_id),
+        nên cùng tên file ở hai chat khác nhau (hoặc hai phiên bản trong một chat) không trùng ID.
+        """
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        batch_size = self._effective_batch_size(batch_size)
+        if chat_id is not None:
+            id_prefix = f"{chat_id}-{file_unique_id or file_name}"
+        else:
+            id_prefix = file_name.replace('.pdf', '') if file_name.lower().endswith('.pdf') else file_name
+        scope = self._chat_metadata(chat_id, file_unique_id)
+        uploaded_at = int(time.time()) if origin == ORIGIN_UPLOAD else None
+
+        progress = {"pages": 0, "chunks": 0}
+        chunk_iter = self._iter_chunks(pages, text_splitter, progress, stage_hook)
+
+        while True:
+            # Parse và chia chunk chạy trong thread để không chặn event loop
+            batch = await asyncio.to_thread(self._take_batch, chunk_iter, batch_size)
+            if not batch:
+                break
+
+            await asyncio.to_thread(self._add_batch, batch, file_name, id_prefix, origin, uploaded_at, stage_hook,
+                                    scope)
+            progress["chunks"] += len(batch)
+            logger.debug(f"Đã lưu batch {len(batch)} chunk từ {file_name} (tổng {progress['chunks']})")
+
+            if progress_callback:
+                await self._notify_progress(progress_callback, progress)
+
+        if progress_callback:
+            await self._notify_progress(progress_callback, progress)
+
+        return progress["chunks"]
+
+    def _effective_batch_size(self, batch_size: int) -> int:
+        """
+        Giới hạn kích thước batch theo max batch size của ChromaDB
+        """
+        max_batch_size = getattr(self.chroma_client, "max_batch_size", None)
+        if max_batch_size:
+            return max(1, min(batch_size, max_batch_size))
+        return max(1, batch_size)
+
+    @staticmethod
+    def _iter_chunks(pages: Iterable, text_splitter: RecursiveCharacterTextSplitter,
+                     progress: Dict[str, int], stage_hook: Optional[StageHook] = None) -> Iterator[Tuple[int, Any]]:
+        """
+        Sinh lần lượt các chunk từ từng trang, kèm chỉ số chunk toàn cục
+        """
+        index = 0
+        pages = iter(pages)
+        while True:
+            # Loader đọc trang lười nên thời gian lấy trang tiếp theo chính là thời gian parse
+            start = time.perf_counter()
+            page = next(pages, None)
+            if page is None:
+                break
+            split_start = time.perf_counter()
+            chunks = text_splitter.split_documents([page])
+            if stage_hook:
+                stage_hook("parse", split_start - start)
+                stage_hook("split", time.perf_counter() - split_start)
+
+            progress["pages"] += 1
+            for chunk in chunks:
+                yield index, chunk
+                index += 1
+
+    @staticmethod
+    def _take_batch(chunk_iter: Iterator[Tuple[int, Any]], batch_size: int) -> List[Tuple[int, Any]]:
+        """
+        Lấy tối đa batch_size chunk tiếp theo từ iterator
+        """
+        batch = []
+        for item in chunk_iter:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                break
+        return batch
+
+    def _add_batch(self, batch: List[Tuple[int, Any]], file_name: str, id_prefix: str,
+                   origin: str, uploaded_at: Optional[int], stage_hook: Optional[StageHook] = None,
+                   scope: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Tính embedding cho một batch và thêm vào collection
+        """
+        documents = []
+        metadatas = []
+        ids = []
+
+        for i, chunk in batch:
+            metadata = {"source": file_name}
+            # Giữ vị trí gốc của chunk: trang PDF, dòng CSV hoặc phần văn bản
+            for key in ("page", "row", "part"):
+                if key in chunk.metadata:
+                    metadata[key] = chunk.metadata[key]
+            if len(metadata) == 1:
+                metadata["page"] = i + 1
+            metadata["origin"] = origin
+            if uploaded_at is not None:
+                metadata["uploaded_at"] = uploaded_at
+            if scope:
+                metadata.update(scope)
+            metadata["size"] = len(chunk.page_content.encode("utf-8"))
+
+            documents.append(chunk.page_content)
+            metadatas.append(metadata)
+            ids.append(f"{id_prefix}-chunk-{i}")
+
+        start = time.perf_counter()
+        embeddings = self.embedding_function(documents)
+        embedded = time.perf_counter()
+        self.knowledge_collection.add(
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=embeddings,
+            ids=ids
+        )
+        if stage_hook:
+            stage_hook("embed", embedded - start)
+            stage_hook("add", time.perf_counter() - embedded)
+
+    @staticmethod
+    async def _notify_progress(progress_callback: ProgressCallback, progress: Dict[str, int]) -> None:
+        """
+        Gọi callback tiến độ, lỗi của callback không làm hỏng pipeline
+        """
+        try:
+            await progress_callback(progress["pages"], progress["chunks"])
+        except Exception as e:
+            logger.warning(f"Lỗi khi báo cáo tiến độ: {str(e)}")
+
+    @staticmethod
+    def _chat_metadata(chat_id: Optional[int], file_unique_id: Optional[str]) -> Dict[str, Any]:
+        """Metadata gắn chunk với chat đã tải tài liệu lên, rỗng với dữ liệu catalog"""
+        if chat_id is None:
+            return {}
+        metadata = {"chat_id": chat_id}
+        if file_unique_id:
+            metadata["file_unique_id"] = file_unique_id
+        return metadata
+
+    @staticmethod
+    def _source_filter(source: str, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bộ lọc một nguồn tài liệu: tài liệu tải lên của một chat, hoặc dữ liệu catalog khi không có chat_id
+        """
+        if chat_id is not None:
+            return {"$and": [{"source": source}, {"chat_id": chat_id}]}
+        return {"$and": [{"source": source}, {"origin": ORIGIN_CATALOG}]}
+
+    def delete_documents(self, source: str = None, chat_id: Optional[int] = None) -> str:
         """
-        Xóa tài liệu từ ChromaDB
+        Xóa tài liệu từ ChromaDB: một nguồn của một chat (hoặc của catalog khi không có chat_id), hay toàn bộ
         """
         if not self.is_initialized():
             return "ChromaDB không sẵn sàng."
 
         try:
             if source:
-                # Lấy ID cần xóa
-                results = self.knowledge_collection.get(
-                    where={"source": source}
-                )
-                if results and results.get('ids'):
-                    self.knowledge_collection.delete(
-                        ids=results['ids']
-                    )
-                    return f"Đã xóa {len(results['ids'])} chunk từ nguồn {source}."
-                return f"Không tìm thấy tài liệu từ nguồn {source}."
+                deleted = self.delete_where(self._source_filter(source, chat_id))
+                scope = f"chat {chat_id}" if chat_id is not None else "catalog"
+                if deleted:
+                    return f"Đã xóa {deleted} chunk từ nguồn {source} ({scope})."
+                return f"Không tìm thấy tài liệu từ nguồn {source} ({scope})."
             else:
                 # Xóa tất cả
-                self.knowledge_collection.delete()
-                return "Đã xóa tất cả tài liệu từ cơ sở dữ liệu."
+                deleted = self.delete_where(None)
+                return f"Đã xóa tất cả {deleted} chunk từ cơ sở dữ liệu."
 
         except Exception as e:
             logger.error(f"Lỗi khi xóa tài liệu: {str(e)}")
-            return f"Lỗi khi xóa tài liệu: {str(e)}"
\ No newline at end of file
+            return f"Lỗi khi xóa tài liệu: {str(e)}"
+
+    def delete_where(self, where: Optional[Dict[str, Any]], batch_size: int = DELETE_BATCH_SIZE) -> int:
+        """
+        Xóa các chunk thỏa mãn bộ lọc theo từng batch, chỉ lấy ID để giới hạn bộ nhớ.
+        Trả về số chunk đã xóa.
+        """
+        deleted = 0
+        while True:
+            results = self.knowledge_collection.get(where=where, limit=batch_size, include=[])
+            ids = results.get('ids') if results else None
+            if not ids:
+                break
+            self.knowledge_collection.delete(ids=ids)
+            deleted += len(ids)
+
+        if deleted:
+            logger.info(f"Đã xóa {deleted} chunk với bộ lọc {where}")
+        return deleted
+
+    def has_source(self, source: str, chat_id: Optional[int] = None) -> bool:
+        """Kiểm tra nguồn tài liệu của chat (hoặc của catalog) còn tồn tại trong collection"""
+        if not self.is_initialized():
+            return False
+        results = self.knowledge_collection.get(where=self._source_filter(source, chat_id), limit=1, include=[])
+        return bool(results and results.get('ids'))
+
+    def list_sources(self, chat_id: Optional[int] = None, page_size: int = DELETE_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Liệt kê các nguồn tài liệu theo (chat, tên nguồn) với số chunk, dung lượng (bytes) và thời điểm tải lên,
+        duyệt collection theo từng trang metadata. Truyền chat_id để chỉ lấy tài liệu của một chat.
+        """
+        if not self.is_initialized():
+            return []
+
+        where = {"chat_id": chat_id} if chat_id is not None else None
+        sources: Dict[Tuple[Optional[int], str], Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            results = self.knowledge_collection.get(where=where, limit=page_size, offset=offset,
+                                                    include=['metadatas'])
+            ids = results.get('ids') if results else None
+            if not ids:
+                break
+
+            metadatas = results['metadatas']
+            # Chunk cũ chưa có metadata size: lấy nội dung của riêng các chunk này để tính
+            missing = [chunk_id for chunk_id, meta in zip(ids, metadatas) if "size" not in (meta or {})]
+            sizes = {}
+            if missing:
+                docs = self.knowledge_collection.get(ids=missing, include=['documents'])
+                sizes = {chunk_id: len((doc or "").encode("utf-8"))
+                         for chunk_id, doc in zip(docs['ids'], docs['documents'])}
+
+            for chunk_id, meta in zip(ids, metadatas):
+                meta = meta or {}
+                key = (meta.get('chat_id'), meta.get('source', 'Unknown'))
+                entry = sources.setdefault(key, {
+                    "source": meta.get('source', 'Unknown'),
+                    "chat_id": meta.get('chat_id'),
+                    "chunks": 0,
+                    "size": 0,
+                    "origin": meta.get('origin'),
+                    "uploaded_at": None,
+                })
+                entry["chunks"] += 1
+                entry["size"] += meta.get("size", sizes.get(chunk_id, 0))
+                if meta.get("uploaded_at"):
+                    entry["uploaded_at"] = max(entry["uploaded_at"] or 0, meta["uploaded_at"])
+
+            offset += len(ids)
+
+        return sorted(sources.values(), key=lambda entry: entry["chunks"], reverse=True)
+
+    def expire_documents(self, ttl_seconds: int) -> int:
+        """
+        Xóa các tài liệu người dùng tải lên cũ hơn ttl_seconds, trả về số chunk đã xóa
+        """
+        if not self.is_initialized() or ttl_seconds <= 0:
+            return 0
+
+        cutoff = int(time.time()) - ttl_seconds
+        return self.delete_where({
+            "$and": [
+                {"origin": ORIGIN_UPLOAD},
+                {"uploaded_at": {"$lt": cutoff}},
+            ]
+        })
@@ -0,0 +1,312 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
+
+from config import (
+    INGEST_QUEUE_DB,
+    INGEST_WORKERS,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_RETRY_DELAY,
+    INGEST_POLL_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Handler xử lý job, trả về thông điệp kết quả
+JobHandler = Callable[[Dict], Awaitable[str]]
+# Callback khi job kết thúc: (job, result, error, will_retry)
+JobFinishedCallback = Callable[[Dict, Optional[str], Optional[str], bool], Awaitable[None]]
+
+
+class IngestionJobQueue:
+    """
+    Hàng đợi job ingest tài liệu lưu trong SQLite, tồn tại qua các lần khởi động lại
+    """
+
+    def __init__(self, db_path: str = INGEST_QUEUE_DB, max_attempts: int = INGEST_MAX_ATTEMPTS,
+                 retry_delay: float = INGEST_RETRY_DELAY):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        # Ensure database directory exists
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._init_db()
+        logger.info(f"Initialized IngestionJobQueue with database at {self.db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Initialize the job table."""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_unique_id TEXT NOT NULL,
+                    file_name TEXT,
+                    file_size INTEGER,
+                    status_message_id INTEGER,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (chat_id, file_unique_id)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON ingestion_jobs(status, available_at)")
+            conn.commit()
+
+    def enqueue(self, chat_id: int, file_id: str, file_unique_id: str, file_name: str,
+                file_size: Optional[int] = None, force: bool = False) -> Tuple[Dict, bool]:
+        """
+        Thêm job mới. Trả về (job, created); created=False nếu file đã có job trước đó.
+        Job thất bại hẳn (hoặc đã xong nếu force=True) được đưa lại vào hàng đợi.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE chat_id = ? AND file_unique_id = ?",
+                (chat_id, file_unique_id)
+            ).fetchone()
+
+            requeue_statuses = (STATUS_FAILED, STATUS_DONE) if force else (STATUS_FAILED,)
+            if row and row["status"] not in requeue_statuses:
+                conn.commit()
+                return dict(row), False
+
+            if row:
+                conn.execute(
+                    """
+                    UPDATE ingestion_jobs
+                    SET status = ?, attempts = 0, error = NULL, result = NULL, file_id = ?,
+                        available_at = 0, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    """,
+                    (STATUS_QUEUED, file_id, row["id"])
+                )
+                job_id = row["id"]
+            else:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO ingestion_jobs (chat_id, file_id, file_unique_id, file_name, file_size)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (chat_id, file_id, file_unique_id, file_name, file_size)
+                )
+                job_id = cursor.lastrowid
+            conn.commit()
+
+            job = conn.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+            logger.info(f"Queued ingestion job {job_id} for chat {chat_id}: {file_name}")
+            return dict(job), True
+
+    def set_status_message(self, job_id: int, message_id: int) -> None:
+        """Lưu message_id của tin nhắn trạng thái để worker cập nhật tiến độ"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingestion_jobs SET status_message_id = ? WHERE id = ?",
+                (message_id, job_id)
+            )
+            conn.commit()
+
+    def claim_next(self) -> Optional[Dict]:
+        """
+        Lấy job kế tiếp đã đến hạn và chuyển sang trạng thái running
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT * FROM ingestion_jobs
+                WHERE status = ? AND available_at <= ?
+                ORDER BY id LIMIT 1
+                """,
+                (STATUS_QUEUED, time.time())
+            ).fetchone()
+            if not row:
+                conn.commit()
+                return None
+
+            conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (STATUS_RUNNING, row["id"])
+            )
+            conn.commit()
+
+            job = dict(row)
+            job["status"] = STATUS_RUNNING
+            job["attempts"] += 1
+            return job
+
+    def mark_done(self, job_id: int, result: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = ?, result = ?, error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (STATUS_DONE, result, job_id)
+            )
+            conn.commit()
+
+    def mark_failed(self, job: Dict, error: str) -> bool:
+        """
+        Ghi nhận lỗi. Trả về True nếu job sẽ được thử lại, False nếu đã hết lượt.
+        """
+        will_retry = job["attempts"] < self.max_attempts
+        status = STATUS_QUEUED if will_retry else STATUS_FAILED
+        # Exponential backoff giữa các lần thử
+        available_at = time.time() + self.retry_delay * (2 ** (job["attempts"] - 1)) if will_retry else 0
+
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = ?, error = ?, available_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (status, error[:1000], available_at, job["id"])
+            )
+            conn.commit()
+        return will_retry
+
+    def requeue_running(self) -> int:
+        """
+        Đưa các job đang chạy dở (do bot bị dừng) trở lại hàng đợi
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = ?, available_at = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE status = ?
+                """,
+                (STATUS_QUEUED, STATUS_RUNNING)
+            )
+            conn.commit()
+            if cursor.rowcount:
+                logger.info(f"Requeued {cursor.rowcount} interrupted ingestion jobs")
+            return cursor.rowcount
+
+    def get_status_counts(self, chat_id: Optional[int] = None) -> Dict[str, int]:
+        query = "SELECT status, COUNT(*) AS total FROM ingestion_jobs"
+        params: tuple = ()
+        if chat_id is not None:
+            query += " WHERE chat_id = ?"
+            params = (chat_id,)
+        query += " GROUP BY status"
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return {row["status"]: row["total"] for row in rows}
+
+    def get_jobs(self, chat_id: int, limit: int = 10) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+                (chat_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class IngestionWorkerPool:
+    """
+    Các worker asyncio lấy job từ IngestionJobQueue và xử lý tuần tự từng job
+    """
+
+    def __init__(self, job_queue: IngestionJobQueue, handler: JobHandler,
+                 on_finished: Optional[JobFinishedCallback] = None,
+                 num_workers: int = INGEST_WORKERS, poll_interval: float = INGEST_POLL_INTERVAL):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.on_finished = on_finished
+        self.num_workers = max(1, num_workers)
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """Khởi động worker, phải được gọi trong event loop đang chạy"""
+        if self._tasks:
+            return
+        self.job_queue.requeue_running()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"ingestion-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Stopped ingestion workers")
+
+    def notify(self) -> None:
+        """Đánh thức worker khi có job mới"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job = await asyncio.to_thread(self.job_queue.claim_next)
+            if job is None:
+                await self._wait_for_jobs()
+                continue
+
+            logger.info(f"Worker {worker_id} running job {job['id']} (attempt {job['attempts']})")
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                # Job sẽ được requeue ở lần khởi động kế tiếp
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion job {job['id']} failed: {str(e)}")
+                will_retry = await asyncio.to_thread(self.job_queue.mark_failed, job, str(e))
+                await self._finished(job, None, str(e), will_retry)
+                continue
+
+            await asyncio.to_thread(self.job_queue.mark_done, job["id"], result)
+            logger.info(f"Ingestion job {job['id']} done")
+            await self._finished(job, result, None, False)
+
+    async def _finished(self, job: Dict, result: Optional[str], error: Optional[str], will_retry: bool) -> None:
+        if not self.on_finished:
+            return
+        try:
+            await self.on_finished(job, result, error, will_retry)
+        except Exception as e:
+            logger.warning(f"Error notifying result of job {job['id']}: {str(e)}")
+
+    async def _wait_for_jobs(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
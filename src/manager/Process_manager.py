@@ -1,19 +1,110 @@
 import os
+import csv
 import tempfile
-from typing import List, Dict, Optional, Tuple
-import aiohttp
+from typing import List, Dict, Optional, Tuple, Iterator, Union
 from functools import partial
-from langchain.document_loaders import PyPDFLoader, TextLoader, CSVLoader
+import fitz
+from langchain.document_loaders import PyPDFLoader
+from langchain.document_loaders.base import BaseLoader
+from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from src.utils import setup_logger
+from config import MAX_DOWNLOAD_BYTES
+from src.utils import setup_logger, stream_download
 
 logger = setup_logger("src", "logs/src.log")
 
+
+class StreamingCSVLoader(BaseLoader):
+    """Read a CSV file in row batches, yielding one Document per batch"""
+
+    def __init__(self, file_path: str, rows_per_document: int = 50, encoding: str = 'utf-8'):
+        self.file_path = file_path
+        self.rows_per_document = rows_per_document
+        self.encoding = encoding
+
+    def lazy_load(self) -> Iterator[Document]:
+        source = os.path.basename(self.file_path)
+        with open(self.file_path, newline='', encoding=self.encoding) as f:
+            reader = csv.DictReader(f)
+            rows = []
+            first_row = 0
+            for i, row in enumerate(reader):
+                # Same "column: value" layout as langchain's CSVLoader
+                rows.append("\n".join(f"{key}: {value}" for key, value in row.items()))
+                if len(rows) >= self.rows_per_document:
+                    yield Document(page_content="\n\n".join(rows), metadata={"source": source, "row": first_row})
+                    rows = []
+                    first_row = i + 1
+            if rows:
+                yield Document(page_content="\n\n".join(rows), metadata={"source": source, "row": first_row})
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+
+class StreamingTextLoader(BaseLoader):
+    """Read a text file in fixed-size windows cut at line or word boundaries"""
+
+    def __init__(self, file_path: str, window_size: int = 64 * 1024, encoding: str = 'utf-8'):
+        self.file_path = file_path
+        self.window_size = window_size
+        self.encoding = encoding
+
+    def lazy_load(self) -> Iterator[Document]:
+        source = os.path.basename(self.file_path)
+        part = 0
+        carry = ""
+        with open(self.file_path, encoding=self.encoding) as f:
+            while True:
+                block = f.read(self.window_size)
+                if not block:
+                    break
+                text = carry + block
+
+                # Keep the trailing partial line/word for the next window
+                cut = text.rfind("\n")
+                if cut < len(text) // 2:
+                    cut = text.rfind(" ")
+                if cut <= 0:
+                    cut = len(text)
+                carry = text[cut:]
+                text = text[:cut]
+
+                if text.strip():
+                    part += 1
+                    yield Document(page_content=text, metadata={"source": source, "part": part})
+        if carry.strip():
+            yield Document(page_content=carry, metadata={"source": source, "part": part + 1})
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+
+class PyMuPDFBytesLoader(BaseLoader):
+    """Parse a PDF directly from an in-memory buffer, one Document per page"""
+
+    def __init__(self, data: Union[bytes, bytearray], source: str):
+        self.data = data
+        self.source = source
+
+    def lazy_load(self) -> Iterator[Document]:
+        with fitz.open(stream=self.data, filetype="pdf") as pdf:
+            for page_number, page in enumerate(pdf):
+                # Zero-based page numbers, like PyPDFLoader
+                yield Document(
+                    page_content=page.get_text(),
+                    metadata={"source": self.source, "page": page_number}
+                )
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+
 DOCUMENT_LOADERS = {
     'pdf': PyPDFLoader,
-    'txt': TextLoader,
-    'csv': CSVLoader
+    'txt': StreamingTextLoader,
+    'csv': StreamingCSVLoader
 }
 
 TEXT_SPLITTER = partial(
@@ -29,31 +120,57 @@ async def download_file(url: str, file_extension: str = '.pdf', source: str = 'u
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
             file_path = temp_file.name
 
+        max_bytes = kwargs.get('max_bytes', MAX_DOWNLOAD_BYTES)
+
         if source == 'url':
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=30) as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to download, status: {response.status}")
-                        return None
-                    with open(file_path, 'wb') as f:
-                        f.write(await response.read())
+            if not await stream_download(url, file_path, max_bytes=max_bytes):
+                _remove_file(file_path)
+                return None
         elif source == 'telegram':
             bot, file_id = kwargs.get('bot'), kwargs.get('file_id')
             if not bot or not file_id:
                 logger.error("Missing bot or file_id for Telegram download")
+                _remove_file(file_path)
                 return None
             file = await bot.get_file(file_id)
+            if file.file_size and file.file_size > max_bytes:
+                logger.error(f"Telegram file too large: {file.file_size} bytes (limit {max_bytes})")
+                _remove_file(file_path)
+                return None
             await file.download_to_drive(file_path)
         else:
             logger.error(f"Unsupported source: {source}")
+            _remove_file(file_path)
             return None
 
         return file_path
     except Exception as e:
         logger.error(f"Error downloading file from {source}: {str(e)}")
+        if 'file_path' in locals():
+            _remove_file(file_path)
         return None
 
 
+def _remove_file(file_path: str) -> None:
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def load_document_pages(document_path: str, document_type: str = 'pdf') -> Iterator[Document]:
+    """Lazily yield pages / row batches / text windows of a document"""
+    document_type = document_type.lower()
+    if document_type not in DOCUMENT_LOADERS:
+        raise ValueError(f"Unsupported document type: {document_type}")
+    return DOCUMENT_LOADERS[document_type](document_path).lazy_load()
+
+
+def iter_document_chunks(document_path: str, document_type: str = 'pdf') -> Iterator[Document]:
+    """Lazily yield chunks of a document, splitting one page at a time"""
+    text_splitter = TEXT_SPLITTER()
+    for page in load_document_pages(document_path, document_type):
+        yield from text_splitter.split_documents([page])
+
+
 async def process_document(document_path: str, document_type: str = 'pdf', extract_full: bool = False) -> Tuple[
     List[str], List[Dict]]:
     """Process document - returns either chunks or full text based on extract_full flag"""
@@ -63,26 +180,19 @@ async def process_document(document_path: str, document_type: str = 'pdf', extra
             logger.error(f"Unsupported document type: {document_type}")
             return [], []
 
-        # Load document
-        loader = DOCUMENT_LOADERS[document_type](document_path)
-        pages = loader.load()
-
         if extract_full and document_type == 'pdf':
+            pages = load_document_pages(document_path, document_type)
             return ["\n\n".join([page.page_content for page in pages])], [{"source": os.path.basename(document_path)}]
 
-        # Split text into chunks
-        text_splitter = TEXT_SPLITTER()
-        chunks = text_splitter.split_documents(pages)
-
         # Extract text and metadata
-        text_chunks = [chunk.page_content for chunk in chunks]
-        metadata_chunks = [
-            {
+        text_chunks = []
+        metadata_chunks = []
+        for i, chunk in enumerate(iter_document_chunks(document_path, document_type)):
+            text_chunks.append(chunk.page_content)
+            metadata_chunks.append({
                 "source": os.path.basename(document_path),
                 "page": chunk.metadata.get("page", i + 1)
-            }
-            for i, chunk in enumerate(chunks)
-        ]
+            })
 
         return text_chunks, metadata_chunks
     except Exception as e:
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 import tempfile
 from typing import List, Optional
@@ -6,10 +7,22 @@ import aiohttp
 from telegram import Bot
 from logging.handlers import RotatingFileHandler
 
+from config import (
+    MAX_DOWNLOAD_BYTES,
+    MAX_IMAGE_DOWNLOAD_BYTES,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+)
+from src.api.http_client import get_session
+
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 
+class DownloadTooLargeError(Exception):
+    """Raised when a download exceeds the configured size limit"""
+
+
 def setup_logger(
     name: str,
     log_file: str,
@@ -89,6 +102,76 @@ def extract_image_urls(text: str) -> List[str]:
     return urls
 
 
+async def stream_download(
+        url: str,
+        file_path: str,
+        max_bytes: int = MAX_DOWNLOAD_BYTES,
+        timeout: float = 30,
+        retries: int = DOWNLOAD_RETRIES) -> bool:
+    """
+    Download a URL to disk in chunks with a size limit, resuming with
+    HTTP Range requests after transient errors
+
+    Args:
+        url: URL to download
+        file_path: Destination path
+        max_bytes: Maximum allowed size in bytes
+        timeout: Total timeout per attempt in seconds
+        retries: Number of retries after the first attempt
+
+    Returns:
+        bool: True if the file was downloaded completely, False otherwise
+    """
+    session = get_session()
+    downloaded = 0
+
+    for attempt in range(retries + 1):
+        headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+        try:
+            async with session.get(
+                    url,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if downloaded and response.status == 206:
+                    mode = "ab"
+                elif response.status == 200:
+                    # Server ignored the Range header, start over
+                    downloaded = 0
+                    mode = "wb"
+                elif response.status >= 500 and attempt < retries:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status)
+                else:
+                    logger.error(f"Failed to download {url}, status: {response.status}")
+                    return False
+
+                if response.content_length is not None and downloaded + response.content_length > max_bytes:
+                    raise DownloadTooLargeError(
+                        f"Content-Length {response.content_length} exceeds limit of {max_bytes} bytes")
+
+                with open(file_path, mode) as f:
+                    async for block in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        if downloaded + len(block) > max_bytes:
+                            raise DownloadTooLargeError(f"Download exceeds limit of {max_bytes} bytes")
+                        f.write(block)
+                        downloaded += len(block)
+                return True
+
+        except DownloadTooLargeError as e:
+            logger.error(f"Download of {url} aborted: {str(e)}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return False
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                logger.error(f"Error downloading {url} after {attempt + 1} attempts: {str(e)}")
+                return False
+            logger.warning(f"Download of {url} interrupted at {downloaded} bytes, retrying: {str(e)}")
+            await asyncio.sleep(2 ** attempt)
+
+    return False
+
+
 async def download_image(url: str) -> Optional[str]:
     """
     Download image from URL
@@ -106,16 +189,12 @@ async def download_image(url: str) -> Optional[str]:
             image_path = temp_file.name
 
         # Download image
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
-                if response.status == 200:
-                    with open(image_path, "wb") as f:
-                        f.write(await response.read())
-                    return image_path
-                else:
-                    logger.error(
-                        f"Failed to download image, status: {response.status}")
-                    return None
+        if await stream_download(url, image_path, max_bytes=MAX_IMAGE_DOWNLOAD_BYTES, timeout=10):
+            return image_path
+
+        if os.path.exists(image_path):
+            os.remove(image_path)
+        return None
     except Exception as e:
         logger.error(f"Error downloading image: {str(e)}")
         return None
@@ -0,0 +1,31 @@
+import unittest
+
+from src.core.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN
+
+
+class SlowCallTest(unittest.TestCase):
+
+    def test_slow_success_is_only_a_metric_by_default(self):
+        breaker = CircuitBreaker("test:slow-default", slow_call_threshold=0, slow_call_warn_threshold=20)
+        for _ in range(breaker.failure_threshold * 2):
+            breaker.record_success(25.0)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.slow_calls, breaker.failure_threshold * 2)
+        self.assertEqual(breaker.consecutive_failures, 0)
+
+    def test_operator_threshold_counts_slow_calls_as_failures(self):
+        breaker = CircuitBreaker("test:slow-failure", slow_call_threshold=20, slow_call_warn_threshold=10)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_success(25.0)
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertEqual(breaker.slow_calls, breaker.failure_threshold)
+
+    def test_fast_success_is_not_slow(self):
+        breaker = CircuitBreaker("test:fast", slow_call_threshold=0, slow_call_warn_threshold=20)
+        breaker.record_success(1.0)
+        breaker.record_success(None)
+        self.assertEqual(breaker.slow_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from src.core.core_shop import is_product_query, is_read_only_query
+
+
+class IsProductQueryTest(unittest.TestCase):
+
+    def test_catalog_questions(self):
+        for query in ("Giá của mít sấy giòn DaLaVi?", "Mít sấy 200gr còn không", "Cho mình 1 kg cà phê",
+                      "Shop có bán đặc sản Huế không", "Tư vấn đồ uống cho mình"):
+            self.assertTrue(is_product_query(query), query)
+
+    def test_keywords_inside_other_words(self):
+        for query in ("Bot telegram này làm được gì?", "Vẽ graph giúp mình", "Cách tạo group chat",
+                      "Giáo viên dạy môn gì?", "Tài liệu nói gì về kg?"):
+            self.assertFalse(is_product_query(query), query)
+
+
+class IsReadOnlyQueryTest(unittest.TestCase):
+
+    def test_select_and_with(self):
+        self.assertTrue(is_read_only_query("SELECT name FROM products WHERE name LIKE '%delete%';"))
+        self.assertTrue(is_read_only_query("WITH x AS (SELECT 1) SELECT * FROM x"))
+        self.assertTrue(is_read_only_query("SELECT replace(name, 'a', 'b') FROM products"))
+        self.assertTrue(is_read_only_query('SELECT "update" FROM products -- drop table'))
+
+    def test_writes_are_rejected(self):
+        for sql in ("WITH x AS (SELECT 1) DELETE FROM products",
+                    "SELECT 1; DROP TABLE products",
+                    "INSERT INTO products VALUES (1)",
+                    "WITH x AS (SELECT 1) REPLACE INTO products SELECT * FROM x",
+                    "PRAGMA writable_schema = 1"):
+            self.assertFalse(is_read_only_query(sql), sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
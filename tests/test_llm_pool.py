@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+
+from src.core.circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN
+from src.core.llm_pool import LLMPool
+
+
+def _half_open(pool: LLMPool) -> None:
+    """Mở circuit của mọi backend rồi cho hết thời gian chờ ngay để chúng chuyển sang half_open"""
+    for backend in pool.backends:
+        breaker = backend.breaker
+        breaker.recovery_timeout = 0
+        breaker.half_open_max_calls = 1
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure("test")
+        assert breaker.is_available() and breaker.state == STATE_HALF_OPEN
+
+
+class LLMPoolHalfOpenTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancelled_hedge_loser_releases_half_open_slot(self):
+        pool = LLMPool(["http://llm-a-hedge", "http://llm-b-hedge"], hedge_enabled=True, hedge_min_delay=0.01)
+        _half_open(pool)
+        calls = []
+
+        async def fn(backend):
+            calls.append(backend)
+            if len(calls) == 1:
+                # Request đầu tiên treo, request hedging thắng và request này bị hủy
+                await asyncio.sleep(60)
+            return "ok"
+
+        self.assertEqual(await pool.request(fn), "ok")
+        loser, winner = calls
+        # Chờ task thua cuộc xử lý CancelledError
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        self.assertEqual(winner.breaker.state, STATE_CLOSED)
+        self.assertEqual(loser.breaker.state, STATE_HALF_OPEN)
+        self.assertEqual(loser.breaker._half_open_calls, 0)
+        self.assertTrue(loser.breaker.is_available())
+        self.assertEqual(loser.outstanding, 0)
+        self.assertEqual(loser.failures, 0)
+
+    async def test_aborted_stream_releases_half_open_slot(self):
+        pool = LLMPool(["http://llm-a-stream"], hedge_enabled=False)
+        _half_open(pool)
+        backend = pool.backends[0]
+
+        async def stream():
+            async with pool.track(backend, record_latency=False):
+                yield "first"
+                yield "second"
+
+        pieces = stream()
+        self.assertEqual(await pieces.__anext__(), "first")
+        self.assertFalse(backend.breaker.is_available())
+        # Người dùng bỏ ngang câu trả lời: GeneratorExit được ném vào stream
+        await pieces.aclose()
+
+        self.assertEqual(backend.breaker.state, STATE_HALF_OPEN)
+        self.assertEqual(backend.breaker._half_open_calls, 0)
+        self.assertTrue(backend.breaker.is_available())
+        self.assertEqual(backend.outstanding, 0)
+        self.assertEqual(backend.failures, 0)
+
+
+class LLMPoolBackgroundTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_background_request_skips_half_open_and_records_nothing(self):
+        pool = LLMPool(["http://llm-a-background", "http://llm-b-background"], hedge_enabled=True,
+                       hedge_min_delay=0.01)
+        probing, closed = pool.backends
+        probing.breaker.recovery_timeout = 0
+        for _ in range(probing.breaker.failure_threshold):
+            probing.breaker.record_failure("test")
+
+        async def fn(backend):
+            await asyncio.sleep(0.05)
+            raise RuntimeError("summary failed")
+
+        with self.assertRaises(RuntimeError):
+            await pool.request_background(fn)
+
+        # Không hedging, không ghi latency, lỗi không tính vào breaker của request người dùng
+        self.assertEqual(pool.hedged_requests, 0)
+        self.assertEqual(len(closed.latencies), 0)
+        self.assertEqual(closed.breaker.consecutive_failures, 0)
+        self.assertEqual(closed.failures, 0)
+        self.assertEqual(closed.outstanding, 0)
+        # Lượt thử half_open vẫn dành cho request của người dùng
+        self.assertEqual(probing.breaker._half_open_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
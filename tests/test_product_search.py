@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from src.db.product_search import build_index, like_pattern_to_match, rewrite_like_to_match
+
+PRODUCTS = [
+    (1, "Cá khô", "Hải sản"),
+    (2, "Cà phê sữa", "Đồ uống"),
+    (3, "Cam sành", "Trái cây"),
+    (4, "Kẹo me", "Đồ ăn vặt"),
+    (5, "Canh chua", "Thực phẩm khô"),
+]
+
+QUERY = "SELECT g.name FROM products p JOIN goods_name g ON g.id = p.good_id WHERE g.name LIKE '{pattern}' ORDER BY g.id"
+
+
+class LikePatternToMatchTest(unittest.TestCase):
+
+    def test_prefix_only_when_wildcard_follows_word(self):
+        self.assertEqual(like_pattern_to_match("name", "%Cá%"), 'name : ("ca"*)')
+        self.assertEqual(like_pattern_to_match("name", "%Cá %"), 'name : ("ca")')
+        self.assertEqual(like_pattern_to_match("name", "Cá"), 'name : ("ca")')
+        self.assertEqual(like_pattern_to_match("good_name", "%Kẹo me%"), 'name : ("keo" "me"*)')
+
+    def test_pattern_without_words(self):
+        self.assertIsNone(like_pattern_to_match("name", "%%"))
+
+    def test_rewrite_keeps_original_like(self):
+        rewritten, count = rewrite_like_to_match(QUERY.format(pattern="%Cá%"))
+        self.assertEqual(count, 1)
+        self.assertIn("MATCH 'name : (\"ca\"*)'", rewritten)
+        self.assertIn("AND g.name LIKE '%Cá%')", rewritten)
+
+
+class RewriteAgainstIndexTest(unittest.TestCase):
+    """Câu đã viết lại phải trả về đúng các dòng của câu LIKE gốc trên chỉ mục FTS5 thật"""
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        conn = sqlite3.connect(cls.db_path)
+        conn.executescript("""
+            CREATE TABLE goods_name (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE products (id INTEGER PRIMARY KEY, good_id INTEGER, good_name TEXT, store_name TEXT,
+                                   category1 TEXT, category2 TEXT, category3 TEXT);
+        """)
+        conn.executemany("INSERT INTO goods_name VALUES (?, ?)", [(i, name) for i, name, _ in PRODUCTS])
+        conn.executemany("INSERT INTO products VALUES (?, ?, ?, 'Cửa hàng', ?, '', '')",
+                         [(i, i, name, category) for i, name, category in PRODUCTS])
+        conn.commit()
+        conn.close()
+        build_index(cls.db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.db_path)
+
+    def _rows(self, query):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [row[0] for row in conn.execute(query)]
+        finally:
+            conn.close()
+
+    def assertSameRows(self, pattern, expected):
+        query = QUERY.format(pattern=pattern)
+        rewritten, count = rewrite_like_to_match(query)
+        self.assertEqual(count, 1)
+        self.assertEqual(self._rows(query), expected)
+        self.assertEqual(self._rows(rewritten), expected)
+
+    def test_accented_one_word_pattern(self):
+        self.assertSameRows("%Cá%", ["Cá khô"])
+        self.assertSameRows("%Cà%", ["Cà phê sữa"])
+
+    def test_multi_word_pattern(self):
+        self.assertSameRows("%Kẹo me%", ["Kẹo me"])
+
+    def test_word_internal_substring_is_never_wider(self):
+        # MATCH không tìm được chuỗi con giữa từ: câu viết lại trả về rỗng và _run_query chạy lại câu gốc
+        query = QUERY.format(pattern="%am%")
+        self.assertEqual(self._rows(query), ["Cam sành"])
+        self.assertEqual(self._rows(rewrite_like_to_match(query)[0]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from src.db.query_cache import QueryResultCache, normalize_sql
+
+
+class NormalizeSqlTest(unittest.TestCase):
+
+    def test_whitespace_case_and_semicolon(self):
+        self.assertEqual(normalize_sql("SELECT  name\nFROM Products ;"), normalize_sql("select name from products"))
+
+    def test_literals_are_kept_verbatim(self):
+        self.assertNotEqual(normalize_sql("SELECT * FROM goods_name WHERE name LIKE '%Đậu%'"),
+                            normalize_sql("SELECT * FROM goods_name WHERE name LIKE '%đậu%'"))
+        self.assertNotEqual(normalize_sql('SELECT * FROM goods_name WHERE name LIKE "%Đậu%"'),
+                            normalize_sql('SELECT * FROM goods_name WHERE name LIKE "%đậu%"'))
+        self.assertEqual(normalize_sql("SELECT 'It''s  A'"), "select 'It''s  A'")
+
+
+class QueryResultCacheTest(unittest.TestCase):
+
+    def test_version_change_invalidates(self):
+        cache = QueryResultCache(max_entries=2, ttl=60, max_result_chars=100)
+        key = cache.make_key("catalog.db", "SELECT 1")
+        cache.put(key, (1,), "| 1 |")
+        self.assertEqual(cache.get(key, (1,)), "| 1 |")
+        self.assertIsNone(cache.get(key, (2,)))
+        self.assertEqual(cache.stale, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()